@@ -1,10 +1,21 @@
-import os, subprocess, sys, json
+import os, subprocess, sys, json, threading, time, gzip, logging
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from openai import OpenAI
 from strings import scriptsAvailable, SYSTEM_PROMPT
+from connectionPool import sessionPool
+import scriptRunner
+from jobQueue import JobQueue
+from conversationStore import ConversationStore
+from historyCompaction import HistoryCompactor
+from intentRouter import IntentRouter
+from resultStore import ResultStore
+import metrics
+
+apiLog = logging.getLogger("api")
 
 # ========================
 # CONFIG INICIAL
@@ -15,7 +26,8 @@ apiKey = os.getenv("OPENAI_API_KEY")
 if not apiKey:
     raise RuntimeError("OPENAI_API_KEY not set")
 
-client = OpenAI(apiKey=apiKey)
+# OPENAI_BASE_URL (si está definida) apunta el cliente a otro servidor, ej. bench/stubLLM.py
+client = OpenAI(api_key=apiKey)
 
 app = FastAPI(
     title="NetOps: AI-Powered Automation Solution",
@@ -32,23 +44,89 @@ app.add_middleware(
 
 class ChatRequest(BaseModel):
     message: str
+    # Vacío en el primer mensaje, el backend devuelve uno nuevo en la respuesta
+    sessionId: str | None = None
+
+class JobRequest(BaseModel):
+    scriptID: str
+    parameters: dict = {}
 
 baseScriptDir = os.path.join(os.path.dirname(__file__), "scripts")
 
-lastRunCommandContext = {}
+# Módulos compartidos con los scripts (scripts/)
+sys.path.append(baseScriptDir)
+import showResultCache
+import scriptMetrics
+import resultProtocol
+
+# Los scripts cargados in-process envían sus tiempos (SSH, validateIP) directo al registro
+scriptMetrics.sink = metrics.observeScriptMetric
+
+useSessionPool = os.getenv("NETOPS_SESSION_POOL", "1") != "0"
+
+# "inprocess": call the catalog callables directly, "subprocess": always run main.py
+executionMode = os.getenv("NETOPS_EXECUTION_MODE", "inprocess")
+
+@app.on_event("startup")
+def loadInProcessScripts():
+    if executionMode == "inprocess":
+        scriptRunner.loadScripts()
+
+@app.on_event("startup")
+def startSessionPool():
+    if useSessionPool:
+        sessionPool.start()
+
+@app.on_event("shutdown")
+def stopSessionPool():
+    sessionPool.stop()
+
+@app.get("/pool/stats")
+def poolStats():
+    return sessionPool.stats()
+
+@app.get("/cache/stats")
+def cacheStats():
+    return showResultCache.stats()
+
+def checkRequiredParams(scriptID: str, params: dict):
+    for p in scriptsAvailable[scriptID].get("cli_params", []):
+        value = params.get(p["name"])
+        if p.get("required", True) and value in (None, "", []):
+            raise ValueError(
+                f"Missing required parameter '{p['name']}' for script '{scriptID}'"
+            )
+
+def emitLines(onOutput, text: str):
+    if onOutput is not None:
+        for line in text.split("\n"):
+            onOutput(line)
 
-def runScript(scriptID: str, params: dict) -> dict:
+def runScript(scriptID: str, params: dict, cancelEvent=None, onOutput=None) -> dict:
     """
-    Execute the needed script that is available using subprocess.
+    Execute the needed script that is available. Scripts loaded in-process are
+    called directly, the rest (or all of them with NETOPS_EXECUTION_MODE=subprocess)
+    run as a separate Python process. Setting cancelEvent kills a running subprocess;
+    an in-process run stops before its next device.
+    onOutput(line) receives the output line by line while the script runs.
     """
     if scriptID not in scriptsAvailable:
         return {"error": f"Unknown scriptID: {scriptID}"}
 
     info = scriptsAvailable[scriptID]
 
+    # Otro transporte SSH (asyncssh) solo existe en main.py
+    defaultTransport = params.get("transport") in (None, "", "netmiko")
+
+    if executionMode == "inprocess" and scriptRunner.isLoaded(scriptID) and defaultTransport:
+        checkRequiredParams(scriptID, params)
+        # Scripts "pooled" abren sus sesiones SSH desde el pool del backend (solo in-process)
+        connectHandler = sessionPool.connectHandler if info.get("pooled") and useSessionPool else None
+        return scriptRunner.runInProcess(scriptID, params, onOutput, connectHandler=connectHandler, cancelEvent=cancelEvent)
+
     folder = info.get("folder")
     entrypoint = info.get("entrypoint", "main.py")
-    cliParams = info.get("cliParams", [])
+    cliParams = info.get("cli_params", [])
 
     scriptPath = os.path.join(baseScriptDir, folder, entrypoint)
 
@@ -61,7 +139,7 @@ def runScript(scriptID: str, params: dict) -> dict:
 
         value = params.get(name)
 
-        if value is None or value == "":
+        if value in (None, "", []):
             if required:
                 raise ValueError(
                     f"Missing required parameter '{name}' for script '{scriptID}'"
@@ -69,36 +147,321 @@ def runScript(scriptID: str, params: dict) -> dict:
             else:
                 continue
 
+        # Lista (por ejemplo varios show commands): el flag se repite por cada valor
+        if p.get("multiple") and isinstance(value, (list, tuple)):
+            for item in value:
+                cmd.extend([flag, str(item)])
+            continue
+
         cmd.extend([flag, str(value)])
 
+    # Un registro JSON por device en lugar del texto libre (scripts/resultProtocol.py)
+    if info.get("resultFormat") == "ndjson":
+        cmd.extend(["--format", "ndjson"])
+
     script_dir = os.path.dirname(scriptPath)
 
-    result = subprocess.run(
+    # Sin buffer para que cada print del script llegue apenas ocurre.
+    # NETOPS_METRICS_STDERR: el script manda sus tiempos por stderr (scripts/scriptMetrics.py)
+    env = dict(os.environ, PYTHONUNBUFFERED="1", NETOPS_METRICS_STDERR="1")
+
+    process = subprocess.Popen(
         cmd,
         cwd=script_dir,
-        capture_output=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
         text=True,
+        bufsize=1,
+        env=env,
     )
 
-    return {
-        "returncode": result.returncode,
-        "stdout": result.stdout,
-        "stderr": result.stderr,
+    stdoutLines = []
+    stderrLines = []
+    records = []
+
+    def readStream(stream, lines, callback):
+        for line in stream:
+            if line.startswith("NETOPS_METRIC "):
+                recordScriptMetric(line)
+                continue
+            record = resultProtocol.parseRecord(line)
+            if record is not None:
+                # Se guarda el registro y el texto de siempre para el chat
+                records.append(record)
+                text = resultProtocol.formatRecord(record) + "\n"
+                lines.append(text + "\n")
+                emitLines(callback, text)
+                continue
+            lines.append(line)
+            if callback is not None:
+                callback(line.rstrip("\n"))
+        stream.close()
+
+    readers = [
+        threading.Thread(target=readStream, args=(process.stdout, stdoutLines, onOutput), daemon=True),
+        threading.Thread(target=readStream, args=(process.stderr, stderrLines, None), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    cancelled = False
+    while True:
+        try:
+            process.wait(timeout=1)
+            break
+        except subprocess.TimeoutExpired:
+            if cancelEvent is not None and cancelEvent.is_set():
+                process.kill()
+                cancelled = True
+
+    for reader in readers:
+        reader.join()
+
+    result = {
+        "returncode": process.returncode,
+        "stdout": "".join(stdoutLines),
+        "stderr": "".join(stderrLines),
+        **resultProtocol.collect(records),
     }
+    if cancelled:
+        result["cancelled"] = True
+    return result
+
+def recordScriptMetric(line: str):
+    try:
+        data = json.loads(line[len("NETOPS_METRIC "):])
+        metrics.observeScriptMetric(data["name"], data["value"], data.get("labels") or {})
+    except (ValueError, KeyError, TypeError):
+        apiLog.warning(f"Ignoring malformed metric line: {line.strip()}")
+
+def runQueuedScript(scriptID: str, params: dict, cancelEvent=None, onOutput=None) -> dict:
+    # runScript for the job queue: records the wall time and moves big outputs to the result store
+    start = time.perf_counter()
+    try:
+        return resultStore.spill(runScript(scriptID, params, cancelEvent, onOutput))
+    finally:
+        metrics.scriptSeconds.observe(time.perf_counter() - start, script=scriptID)
+
+def formatScriptResult(scriptResult: dict) -> str:
+    if "error" in scriptResult:
+        return (
+            "--- Script execution failed ---\n"
+            + f"Error: {scriptResult['error']}"
+        )
+
+    text = (
+        "--- Script execution ---\n"
+        + f"Return code: {scriptResult.get('returncode')}\n"
+    )
+    summary = scriptResult.get("summary") or {}
+    if summary.get("devices"):
+        text += f"Devices: {summary['ok']} ok, {summary['failed']} failed\n"
+    if scriptResult.get("cancelled"):
+        text += "\nExecution cancelled.\n"
+    if scriptResult.get("stdout"):
+        text += "\nOutput:\n" + scriptResult["stdout"]
+    if scriptResult.get("stdoutRef"):
+        ref = scriptResult["stdoutRef"]
+        text += (
+            f"\n\n[Showing the first {resultStore.previewLines} of {ref['lines']} lines "
+            f"({ref['bytes'] // 1024} KB). Full output: /results/{ref['id']}]"
+        )
+    if scriptResult.get("stderr"):
+        text += "\nErrors:\n" + scriptResult["stderr"]
+    return text
+
+# ========================
+# SALIDAS GRANDES (RESULT STORE)
+# ========================
+
+# Salidas de más de NETOPS_RESULT_SPILL_BYTES se guardan comprimidas en disco y el job
+# (y el chat) solo llevan las primeras líneas y el handle para pedir el resto por páginas
+resultStore = ResultStore(
+    os.getenv("NETOPS_RESULT_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")),
+    spillBytes=int(os.getenv("NETOPS_RESULT_SPILL_BYTES", str(64 * 1024))),
+    previewLines=int(os.getenv("NETOPS_RESULT_PREVIEW_LINES", "40")),
+)
+
+@app.on_event("startup")
+def pruneResultStore():
+    resultStore.prune(float(os.getenv("NETOPS_RESULT_RETENTION_DAYS", "7")) * 86400)
+
+@app.get("/results/stats")
+def resultStoreStats():
+    return resultStore.stats()
+
+@app.get("/results/{resultID}")
+def resultPage(resultID: str, request: Request, offset: int = 0, limit: int = 200):
+    """
+    One page of a stored output: lines [offset, offset + limit) and nextOffset (None at
+    the end). Compressed with gzip when the client sends Accept-Encoding: gzip.
+    """
+    if not resultStore.exists(resultID):
+        raise HTTPException(status_code=404, detail=f"Unknown result: {resultID}")
+    if offset < 0 or not 1 <= limit <= 5000:
+        raise HTTPException(status_code=422, detail="offset must be >= 0 and limit between 1 and 5000")
+
+    body = json.dumps(resultStore.page(resultID, offset, limit)).encode("utf-8")
+    headers = {"Cache-Control": "private, max-age=86400", "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", "") and len(body) > 1024:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# ========================
+# COLA DE EJECUCIONES
+# ========================
+
+jobQueue = JobQueue(
+    runQueuedScript,
+    os.getenv("NETOPS_JOBS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.db")),
+    maxWorkers=int(os.getenv("NETOPS_JOB_WORKERS", "8")),
+    scriptLimits={
+        scriptID: info["maxConcurrentJobs"]
+        for scriptID, info in scriptsAvailable.items()
+        if "maxConcurrentJobs" in info
+    },
+    defaultLimit=int(os.getenv("NETOPS_JOBS_PER_SCRIPT", "2")),
+)
+
+metrics.registry.gauge(
+    "netops_job_queue_depth",
+    "Jobs waiting for a worker and jobs running.",
+    lambda: {(("state", state),): count for state, count in jobQueue.depth().items()},
+)
+
+# ========================
+# MÉTRICAS
+# ========================
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metricsEndpoint():
+    # Formato de texto de Prometheus
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+def jobResponse(job: dict) -> dict:
+    if job.get("status") in ("succeeded", "failed", "cancelled"):
+        if job.get("result") is not None:
+            job["message"] = formatScriptResult(job["result"])
+        elif job.get("error"):
+            job["message"] = formatScriptResult({"error": job["error"]})
+        else:
+            job["message"] = "--- Script execution cancelled ---"
+    return job
+
+@app.post("/jobs")
+def submitJob(req: JobRequest):
+    if req.scriptID not in scriptsAvailable:
+        raise HTTPException(status_code=404, detail=f"Unknown scriptID: {req.scriptID}")
+    try:
+        checkRequiredParams(req.scriptID, req.parameters)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"jobId": jobQueue.submit(req.scriptID, req.parameters)}
+
+@app.get("/jobs/{jobID}")
+def jobStatus(jobID: str):
+    job = jobQueue.get(jobID)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {jobID}")
+    return jobResponse(job)
+
+@app.get("/jobs/{jobID}/result")
+def jobResult(jobID: str):
+    job = jobQueue.get(jobID)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {jobID}")
+    if job["status"] not in ("succeeded", "failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job {jobID} is {job['status']}")
+    job = jobResponse(job)
+    return {"jobId": jobID, "status": job["status"], "result": job["result"], "message": job["message"]}
+
+@app.get("/jobs/{jobID}/stream")
+def streamJob(jobID: str):
+    """
+    Server-Sent Events with the output of a job while it runs: one "output" event per
+    line (JSON string), then a "done" event with the final job (status, message, ...).
+    """
+    if jobQueue.get(jobID) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {jobID}")
+
+    def events():
+        for line in jobQueue.followOutput(jobID):
+            if line is None:
+                # Comentario SSE para que proxies y navegador no corten la conexión
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: output\ndata: {json.dumps(line)}\n\n"
+        job = jobResponse(jobQueue.get(jobID))
+        yield f"event: done\ndata: {json.dumps(job)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/jobs/{jobID}/cancel")
+def cancelJob(jobID: str):
+    job = jobQueue.cancel(jobID)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {jobID}")
+    return jobResponse(job)
 
 # ========================
 # HISTORIAL DE CONVERSACIÓN
 # ========================
 
-chatHistory = [
-    {"role": "system", "content": SYSTEM_PROMPT}
-]
+conversations = ConversationStore(
+    SYSTEM_PROMPT,
+    maxSessions=int(os.getenv("NETOPS_MAX_SESSIONS", "500")),
+    idleTimeout=int(os.getenv("NETOPS_SESSION_IDLE_TIMEOUT", "3600")),
+    # NETOPS_MAX_TURNS: turnos guardados por sesión, los más viejos pasan al resumen.
+    # NETOPS_HISTORY_KEEP_TURNS: de esos, los últimos que van completos al modelo, el
+    # resto va como líneas de resumen (sin borrarlos de la sesión). Debe ser <= NETOPS_MAX_TURNS.
+    maxTurns=int(os.getenv("NETOPS_MAX_TURNS", "20")),
+    compactor=HistoryCompactor(
+        tokenBudget=int(os.getenv("NETOPS_HISTORY_TOKEN_BUDGET", "6000")),
+        keepTurns=int(os.getenv("NETOPS_HISTORY_KEEP_TURNS", "6")),
+    ),
+)
 
-@app.post("/chat")
-def chatEndpoint(req: ChatRequest):
-    global chatHistory, lastRunCommandContext
+@app.get("/sessions/stats")
+def sessionStats():
+    return conversations.stats()
+
+@app.delete("/sessions/{sessionID}")
+def resetSession(sessionID: str):
+    conversations.reset(sessionID)
+    return {"sessionId": sessionID, "reset": True}
+
+# Mensajes frecuentes ("list scripts", "yes, run it", "same device, run show ...")
+# se resuelven sin llamar al modelo (NETOPS_INTENT_ROUTER=0 lo desactiva)
+useIntentRouter = os.getenv("NETOPS_INTENT_ROUTER", "1") != "0"
+intentRouter = IntentRouter(scriptsAvailable)
 
-    messages = chatHistory.copy()
+@app.get("/router/stats")
+def routerStats():
+    return intentRouter.stats()
+
+def routerMessages():
+    stats = intentRouter.stats()
+    return {(("result", result),): stats[result] for result in ("routed", "fallback")}
+
+metrics.registry.gauge(
+    "netops_intent_router_messages",
+    "Chat messages seen by the intent router, answered locally or sent to the model.",
+    routerMessages,
+)
+
+metrics.registry.gauge(
+    "netops_intent_router_intents",
+    "Chat messages answered by the intent router by intent.",
+    lambda: {(("intent", intent),): count for intent, count in intentRouter.stats()["intents"].items()},
+)
+
+def askModel(sessionID: str, message: str) -> str:
+    messages, lastRunCommandContext, tokens = conversations.snapshot(sessionID)
 
     if lastRunCommandContext:
         contextTxt = (
@@ -107,38 +470,81 @@ def chatEndpoint(req: ChatRequest):
         )
         messages.append({"role": "system", "content": contextTxt})
 
-    messages.append({"role": "user", "content": req.message})
+    messages.append({"role": "user", "content": message})
+
+    with metrics.llmSeconds.time(model="gpt-5-nano"):
+        response = client.chat.completions.create(
+            model="gpt-5-nano",
+            messages=messages,
+        )
 
-    response = client.chat.completions.create(
-        model="gpt-5-nano",
-        messages=messages,
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.llmPromptTokens.observe(usage.prompt_tokens or 0, model="gpt-5-nano")
+        metrics.llmCompletionTokens.observe(usage.completion_tokens or 0, model="gpt-5-nano")
+    apiLog.info(
+        f"Prompt tokens of session {sessionID}: {tokens['tokensBefore']} before compaction, "
+        f"{tokens['tokensAfter']} after, {getattr(usage, 'prompt_tokens', None)} reported by the model"
     )
 
-    raw = response.choices[0].message.content
+    return response.choices[0].message.content
 
-    chatHistory.append({"role": "user", "content": req.message})
-    chatHistory.append({"role": "assistant", "content": raw})
+@app.post("/chat")
+def chatEndpoint(req: ChatRequest):
+    # Tiempo de cada etapa en ms, se devuelve en "timings"
+    timings = {}
+    stageStart = time.perf_counter()
+
+    def endStage(name):
+        nonlocal stageStart
+        now = time.perf_counter()
+        timings[name] = round((now - stageStart) * 1000, 3)
+        metrics.chatStageSeconds.observe(now - stageStart, stage=name)
+        stageStart = now
+
+    sessionID = conversations.open(req.sessionId)
+    lastRunCommandContext, pending = conversations.state(sessionID)
+
+    routed = intentRouter.route(req.message, lastRunCommandContext, pending) if useIntentRouter else None
+    endStage("router")
+    if routed is not None:
+        raw = json.dumps(routed)
+    else:
+        raw = askModel(sessionID, req.message)
+    endStage("llm")
 
     try:
         data = json.loads(raw)
     except json.JSONDecodeError:
+        endStage("parse")
+        conversations.appendTurn(sessionID, req.message, raw)
         print("DEBUG JSONDecodeError, raw =", raw)
         return {
             "assistantMessage": raw,
             "scriptExecuted": None,
             "scriptResult": None,
+            "sessionId": sessionID,
+            "timings": timings,
         }
 
     answer = data.get("answer", "")
-    scriptID = data.get("scriptToRun")
-    runFlag = data.get("runScript", False)
+    scriptID = data.get("script_to_run", data.get("scriptToRun"))
+    runFlag = data.get("run_script", data.get("runScript", False))
     params = data.get("parameters") or {}
+    endStage("parse")
 
     scriptResult = None
+    jobID = None
 
     if runFlag and scriptID in scriptsAvailable:
         try:
-            scriptResult = runScript(scriptID, params)
+            checkRequiredParams(scriptID, params)
+            jobID = jobQueue.submit(scriptID, params)
+            answer = (
+                answer
+                + "\n\n--- Script queued ---\n"
+                + f"Job ID: {jobID}"
+            )
 
             # Actualizar contexto si tiene sentido
             if (
@@ -152,39 +558,39 @@ def chatEndpoint(req: ChatRequest):
                     "username": params.get("username"),
                     "password": params.get("password"),
                 }
+                conversations.setContext(sessionID, lastRunCommandContext)
 
         except Exception as e:
             scriptResult = {
                 "error": str(e),
             }
 
+    endStage("script")
+
     if scriptResult is not None:
-        if "error" in scriptResult:
-            answer = (
-                answer
-                + "\n\n--- Script execution failed ---\n"
-                + f"Error: {scriptResult['error']}"
-            )
-        else:
-            answer = (
-                answer
-                + "\n\n--- Script execution ---\n"
-                + f"Return code: {scriptResult.get('returncode')}\n"
-            )
-            if scriptResult.get("stdout"):
-                answer += "\nOutput:\n" + scriptResult["stdout"]
-            if scriptResult.get("stderr"):
-                answer += "\nErrors:\n" + scriptResult["stderr"]
+        answer = answer + "\n\n" + formatScriptResult(scriptResult)
+
+    # Propuesta del modelo sin ejecutar todavía, para confirmarla con "yes, run it"
+    if scriptID in scriptsAvailable and not runFlag:
+        conversations.setPending(sessionID, {"script_to_run": scriptID, "parameters": params})
+    else:
+        conversations.setPending(sessionID, {})
+
+    # La salida del script no entra al historial, solo la referencia al job
+    conversations.appendTurn(sessionID, req.message, raw, reference=f"job {jobID}" if jobID else None)
 
     print("DEBUG RAW FROM MODEL:", raw)
     print("DEBUG scriptID:", scriptID)
     print("DEBUG RUN FLAG:", runFlag)
     print("DEBUG PARAMS:", params)
     print("DEBUG SCRIPT RESULT:", scriptResult)
-    print("DEBUG LAST CONTEXT:", lastRunCommandContext)
+    endStage("assemble")
 
     return {
         "assistantMessage": answer,
-        "scriptExecuted": scriptID if (runFlag and scriptResult is not None) else None,
+        "scriptExecuted": scriptID if jobID else None,
         "scriptResult": scriptResult,
+        "jobId": jobID,
+        "sessionId": sessionID,
+        "timings": timings,
     }
@@ -0,0 +1,266 @@
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+
+# ========================
+# BENCHMARK DE /chat CON UN LLM SIMULADO
+# ========================
+#
+# Runs api.app with uvicorn against bench/stubLLM.py (same JSON as chat completions) and a
+# fake script runner with configurable latency, then:
+# - sends concurrent /chat requests and reports latency percentiles and throughput,
+# - reports the time of each stage (router, llm, parse, script, assemble) from "timings",
+# - waits for the queued jobs and reports their queue wait and run time,
+# - sends thousands of turns on one session and reports the memory of the history.
+#
+# Example:
+#   python bench/chatBenchmark.py --requests 1000 --concurrency 50 --llm-latency 0.3 --script-latency 2
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+rootDir = os.path.dirname(benchDir)
+sys.path.insert(0, rootDir)
+
+import stubLLM
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    # Nearest rank
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def describe(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(percentile(values, 0.50), 3),
+        "p90": round(percentile(values, 0.90), 3),
+        "p99": round(percentile(values, 0.99), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def request(baseUrl, method, path, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(
+        baseUrl + path, data=data, method=method, headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req, timeout=300) as response:
+        return json.loads(response.read())
+
+
+def loadApi(args):
+    """
+    Import api.py configured for the benchmark: stub LLM, temporary jobs DB, no script
+    loading at startup and the fake runner in the job queue.
+    """
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.llm_port}/v1"
+    os.environ["NETOPS_JOBS_DB"] = os.path.join(tempfile.mkdtemp(prefix="netopsBench"), "jobs.db")
+    os.environ["NETOPS_EXECUTION_MODE"] = "subprocess"
+    os.environ["NETOPS_SESSION_POOL"] = "0"
+    os.environ["NETOPS_INTENT_ROUTER"] = "1" if args.router else "0"
+    os.environ.setdefault("NETOPS_JOB_WORKERS", str(args.job_workers))
+    os.environ.setdefault("NETOPS_JOBS_PER_SCRIPT", str(args.job_workers))
+
+    import api
+
+    def fakeRunner(scriptID, params, cancelEvent=None, onOutput=None):
+        devices = [d for d in str(params.get("devices", "")).split(",") if d]
+        outputs = []
+        for device in devices:
+            time.sleep(args.script_latency / max(1, len(devices)))
+            outputs.append(f"{device}#{params.get('command')}\nbench output")
+            if onOutput is not None:
+                onOutput(outputs[-1])
+        return {"returncode": 0, "stdout": "\n\n".join(outputs), "stderr": ""}
+
+    api.jobQueue.runner = fakeRunner
+    return api
+
+
+def startApi(api, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def loadPhase(baseUrl, args):
+    sessions = [None] * args.sessions
+    sessionLocks = [threading.Lock() for _ in range(args.sessions)]
+    rng = random.Random(1)
+    messages = [
+        (i % args.sessions, f"run show ip interface brief on bench-rtr-{i % 50 + 1}")
+        if rng.random() < args.run_ratio else (i % args.sessions, "hello, what can you do?")
+        for i in range(args.requests)
+    ]
+
+    latencies = []
+    stages = {}
+    jobIDs = []
+    errors = 0
+
+    def send(item):
+        index, message = item
+        # The messages of one session go one after the other, like a real user
+        with sessionLocks[index]:
+            start = time.perf_counter()
+            data = request(baseUrl, "POST", "/chat", {"message": message, "sessionId": sessions[index]})
+            elapsed = (time.perf_counter() - start) * 1000
+            sessions[index] = data.get("sessionId")
+        return elapsed, data
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for future in concurrent.futures.as_completed([executor.submit(send, m) for m in messages]):
+            try:
+                elapsed, data = future.result()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            for stage, ms in (data.get("timings") or {}).items():
+                stages.setdefault(stage, []).append(ms)
+            if data.get("jobId"):
+                jobIDs.append(data["jobId"])
+    wall = time.perf_counter() - start
+
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "requestsPerSecond": round(len(latencies) / wall, 2) if wall else None,
+        "latencyMs": describe(latencies),
+        "stagesMs": {stage: describe(values) for stage, values in stages.items()},
+    }, jobIDs
+
+
+def jobsPhase(baseUrl, jobIDs, timeout=600):
+    waits = []
+    runs = []
+    deadline = time.time() + timeout
+    pending = list(jobIDs)
+    while pending and time.time() < deadline:
+        stillPending = []
+        for jobID in pending:
+            job = request(baseUrl, "GET", f"/jobs/{jobID}")
+            if job["status"] in ("succeeded", "failed", "cancelled"):
+                if job.get("startedAt"):
+                    waits.append((job["startedAt"] - job["createdAt"]) * 1000)
+                    runs.append((job["finishedAt"] - job["startedAt"]) * 1000)
+            else:
+                stillPending.append(jobID)
+        pending = stillPending
+        if pending:
+            time.sleep(0.2)
+
+    return {
+        "jobs": len(jobIDs),
+        "unfinished": len(pending),
+        "queueWaitMs": describe(waits),
+        "scriptRunMs": describe(runs),
+    }
+
+
+def memoryPhase(api, baseUrl, args):
+    # History memory of one long conversation, without the LLM delay
+    stubLLM.settings.update(latency=0.0, jitter=0.0)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    checkpoints = []
+    sessionID = None
+    step = max(1, args.history_turns // 10)
+
+    for turn in range(1, args.history_turns + 1):
+        data = request(baseUrl, "POST", "/chat", {"message": f"turn {turn}: hello, what can you do?", "sessionId": sessionID})
+        sessionID = data["sessionId"]
+        if turn % step == 0 or turn == args.history_turns:
+            with api.conversations.lock:
+                session = api.conversations.sessions.get(sessionID, {})
+                keptTurns = len(session.get("turns", []))
+                summaryChars = len(session.get("summary", ""))
+                rawTokens = session.get("rawTokens", 0)
+            checkpoints.append({
+                "turns": turn,
+                "tracedKB": round((tracemalloc.get_traced_memory()[0] - baseline) / 1024, 1),
+                "keptTurns": keptTurns,
+                "summaryChars": summaryChars,
+                "rawTokens": rawTokens,
+                "promptTokens": api.conversations.snapshot(sessionID)[2],
+            })
+    tracemalloc.stop()
+    return checkpoints
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /chat with a stub LLM and a fake script runner")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=50, help="Simulated users (one session each).")
+    parser.add_argument("--run-ratio", type=float, default=0.3, help="Fraction of messages that run a script.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per stub completion.")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--script-latency", type=float, default=1.0, help="Seconds per fake script run.")
+    parser.add_argument("--job-workers", type=int, default=8)
+    parser.add_argument("--history-turns", type=int, default=2000, help="Turns of the memory phase (0 to skip).")
+    parser.add_argument("--router", action="store_true", help="Keep the local intent router enabled.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--llm-port", type=int, default=8090)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    stubLLM.settings.update(latency=args.llm_latency, jitter=args.llm_jitter)
+    stubLLM.startStub(args.llm_port)
+    baseUrl = f"http://127.0.0.1:{args.port}"
+
+    # api.py prints DEBUG lines for every request, only the report is shown
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        api = loadApi(args)
+        server = startApi(api, args.port)
+        load, jobIDs = loadPhase(baseUrl, args)
+        jobs = jobsPhase(baseUrl, jobIDs)
+        memory = memoryPhase(api, baseUrl, args) if args.history_turns else []
+        server.should_exit = True
+
+    results = {"load": load, "jobs": jobs, "memory": memory}
+
+    print(f"Requests: {load['requests']}, errors: {load['errors']}, "
+          f"{load['requestsPerSecond']} req/s over {load['seconds']}s")
+    print(f"Latency ms: {load['latencyMs']}")
+    print("Stages ms (p50 / p99):")
+    for stage, values in load["stagesMs"].items():
+        print(f"  {stage:<10} {values.get('p50')!s:>10} {values.get('p99')!s:>10}")
+    print(f"Jobs: {jobs['jobs']} (unfinished {jobs['unfinished']}), "
+          f"queue wait ms {jobs['queueWaitMs']}, script run ms {jobs['scriptRunMs']}")
+    if memory:
+        print("History memory:")
+        print(f"  {'turns':>7}{'traced KB':>12}{'kept turns':>12}{'summary ch':>12}{'prompt tokens':>16}")
+        for point in memory:
+            print(f"  {point['turns']:>7}{point['tracedKB']:>12}{point['keptTurns']:>12}"
+                  f"{point['summaryChars']:>12}{point['promptTokens'].get('tokensAfter')!s:>16}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
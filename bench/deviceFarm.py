@@ -0,0 +1,326 @@
+import argparse
+import asyncio
+import logging
+import random
+import sys
+
+import asyncssh
+
+# ========================
+# GRANJA DE DEVICES SIMULADOS (BENCHMARK)
+# ========================
+#
+# N fake Cisco devices listening for SSH on 127.0.1.1, 127.0.1.2, ... (same port for
+# all of them), so the scripts can be measured without real gear.
+#
+# - IOS-XE devices: user mode ">", enable with password, config mode, err-disabled
+#   interfaces, SNMP group with ACL ("access 61"), show interface with half/full duplex.
+# - vEdge devices: always "#", "show inventory" gives a syntax error, like the real ones.
+# - Latency per command (plus jitter) and failure injection: rejected logins, sessions
+#   dropped after the first command and sessions that stop answering.
+#
+# Example:
+#   python bench/deviceFarm.py --devices 100 --port 8022 --latency 0.05 --fail-auth 0.02
+
+farmLog = logging.getLogger("deviceFarm")
+
+
+def deviceAddress(index: int) -> str:
+    # index starts at 0: 127.0.1.1 ... 127.0.1.254, 127.0.2.1 ...
+    return f"127.0.{1 + index // 254}.{1 + index % 254}"
+
+
+class FakeDevice:
+    def __init__(self, index: int, profile: str, interfaces: int, rng: random.Random):
+        self.index = index
+        self.address = deviceAddress(index)
+        self.profile = profile
+        self.hostname = f"bench-{'vedge' if profile == 'vedge' else 'rtr'}-{index + 1}"
+        self.interfaces = [f"GigabitEthernet1/0/{port}" for port in range(1, interfaces + 1)]
+        self.shortNames = {f"Gi1/0/{port}": name for port, name in enumerate(self.interfaces, start=1)}
+        # Some state for the scripts to find and fix
+        self.errDisabled = {name for name in self.shortNames if rng.random() < 0.1}
+        self.halfDuplex = {name for name in self.interfaces if rng.random() < 0.1}
+        self.snmpAcl = rng.random() < 0.5
+
+    # ---------- Outputs ----------
+
+    def showErrDisabled(self) -> str:
+        lines = ["Port         Name               Status       Reason               Err-disabled Vlans"]
+        for port in sorted(self.errDisabled):
+            lines.append(f"{port:<12} {'':<18} err-disabled bpduguard")
+        return "\n".join(lines)
+
+    def showInterfaceDuplex(self) -> str:
+        lines = []
+        for name in self.interfaces:
+            duplex = "Half-duplex, 100Mb/s" if name in self.halfDuplex else "Full-duplex, 1000Mb/s"
+            lines.append(f"{name} is up, line protocol is up")
+            lines.append(f"  {duplex}, media type is 10/100/1000BaseTX")
+        return "\n".join(lines)
+
+    def showInterfaceTab(self) -> str:
+        lines = []
+        for number, name in enumerate(self.interfaces):
+            duplex = "half" if name in self.halfDuplex else "full"
+            lines.append(f"0    ge0/{number}  -  ipv4  Up  Up  null  service  1500  00:0c:29:00:00:{number:02x}  1000  {duplex}")
+        return "\n".join(lines)
+
+    def showInterfaces(self) -> str:
+        lines = []
+        for name in self.interfaces:
+            duplex = "Half-duplex, 100Mb/s" if name in self.halfDuplex else "Full-duplex, 1000Mb/s"
+            lines += [
+                f"{name} is up, line protocol is up (connected)",
+                "  Hardware is Gigabit Ethernet, address is 0000.0c00.0001 (bia 0000.0c00.0001)",
+                "  MTU 1500 bytes, BW 1000000 Kbit/sec, DLY 10 usec,",
+                f"  {duplex}, media type is 10/100/1000BaseTX",
+                "  5 minute input rate 1000 bits/sec, 2 packets/sec",
+                "  5 minute output rate 2000 bits/sec, 3 packets/sec",
+                "     0 input errors, 0 CRC, 0 frame, 0 overrun, 0 ignored",
+            ]
+        return "\n".join(lines)
+
+    def showIpIntBrief(self) -> str:
+        lines = ["Interface              IP-Address      OK? Method Status                Protocol"]
+        for number, name in enumerate(self.interfaces, start=1):
+            lines.append(f"{name:<22} 10.{self.index % 250}.{number}.1     YES NVRAM  up                    up")
+        return "\n".join(lines)
+
+    def showSnmpGroup(self) -> str:
+        line = "snmp-server group grpallRO v3 priv read fullview write noview notify fullview"
+        return line + (" access 61" if self.snmpAcl else "")
+
+    def runExec(self, command: str):
+        # Returns the output of an exec command, None for unknown commands
+        command = " ".join(command.split())
+        if self.profile == "vedge":
+            outputs = {
+                "paginate false": "",
+                "screen-width 512": "",
+                "show interface | tab | inc half|inc Half": "\n".join(
+                    line for line in self.showInterfaceTab().splitlines() if "half" in line
+                ),
+                "show version": "19.2.4",
+                "show run | i hostname": f"system\n host-name {self.hostname}",
+            }
+            return outputs.get(command)
+
+        if command.startswith("terminal "):
+            return ""
+        if command in ("show run | inc grpallRO", "show run | i grpallRO", "show running-config | include grpallRO"):
+            return self.showSnmpGroup()
+        outputs = {
+            "show run | i hostname": f"hostname {self.hostname}",
+            "show interfaces status err-disabled": self.showErrDisabled,
+            "show interface | inc Giga|TenGig|Duplex": self.showInterfaceDuplex,
+            "show interface": self.showInterfaces,
+            "show interfaces": self.showInterfaces,
+            "show ip interface brief": self.showIpIntBrief,
+            "show ip int br": self.showIpIntBrief,
+            "show inventory": (
+                'NAME: "Chassis", DESCR: "Cisco ISR4431 Chassis"\n'
+                f"PID: ISR4431/K9        , VID: V04  , SN: FDO{self.index:08d}"
+            ),
+            "show version": (
+                "Cisco IOS XE Software, Version 17.03.04a\n"
+                f"{self.hostname} uptime is 12 weeks, 3 days, 4 hours, 5 minutes"
+            ),
+        }
+        output = outputs.get(command)
+        return output() if callable(output) else output
+
+
+class FarmServer(asyncssh.SSHServer):
+    def __init__(self, farm):
+        self.farm = farm
+
+    def begin_auth(self, username):
+        return True
+
+    def password_auth_supported(self):
+        return True
+
+    def validate_password(self, username, password):
+        if self.farm.rng.random() < self.farm.failAuth:
+            self.farm.counters["authFailures"] += 1
+            return False
+        return password == self.farm.password
+
+
+class DeviceFarm:
+    """
+    Runs the fake devices. Every session follows a simple IOS CLI: echo of the typed
+    commands, prompt after every output, enable, configure terminal, interface, end, exit.
+    """
+
+    def __init__(self, devices=10, port=8022, password="bench", vedgeEvery=0, interfaces=24,
+                 latency=0.0, jitter=0.0, failAuth=0.0, failDrop=0.0, failHang=0.0, seed=1):
+        self.port = port
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.failAuth = failAuth
+        self.failDrop = failDrop
+        self.failHang = failHang
+        self.rng = random.Random(seed)
+        self.devices = {}
+        for index in range(devices):
+            profile = "vedge" if vedgeEvery and (index + 1) % vedgeEvery == 0 else "cisco_xe"
+            device = FakeDevice(index, profile, interfaces, self.rng)
+            self.devices[device.address] = device
+        self.counters = {"sessions": 0, "commands": 0, "authFailures": 0, "dropped": 0, "hung": 0}
+        self.servers = []
+
+    async def delay(self):
+        wait = self.latency + self.rng.uniform(0, self.jitter)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def session(self, process, device: FakeDevice):
+        self.counters["sessions"] += 1
+        drop = self.rng.random() < self.failDrop
+        hang = self.rng.random() < self.failHang
+        enabled = device.profile == "vedge"
+        mode = ""
+        interface = None
+
+        def prompt():
+            return device.hostname + (f"({mode})" if mode else "") + ("#" if enabled else ">")
+
+        def write(text):
+            process.stdout.write(text.replace("\n", "\r\n"))
+
+        await self.delay()
+        write(f"\n{prompt()}")
+
+        while True:
+            line = await process.stdin.readline()
+            if not line:
+                break
+            command = line.strip("\r\n")
+            write(command + "\n")
+            self.counters["commands"] += 1
+
+            if drop:
+                self.counters["dropped"] += 1
+                break
+            if hang:
+                self.counters["hung"] += 1
+                await asyncio.sleep(3600)
+            await self.delay()
+
+            command = " ".join(command.split())
+            if not command:
+                pass
+            elif command == "enable" and not enabled:
+                write("Password: ")
+                secret = (await process.stdin.readline()).strip("\r\n")
+                if secret == self.password:
+                    enabled = True
+                else:
+                    write("\n% Access denied\n")
+            elif command in ("configure terminal", "conf t", "config t", "conf terminal"):
+                if device.profile != "vedge":
+                    write("Enter configuration commands, one per line.  End with CNTL/Z.\n")
+                mode = "config"
+            elif command in ("end", "commit and-quit"):
+                mode = ""
+                interface = None
+            elif command == "exit":
+                if mode == "config-if":
+                    mode, interface = "config", None
+                elif mode:
+                    mode = ""
+                else:
+                    break
+            elif mode:
+                words = command.split()
+                if words[0] in ("int", "interface"):
+                    mode, interface = "config-if", words[-1]
+                elif command in ("no shut", "no shutdown") and interface:
+                    device.errDisabled.discard(interface)
+                elif command.startswith("snmp-server group grpallRO") and "access" not in command:
+                    device.snmpAcl = False
+                elif command in ("do write", "do wr"):
+                    write("Building configuration...\n[OK]\n")
+            elif command in ("copy run start", "copy running-config startup-config"):
+                write("Destination filename [startup-config]? ")
+                await process.stdin.readline()
+                write("\nBuilding configuration...\n[OK]\n")
+            elif command in ("write", "write memory", "wr"):
+                write("Building configuration...\n[OK]\n")
+            else:
+                output = device.runExec(command)
+                if output is None:
+                    if device.profile == "vedge":
+                        output = "syntax error: unknown command"
+                    else:
+                        output = "                ^\n% Invalid input detected at '^' marker."
+                if output:
+                    write(output + "\n")
+
+            write(prompt())
+
+        process.exit(0)
+
+    async def start(self):
+        hostKey = asyncssh.generate_private_key("ssh-ed25519")
+        for address, device in self.devices.items():
+            server = await asyncssh.create_server(
+                lambda: FarmServer(self),
+                address,
+                self.port,
+                server_host_keys=[hostKey],
+                process_factory=lambda process, device=device: self.session(process, device),
+                line_editor=False,
+                encoding="utf-8",
+            )
+            self.servers.append(server)
+
+    def close(self):
+        for server in self.servers:
+            server.close()
+
+
+async def serve(args):
+    farm = DeviceFarm(
+        devices=args.devices, port=args.port, password=args.password, vedgeEvery=args.vedge_every,
+        interfaces=args.interfaces, latency=args.latency, jitter=args.jitter,
+        failAuth=args.fail_auth, failDrop=args.fail_drop, failHang=args.fail_hang, seed=args.seed,
+    )
+    await farm.start()
+    # runBenchmark.py waits for this line before starting
+    print(f"READY {args.devices} devices on {deviceAddress(0)}-{deviceAddress(args.devices - 1)} port {args.port}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        farm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated Cisco SSH devices for benchmarks")
+    parser.add_argument("--devices", type=int, default=10, help="Number of fake devices.")
+    parser.add_argument("--port", type=int, default=8022, help="SSH port of every device.")
+    parser.add_argument("--password", default="bench", help="Login and enable password.")
+    parser.add_argument("--vedge-every", type=int, default=0, help="Every Nth device is a vEdge (0: none).")
+    parser.add_argument("--interfaces", type=int, default=24, help="Interfaces per device.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every command.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra seconds (0..jitter) per command.")
+    parser.add_argument("--fail-auth", type=float, default=0.0, help="Fraction of logins rejected.")
+    parser.add_argument("--fail-drop", type=float, default=0.0, help="Fraction of sessions dropped after the first command.")
+    parser.add_argument("--fail-hang", type=float, default=0.0, help="Fraction of sessions that stop answering.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (device state and failures).")
+    args = parser.parse_args()
+
+    if args.devices > 254 * 254:
+        sys.exit("ERROR: too many devices")
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
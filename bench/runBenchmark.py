@@ -0,0 +1,251 @@
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# ========================
+# BENCHMARK DE LOS SCRIPTS CONTRA LA GRANJA SIMULADA
+# ========================
+#
+# Starts bench/deviceFarm.py (or uses one already running with --no-farm), loads each
+# script the same way the backend does (scriptRunner.loadScriptModules), points its
+# ConnectHandler at the farm port and runs every device, timing each one.
+# Reports devices/second and p50/p99 latency per device for each script. A device counts
+# as failed when one of its result records (scripts/resultProtocol.py) is not "ok".
+# The farm devices go to a temporary device inventory, not to scripts/deviceInventory.db.
+#
+# Example:
+#   python bench/runBenchmark.py --devices 100 --concurrency 20 --latency 0.05
+#   python bench/runBenchmark.py --scripts showCommandsAsync --devices 2000 --concurrency 1000
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+rootDir = os.path.dirname(benchDir)
+sys.path.insert(0, rootDir)
+
+# Read by netops_core.inventory when scriptRunner imports it
+os.environ["NETOPS_INVENTORY_DB"] = os.path.join(tempfile.mkdtemp(prefix="netopsBench"), "deviceInventory.db")
+
+import scriptRunner
+import resultProtocol
+from deviceFarm import deviceAddress
+
+
+def netDevice(args):
+    return {"password": args.password, "secret": args.password}
+
+
+def recordsOk(records):
+    return bool(records) and all(record["status"] not in resultProtocol.failedStatuses for record in records)
+
+
+# script name -> (folder, module, function that runs one device)
+def runShowCommands(module, ip, args):
+    out = module.showCommandsDevice(ip, args.username, netDevice(args), args.command)
+    return out is not None and not out.startswith("Error on")
+
+def aclRemoval(module, ip, args):
+    return module.aclRemovalDevice(ip, args.username, args.password)[1] == "ok"
+
+def errDisable(module, ip, args):
+    # One verification check right after the recovery, the fake devices never clear the state
+    module.errDisable([ip], args.username, netDevice(args), recover="y", verifyTimeout=0, verifyInterval=0)
+
+def showHalfInts(module, ip, args):
+    module.showHalfInts([ip], args.username, netDevice(args))
+
+benchScripts = {
+    "showCommands": ("runShowCommands-main", "commandsCLI", runShowCommands),
+    "aclRemoval": ("aclRemoval-main", "commandsCLI", aclRemoval),
+    "errDisable": ("showErrDisableInt-main", "commandsCLI", errDisable),
+    "showHalfInts": ("shIntStatHalf_SD-WAN-main", "commandsCLI", showHalfInts),
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    # Nearest rank
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(name, latencies, failures, wall):
+    devices = len(latencies) + failures
+    return {
+        "script": name,
+        "devices": devices,
+        "failures": failures,
+        "seconds": round(wall, 3),
+        "devicesPerSecond": round(devices / wall, 2) if wall else None,
+        "p50": round(percentile(latencies, 0.50), 4) if latencies else None,
+        "p99": round(percentile(latencies, 0.99), 4) if latencies else None,
+        "max": round(max(latencies), 4) if latencies else None,
+    }
+
+
+def patchConnectHandler(modules, port):
+    # Same session as the script would open, only on the farm port
+    module = modules["commandsCLI"]
+    original = module.ConnectHandler
+
+    def connectHandler(**device):
+        return original(**device, port=port)
+
+    module.ConnectHandler = connectHandler
+
+
+def benchNetmiko(name, ips, args):
+    folder, moduleName, runDevice = benchScripts[name]
+    modules = scriptRunner.loadScriptModules(folder, moduleName)
+    patchConnectHandler(modules, args.port)
+    module = modules[moduleName]
+    if name == "errDisable":
+        # Skip the report of every device
+        module.createReport = lambda *a, **k: None
+
+    latencies = []
+    failures = 0
+
+    def timed(ip):
+        # The records of this device only (the threads of the scripts keep the sink)
+        records = []
+        token = resultProtocol.runSink.set(records.append)
+        start = time.perf_counter()
+        try:
+            ok = runDevice(module, ip, args) is not False
+        except Exception:
+            ok = False
+        finally:
+            seconds = time.perf_counter() - start
+            resultProtocol.runSink.reset(token)
+        return ok and recordsOk(records), seconds
+
+    # The scripts print every step, only the report is shown
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for ok, seconds in executor.map(timed, ips):
+                if ok:
+                    latencies.append(seconds)
+                else:
+                    failures += 1
+        wall = time.perf_counter() - start
+
+    return summarize(name, latencies, failures, wall)
+
+
+def benchAsync(ips, args):
+    # runShowCommands with --transport asyncssh, every device in one event loop
+    folder = "runShowCommands-main"
+    modules = scriptRunner.loadScriptModules(folder, "asyncSSH")
+    asyncSSH = modules["asyncSSH"]
+    asyncSSH.sshPort = args.port
+
+    latencies = []
+    originalRunCommand = asyncSSH.runCommand
+
+    async def timedRunCommand(*a, **k):
+        start = time.perf_counter()
+        result = await originalRunCommand(*a, **k)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    asyncSSH.runCommand = timedRunCommand
+
+    records = {}
+    token = resultProtocol.runSink.set(lambda record: records.setdefault(record["device"], []).append(record))
+    try:
+        start = time.perf_counter()
+        asyncSSH.showCommands(ips, args.username, netDevice(args), args.command, maxSessions=args.concurrency)
+        wall = time.perf_counter() - start
+    finally:
+        resultProtocol.runSink.reset(token)
+
+    failures = sum(1 for ip in ips if not recordsOk(records.get(ip, [])))
+    return summarize("showCommandsAsync", latencies, failures, wall)
+
+
+def startFarm(args):
+    cmd = [
+        sys.executable, os.path.join(benchDir, "deviceFarm.py"),
+        "--devices", str(args.devices),
+        "--port", str(args.port),
+        "--password", args.password,
+        "--vedge-every", str(args.vedge_every),
+        "--latency", str(args.latency),
+        "--jitter", str(args.jitter),
+        "--fail-auth", str(args.fail_auth),
+        "--fail-drop", str(args.fail_drop),
+        "--fail-hang", str(args.fail_hang),
+    ]
+    farm = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = farm.stdout.readline()
+    if not line.startswith("READY"):
+        farm.kill()
+        raise RuntimeError(f"Device farm did not start: {line!r}")
+    print(f"INFO: {line.strip()}")
+    return farm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scripts against the simulated device farm")
+    parser.add_argument("--scripts", default="showCommands,showCommandsAsync,aclRemoval,errDisable,showHalfInts",
+                        help="Comma-separated: " + ", ".join([*benchScripts, "showCommandsAsync"]))
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10, help="Devices at the same time (threads or async sessions).")
+    parser.add_argument("--port", type=int, default=8022)
+    parser.add_argument("--username", default="bench")
+    parser.add_argument("--password", default="bench")
+    parser.add_argument("--command", default="show ip interface brief", help="Command for showCommands.")
+    parser.add_argument("--vedge-every", type=int, default=0, help="Every Nth device is a vEdge (for showHalfInts).")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--fail-auth", type=float, default=0.0)
+    parser.add_argument("--fail-drop", type=float, default=0.0)
+    parser.add_argument("--fail-hang", type=float, default=0.0)
+    parser.add_argument("--no-farm", action="store_true", help="Use a deviceFarm.py that is already running.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    # Cached show results would skip the SSH session that is being measured
+    os.environ["NETOPS_SHOW_CACHE"] = "0"
+
+    ips = [deviceAddress(index) for index in range(args.devices)]
+    farm = None if args.no_farm else startFarm(args)
+
+    results = []
+    try:
+        for name in [s.strip() for s in args.scripts.split(",") if s.strip()]:
+            print(f"INFO: Running {name} on {len(ips)} devices...")
+            if name == "showCommandsAsync":
+                results.append(benchAsync(ips, args))
+            elif name in benchScripts:
+                results.append(benchNetmiko(name, ips, args))
+            else:
+                print(f"ERROR: Unknown script {name}")
+    finally:
+        if farm is not None:
+            farm.kill()
+
+    print()
+    print(f"{'script':<20}{'devices':>8}{'failed':>8}{'seconds':>10}{'dev/s':>10}{'p50 s':>10}{'p99 s':>10}")
+    for r in results:
+        print(
+            f"{r['script']:<20}{r['devices']:>8}{r['failures']:>8}{r['seconds']:>10}"
+            f"{r['devicesPerSecond']!s:>10}{r['p50']!s:>10}{r['p99']!s:>10}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ========================
+# STUB DEL API DE CHAT COMPLETIONS (BENCHMARK)
+# ========================
+#
+# Answers POST /v1/chat/completions with the same JSON as OpenAI and the JSON contract
+# of SYSTEM_PROMPT, after a configurable delay. api.py uses it with
+#   OPENAI_BASE_URL=http://127.0.0.1:8090/v1 OPENAI_API_KEY=stub
+#
+# "run <show command> on <devices>" gets run_script true, anything else a plain answer.
+
+runPattern = re.compile(r"run\s+(?P<command>show\s+.+?)\s+on\s+(?P<devices>\S+)", re.IGNORECASE)
+
+# Changed at runtime by chatBenchmark.py
+settings = {"latency": 0.0, "jitter": 0.0}
+counters = {"requests": 0}
+countersLock = threading.Lock()
+
+
+def answerFor(message: str) -> dict:
+    match = runPattern.search(message)
+    if match:
+        return {
+            "answer": f"Running {match.group('command')} on {match.group('devices')} 🚀",
+            "script_to_run": "runShowCommands-main",
+            "parameters": {
+                "devices": match.group("devices"),
+                "username": "bench",
+                "password": "bench",
+                "command": match.group("command"),
+            },
+            "run_script": True,
+        }
+    return {
+        "answer": "Hi, I'm Automation Hero 🤖 Tell me which script you want to run.",
+        "script_to_run": None,
+        "parameters": {},
+        "run_script": False,
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        messages = body.get("messages", [])
+        userMessages = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+        content = json.dumps(answerFor(userMessages[-1] if userMessages else ""))
+
+        wait = settings["latency"] + random.uniform(0, settings["jitter"])
+        if wait > 0:
+            time.sleep(wait)
+
+        with countersLock:
+            counters["requests"] += 1
+
+        promptTokens = sum(len(m.get("content") or "") for m in messages) // 4
+        completionTokens = len(content) // 4
+        response = json.dumps({
+            "id": f"chatcmpl-stub-{counters['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": promptTokens,
+                "completion_tokens": completionTokens,
+                "total_tokens": promptTokens + completionTokens,
+            },
+        }).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+def startStub(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stubLLM", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per completion.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra seconds (0..jitter).")
+    args = parser.parse_args()
+
+    settings.update(latency=args.latency, jitter=args.jitter)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"Stub LLM on http://127.0.0.1:{args.port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# ========================
+# POOL DE SESIONES SSH
+# ========================
+
+poolLog = logging.getLogger("connectionPool")
+
+
+def netmikoConnect(device: str, username: str, password: str, deviceType: str, **options):
+    """
+    Default factory: open and authenticate a netmiko session, already in enable mode.
+    options: netmiko parameters of the caller (timeout, conn_timeout, session_log...),
+    they replace the defaults.
+    """
+    from netmiko import ConnectHandler
+
+    params = {
+        "secret": password,
+        "global_delay_factor": 2.0,
+        "timeout": 120,
+        "verbose": False,
+    }
+    params.update(options)
+    sshAccess = ConnectHandler(device_type=deviceType, ip=device, username=username, password=password, **params)
+    sshAccess.enable()
+    return sshAccess
+
+
+def sessionHashOf(password: str, options: dict) -> str:
+    # A pooled session is only reused with the same password and netmiko options
+    # (read and connect timeouts, session log...)
+    return hashlib.sha256(repr((password, sorted(options.items()))).encode()).hexdigest()
+
+
+def isAlive(sshAccess) -> bool:
+    try:
+        return bool(sshAccess.is_alive())
+    except Exception:
+        return False
+
+
+def closeSession(sshAccess):
+    try:
+        sshAccess.disconnect()
+    except Exception as error:
+        poolLog.info(f"Error closing pooled session: {error}")
+
+
+class SessionPool:
+    """
+    Keeps authenticated SSH sessions keyed by (device, username) so that follow-up
+    commands on the same device reuse a live session instead of logging in again.
+    A session is only reused with the password and netmiko options it was opened with.
+
+    - idleTimeout: seconds an unused session is kept open.
+    - maxPerHost: sessions open at the same time for one (device, username).
+    - acquireTimeout: seconds to wait for a free session when a host is at maxPerHost.
+    """
+
+    def __init__(self, idleTimeout=300, maxPerHost=2, acquireTimeout=60, connectFactory=netmikoConnect):
+        self.idleTimeout = idleTimeout
+        self.maxPerHost = maxPerHost
+        self.acquireTimeout = acquireTimeout
+        self.connectFactory = connectFactory
+        self.condition = threading.Condition()
+        # (device, username) -> {"idle": [(sshAccess, sessionHash, lastUsed)], "busy": int}
+        self.hosts = {}
+        self.counters = {"hits": 0, "misses": 0, "healthCheckFailures": 0, "expired": 0}
+        self.stopEvent = threading.Event()
+        self.reaper = None
+
+    @contextmanager
+    def session(self, device: str, username: str, password: str, deviceType: str = "cisco_xe", **options):
+        sshAccess, sessionHash = self.acquire(device, username, password, deviceType, options)
+        healthy = True
+        try:
+            yield sshAccess
+        except Exception:
+            # A session that failed (read timeout, prompt not found...) may be left in the
+            # middle of an output, it is closed instead of going back to the pool
+            healthy = False
+            raise
+        finally:
+            self.release(device, username, sshAccess, sessionHash, healthy)
+
+    def connectHandler(self, **device):
+        """
+        Drop-in replacement for netmiko ConnectHandler(**device) used by the scripts:
+        returns a pooled session whose disconnect() gives it back to the pool.
+        The other netmiko parameters of device are used to open the session.
+        """
+        options = {name: value for name, value in device.items() if name not in ("ip", "username", "password", "device_type")}
+        sshAccess, sessionHash = self.acquire(
+            device["ip"], device["username"], device["password"], device.get("device_type", "cisco_xe"), options
+        )
+        return PooledSession(self, device["ip"], device["username"], sshAccess, sessionHash)
+
+    def acquire(self, device, username, password, deviceType, options=None):
+        options = options or {}
+        key = (device, username)
+        sessionHash = sessionHashOf(password, options)
+        deadline = time.monotonic() + self.acquireTimeout
+
+        toClose = []
+        sshAccess = None
+        create = False
+
+        with self.condition:
+            while True:
+                host = self.hosts.setdefault(key, {"idle": [], "busy": 0})
+                now = time.monotonic()
+                while host["idle"]:
+                    candidate, candidateHash, lastUsed = host["idle"].pop()
+                    if candidateHash != sessionHash or now - lastUsed > self.idleTimeout:
+                        toClose.append(candidate)
+                        continue
+                    sshAccess = candidate
+                    break
+
+                if sshAccess is not None or host["busy"] < self.maxPerHost:
+                    host["busy"] += 1
+                    create = sshAccess is None
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"No free session for {device} after {self.acquireTimeout}s "
+                        f"({self.maxPerHost} already in use)"
+                    )
+                self.condition.wait(remaining)
+
+        for stale in toClose:
+            closeSession(stale)
+
+        if not create:
+            # Health check before handing out a pooled session
+            if isAlive(sshAccess):
+                with self.condition:
+                    self.counters["hits"] += 1
+                poolLog.info(f"Reusing pooled session for {username}@{device}")
+                return sshAccess, sessionHash
+
+            closeSession(sshAccess)
+            with self.condition:
+                self.counters["healthCheckFailures"] += 1
+
+        with self.condition:
+            self.counters["misses"] += 1
+        try:
+            poolLog.info(f"Opening new session for {username}@{device}")
+            return self.connectFactory(device, username, password, deviceType, **options), sessionHash
+        except Exception:
+            with self.condition:
+                self.hosts[key]["busy"] -= 1
+                self.condition.notify_all()
+            raise
+
+    def release(self, device, username, sshAccess, sessionHash, healthy=True):
+        key = (device, username)
+        with self.condition:
+            host = self.hosts.setdefault(key, {"idle": [], "busy": 0})
+            host["busy"] = max(0, host["busy"] - 1)
+            if healthy:
+                host["idle"].append((sshAccess, sessionHash, time.monotonic()))
+            self.condition.notify_all()
+
+        if not healthy:
+            closeSession(sshAccess)
+
+    def closeIdle(self, everything: bool = False):
+        toClose = []
+        now = time.monotonic()
+        with self.condition:
+            for key, host in list(self.hosts.items()):
+                keep = []
+                for sshAccess, sessionHash, lastUsed in host["idle"]:
+                    if everything or now - lastUsed > self.idleTimeout:
+                        toClose.append(sshAccess)
+                    else:
+                        keep.append((sshAccess, sessionHash, lastUsed))
+                host["idle"] = keep
+                if not keep and not host["busy"]:
+                    del self.hosts[key]
+            self.counters["expired"] += len(toClose)
+
+        for sshAccess in toClose:
+            closeSession(sshAccess)
+        return len(toClose)
+
+    def start(self, interval: int = 30):
+        """
+        Start the background thread that closes sessions idle for more than idleTimeout.
+        """
+        if self.reaper is not None:
+            return
+        self.stopEvent.clear()
+
+        def reap():
+            while not self.stopEvent.wait(interval):
+                closed = self.closeIdle()
+                if closed:
+                    poolLog.info(f"Closed {closed} idle pooled sessions")
+
+        self.reaper = threading.Thread(target=reap, name="sessionPoolReaper", daemon=True)
+        self.reaper.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        self.reaper = None
+        self.closeIdle(everything=True)
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "hosts": {
+                    f"{username}@{device}": {"idle": len(host["idle"]), "busy": host["busy"]}
+                    for (device, username), host in self.hosts.items()
+                },
+                **self.counters,
+            }
+
+
+class PooledSession:
+    """
+    Session handed out by SessionPool.connectHandler. Calls go to the netmiko session;
+    disconnect() releases it to the pool, or closes it when a call failed or when it
+    is disconnected while a call is still running (a device abandoned after a timeout).
+    """
+
+    def __init__(self, pool, device, username, sshAccess, sessionHash):
+        self.pool = pool
+        self.device = device
+        self.username = username
+        self.sshAccess = sshAccess
+        self.sessionHash = sessionHash
+        self.lock = threading.Lock()
+        self.running = 0
+        self.healthy = True
+        self.released = False
+
+    def __getattr__(self, name):
+        attribute = getattr(self.sshAccess, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self.lock:
+                self.running += 1
+            try:
+                return attribute(*args, **kwargs)
+            except Exception:
+                self.healthy = False
+                raise
+            finally:
+                with self.lock:
+                    self.running -= 1
+
+        return call
+
+    def disconnect(self):
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+            healthy = self.healthy and not self.running
+        self.pool.release(self.device, self.username, self.sshAccess, self.sessionHash, healthy)
+
+
+sessionPool = SessionPool(
+    idleTimeout=int(os.getenv("NETOPS_POOL_IDLE_TIMEOUT", "300")),
+    maxPerHost=int(os.getenv("NETOPS_POOL_MAX_PER_HOST", "2")),
+)
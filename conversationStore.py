@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from historyCompaction import HistoryCompactor, countTokens
+
+# ========================
+# CONVERSACIONES POR SESIÓN
+# ========================
+
+storeLog = logging.getLogger("conversationStore")
+
+
+class ConversationStore:
+    """
+    Chat history and last run context kept per session ID, instead of one global list
+    shared by every user of the server.
+
+    - systemPrompt: first message of every conversation, never trimmed.
+    - maxSessions: sessions kept in memory, the least recently used one is dropped first.
+    - idleTimeout: seconds after which an unused session is dropped.
+    - maxTurns: user/assistant pairs stored verbatim per session, older ones are folded
+      into the summary for good.
+    - compactor: HistoryCompactor that keeps the messages sent to the model in a token
+      budget. It sends the last keepTurns stored turns verbatim and the rest as summary
+      lines, without changing the session (keepTurns <= maxTurns).
+    """
+
+    def __init__(self, systemPrompt: str, maxSessions=500, idleTimeout=3600, maxTurns=20, compactor=None):
+        self.systemPrompt = systemPrompt
+        self.maxSessions = maxSessions
+        self.idleTimeout = idleTimeout
+        self.maxTurns = maxTurns
+        self.compactor = compactor or HistoryCompactor()
+        self.lock = threading.Lock()
+        # sessionID -> {"turns": [{"user", "assistant", "reference"}], "summary": str,
+        #               "rawTokens": int, "context": dict, "pending": dict, "lastUsed": float}
+        # pending is the last script proposed by the model and not run yet
+        # rawTokens counts every turn ever added, what the prompt would be without compaction
+        self.sessions = OrderedDict()
+        self.counters = {"created": 0, "evicted": 0, "expired": 0, "trimmedTurns": 0}
+
+    def session(self, sessionID):
+        # Called with self.lock held. Returns the session, creating it if needed.
+        self.expire()
+        session = self.sessions.get(sessionID)
+        if session is None:
+            session = {"turns": [], "summary": "", "rawTokens": 0, "context": {}, "pending": {}, "lastUsed": time.monotonic()}
+            self.sessions[sessionID] = session
+            self.counters["created"] += 1
+            while len(self.sessions) > self.maxSessions:
+                evictedID, _ = self.sessions.popitem(last=False)
+                self.counters["evicted"] += 1
+                storeLog.info(f"Session {evictedID} evicted, more than {self.maxSessions} sessions")
+        session["lastUsed"] = time.monotonic()
+        self.sessions.move_to_end(sessionID)
+        return session
+
+    def expire(self):
+        # Called with self.lock held. Sessions are in LRU order, so the idle ones are first.
+        now = time.monotonic()
+        while self.sessions:
+            sessionID, session = next(iter(self.sessions.items()))
+            if now - session["lastUsed"] <= self.idleTimeout:
+                break
+            del self.sessions[sessionID]
+            self.counters["expired"] += 1
+
+    def open(self, sessionID=None) -> str:
+        """
+        Return the session ID to use: the given one, or a new one when it is empty.
+        """
+        sessionID = sessionID or uuid.uuid4().hex
+        with self.lock:
+            self.session(sessionID)
+        return sessionID
+
+    def snapshot(self, sessionID: str) -> tuple:
+        """
+        Returns (messages, context, tokens): the compacted messages to send to the model
+        (system prompt, summary and recent turns), the context of the last command run in
+        this session and the token counts of this compaction ({"tokensBefore", "tokensAfter"}).
+        """
+        with self.lock:
+            session = self.session(sessionID)
+            messages, tokens = self.compactor.compact(self.systemPrompt, session)
+            context = dict(session["context"])
+        return messages, context, tokens
+
+    def appendTurn(self, sessionID: str, userMessage: str, assistantMessage: str, reference: str = None):
+        """
+        reference: where the full output of the turn can be found (e.g. "job <id>"),
+        kept when the turn is cut or summarized.
+        """
+        turn = {"user": userMessage, "assistant": assistantMessage, "reference": reference}
+        tokens = countTokens([
+            {"role": "user", "content": userMessage},
+            {"role": "assistant", "content": assistantMessage},
+        ]) - 2
+        with self.lock:
+            session = self.session(sessionID)
+            session["turns"].append(turn)
+            session["rawTokens"] += tokens
+            extra = len(session["turns"]) - self.maxTurns
+            if extra > 0:
+                self.compactor.fold(session, extra)
+                self.counters["trimmedTurns"] += extra
+
+    def state(self, sessionID: str) -> tuple:
+        """
+        Returns (context, pending) of the session without building the model messages.
+        """
+        with self.lock:
+            session = self.session(sessionID)
+            return dict(session["context"]), dict(session["pending"])
+
+    def setPending(self, sessionID: str, pending: dict):
+        with self.lock:
+            self.session(sessionID)["pending"] = dict(pending or {})
+
+    def setContext(self, sessionID: str, context: dict):
+        with self.lock:
+            self.session(sessionID)["context"] = dict(context)
+
+    def reset(self, sessionID: str):
+        with self.lock:
+            self.sessions.pop(sessionID, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            self.expire()
+            return {
+                "sessions": len(self.sessions),
+                "maxSessions": self.maxSessions,
+                "maxTurns": self.maxTurns,
+                **self.counters,
+                "compaction": self.compactor.stats(),
+            }
@@ -0,0 +1,159 @@
+import json
+import logging
+
+# ========================
+# COMPACTACIÓN DEL HISTORIAL
+# ========================
+
+compactionLog = logging.getLogger("historyCompaction")
+
+try:
+    import tiktoken
+
+    encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    # tiktoken is optional, without it the count is an estimate (~4 chars per token)
+    encoding = None
+
+
+def countTokens(messages: list) -> int:
+    """
+    Tokens of a list of chat messages, with the few tokens of overhead per message.
+    """
+    total = 0
+    for message in messages:
+        content = message.get("content") or ""
+        total += 4 + (len(encoding.encode(content)) if encoding else (len(content) + 3) // 4)
+    return total + 2
+
+
+def stripBulkyOutput(content: str, maxChars: int, reference: str = None) -> str:
+    """
+    Cut the text of a message longer than maxChars (script outputs, big JSON answers),
+    keeping the beginning and a note with where the full text can be found.
+    """
+    if len(content) <= maxChars:
+        return content
+    note = f"[... {len(content) - maxChars} chars omitted"
+    note += f", full output in {reference}]" if reference else "]"
+    return content[:maxChars] + "\n" + note
+
+
+def summarizeTurn(turn: dict) -> str:
+    """
+    One line for a user/assistant pair that leaves the verbatim history. The assistant
+    answer is the JSON of SYSTEM_PROMPT, only the answer and the script run are kept
+    (never the parameters, they include the password).
+    """
+    userText = " ".join(turn["user"].split())[:150]
+    try:
+        data = json.loads(turn["assistant"])
+        answer = str(data.get("answer", ""))
+        scriptID = data.get("script_to_run", data.get("scriptToRun"))
+        devices = (data.get("parameters") or {}).get("devices")
+    except (json.JSONDecodeError, AttributeError):
+        answer, scriptID, devices = turn["assistant"], None, None
+
+    line = f"- User: {userText} | Assistant: {' '.join(answer.split())[:150]}"
+    if scriptID:
+        line += f" | Script: {scriptID}"
+        if devices:
+            line += f" on {devices}"
+    if turn.get("reference"):
+        line += f" | Output: {turn['reference']}"
+    return line
+
+
+class HistoryCompactor:
+    """
+    Builds the messages sent to the model within a token budget:
+    system prompt, rolling summary of the older turns, and the last keepTurns turns
+    verbatim (with bulky text cut to maxMessageChars).
+
+    The session keeps up to maxTurns turns verbatim (ConversationStore), the older ones
+    are folded into its summary for good. compact() does not change the session: of the
+    stored turns, the ones before the last keepTurns (and any that do not fit in the
+    budget) are sent as summary lines, so a lower keepTurns shortens the prompt without
+    losing the stored turns.
+
+    - tokenBudget: max tokens of the compacted messages.
+    - keepTurns: user/assistant pairs sent verbatim when they fit in the budget.
+    - maxSummaryChars: size of the rolling summary, the oldest lines are dropped first.
+    """
+
+    def __init__(self, tokenBudget=6000, keepTurns=6, maxSummaryChars=4000, maxMessageChars=2000):
+        self.tokenBudget = tokenBudget
+        self.keepTurns = keepTurns
+        self.maxSummaryChars = maxSummaryChars
+        self.maxMessageChars = maxMessageChars
+        self.counters = {"compactions": 0, "summarizedTurns": 0, "tokensBefore": 0, "tokensAfter": 0}
+
+    def capSummary(self, lines: list) -> str:
+        # Summary text within maxSummaryChars, the oldest lines are dropped first
+        summary = "\n".join(lines)
+        while len(summary) > self.maxSummaryChars and len(lines) > 1:
+            lines = lines[1:]
+            summary = "\n".join(lines)
+        return summary[-self.maxSummaryChars:]
+
+    def fold(self, session: dict, count: int):
+        # Move the count oldest turns of the session to its rolling summary
+        lines = session["summary"].splitlines() if session["summary"] else []
+        for turn in session["turns"][:count]:
+            lines.append(summarizeTurn(turn))
+        del session["turns"][:count]
+        self.counters["summarizedTurns"] += count
+        session["summary"] = self.capSummary(lines)
+
+    def build(self, systemPrompt: str, summary: str, turns: list) -> list:
+        messages = [{"role": "system", "content": systemPrompt}]
+        if summary:
+            messages.append({
+                "role": "system",
+                "content": "Summary of the earlier conversation:\n" + summary,
+            })
+        for turn in turns:
+            messages.append({"role": "user", "content": stripBulkyOutput(turn["user"], self.maxMessageChars)})
+            messages.append({
+                "role": "assistant",
+                "content": stripBulkyOutput(turn["assistant"], self.maxMessageChars, turn.get("reference")),
+            })
+        return messages
+
+    def compact(self, systemPrompt: str, session: dict) -> tuple:
+        """
+        Called with the store lock held. Returns (messages, tokens): the messages to send
+        and {"tokensBefore", "tokensAfter"} of this call.
+        """
+        tokensBefore = countTokens([{"role": "system", "content": systemPrompt}]) + session["rawTokens"]
+
+        lines = session["summary"].splitlines() if session["summary"] else []
+        turns = session["turns"]
+        split = max(0, len(turns) - self.keepTurns)
+        lines += [summarizeTurn(turn) for turn in turns[:split]]
+        turns = turns[split:]
+
+        messages = self.build(systemPrompt, self.capSummary(lines), turns)
+        while countTokens(messages) > self.tokenBudget and turns:
+            lines.append(summarizeTurn(turns[0]))
+            turns = turns[1:]
+            messages = self.build(systemPrompt, self.capSummary(lines), turns)
+        # Still over the budget: the oldest summary lines go first
+        while countTokens(messages) > self.tokenBudget and lines:
+            lines = lines[1:]
+            messages = self.build(systemPrompt, self.capSummary(lines), turns)
+
+        tokens = {"tokensBefore": tokensBefore, "tokensAfter": countTokens(messages)}
+        self.counters["compactions"] += 1
+        self.counters["tokensBefore"] += tokens["tokensBefore"]
+        self.counters["tokensAfter"] += tokens["tokensAfter"]
+        compactionLog.info(f"Prompt history compacted from {tokens['tokensBefore']} to {tokens['tokensAfter']} tokens")
+        return messages, tokens
+
+    def stats(self) -> dict:
+        return {
+            "tokenBudget": self.tokenBudget,
+            "keepTurns": self.keepTurns,
+            "tokenCounter": "tiktoken" if encoding else "estimate",
+            **self.counters,
+        }
@@ -0,0 +1,162 @@
+import logging
+import re
+import threading
+
+# ========================
+# ROUTER DE INTENCIONES (SIN LLM)
+# ========================
+
+routerLog = logging.getLogger("intentRouter")
+
+listScriptsPattern = re.compile(
+    r"^(?:please\s+|can you\s+|could you\s+)?"
+    r"(?:list|show(?:\s+me)?|what are|which are|give me)\s+(?:all\s+)?(?:the\s+)?(?:available\s+)?scripts"
+    r"(?:\s+(?:available|you have|do you have))?(?:\s+please)?$"
+    r"|^(?:what|which)\s+scripts\s+(?:are\s+available|do you have|can you run)$"
+    r"|^(?:available\s+)?scripts$",
+    re.IGNORECASE,
+)
+
+confirmPattern = re.compile(
+    r"^(?:yes|yep|yeah|y|ok|okay|sure|confirm(?:ed)?|go|go ahead|do it|run it|execute it)"
+    r"(?:[\s,]+(?:please|run it|go ahead|do it|execute it|run|go))*$",
+    re.IGNORECASE,
+)
+
+# Proposals that change the device configuration need an explicit confirmation
+explicitConfirmPattern = re.compile(
+    r"^(?:yes|confirm(?:ed)?)[\s,]+(?:run it|execute it|apply it|go ahead and run it)(?:[\s,]+please)?$",
+    re.IGNORECASE,
+)
+
+sameDevicePattern = re.compile(
+    r"^(?:on\s+)?(?:the\s+)?same\s+(?:device|devices|router|routers|switch|switches)(?:\s+and\s+(?:same\s+)?credentials)?"
+    r"\s*[,:]?\s*(?:and\s+|now\s+)?run\s+(?P<command>show\s+.+)$"
+    r"|^(?:now\s+)?run\s+(?P<command2>show\s+.+?)\s+on\s+(?:the\s+)?same\s+(?:device|devices|router|routers|switch|switches)$",
+    re.IGNORECASE,
+)
+
+
+def normalize(message: str) -> str:
+    return " ".join(message.strip().rstrip(".!?").split())
+
+
+class IntentRouter:
+    """
+    Answers the frequent messages that do not need the model, using the catalog and the
+    session context. route() returns the same JSON structure the model answers with
+    ({answer, script_to_run, parameters, run_script}) or None to use the model.
+
+    Rules only match the whole message, anything else (or a rule without the context it
+    needs) goes to the model. A short confirmation ("y", "ok", "go") only runs read-only
+    proposals, the ones that change the configuration (catalog "changesConfig") need
+    "yes, run it" or similar.
+    """
+
+    def __init__(self, scriptsAvailable: dict, showScript: str = "runShowCommands-main"):
+        self.scriptsAvailable = scriptsAvailable
+        self.showScript = showScript
+        self.lock = threading.Lock()
+        self.counters = {"messages": 0, "routed": 0, "fallback": 0}
+        self.intents = {"listScripts": 0, "confirm": 0, "sameDevice": 0}
+
+    def missingParams(self, scriptID: str, params: dict) -> list:
+        return [
+            p["name"]
+            for p in self.scriptsAvailable[scriptID].get("cli_params", [])
+            if p.get("required", True) and params.get(p["name"]) in (None, "", [])
+        ]
+
+    def changesConfig(self, scriptID: str, params: dict) -> bool:
+        # Catalog "changesConfig": True, or {param: value} when only that value changes it
+        changes = self.scriptsAvailable[scriptID].get("changesConfig", False)
+        if isinstance(changes, dict):
+            return any(str(params.get(name) or "").strip().lower() == value for name, value in changes.items())
+        return bool(changes)
+
+    def listScripts(self, message, context, pending):
+        if not listScriptsPattern.match(message):
+            return None
+        lines = ["Here are the scripts I can run for you 🚀", ""]
+        for scriptID, info in self.scriptsAvailable.items():
+            lines.append(f"• {info['displayName']} ({scriptID})")
+            lines.append(f"  {info['description']}")
+        return {
+            "answer": "\n".join(lines),
+            "script_to_run": None,
+            "parameters": {},
+            "run_script": False,
+        }
+
+    def confirm(self, message, context, pending):
+        if not pending or not confirmPattern.match(message):
+            return None
+        scriptID = pending.get("script_to_run")
+        params = pending.get("parameters") or {}
+        if scriptID not in self.scriptsAvailable or self.missingParams(scriptID, params):
+            return None
+        if self.changesConfig(scriptID, params) and not explicitConfirmPattern.match(message):
+            return None
+        return {
+            "answer": f"On it! 🚀 Running {self.scriptsAvailable[scriptID]['displayName']} now.",
+            "script_to_run": scriptID,
+            "parameters": dict(params),
+            "run_script": True,
+        }
+
+    def sameDevice(self, message, context, pending):
+        match = sameDevicePattern.match(message)
+        if not match or not context:
+            return None
+        params = {
+            "devices": context.get("devices"),
+            "username": context.get("username"),
+            "password": context.get("password"),
+            "command": match.group("command") or match.group("command2"),
+        }
+        if self.showScript not in self.scriptsAvailable or self.missingParams(self.showScript, params):
+            return None
+        return {
+            "answer": f"Sure! 🚀 Running `{params['command']}` on {params['devices']} with the same credentials.",
+            "script_to_run": self.showScript,
+            "parameters": params,
+            "run_script": True,
+        }
+
+    def route(self, message: str, context: dict = None, pending: dict = None):
+        """
+        context: last run context of the session (devices, username, password).
+        pending: last proposal of the model not executed yet ({script_to_run, parameters}).
+        """
+        message = normalize(message)
+        routed = None
+        intent = None
+        for intent, rule in (
+            ("listScripts", self.listScripts),
+            ("confirm", self.confirm),
+            ("sameDevice", self.sameDevice),
+        ):
+            routed = rule(message, context, pending)
+            if routed is not None:
+                break
+
+        with self.lock:
+            self.counters["messages"] += 1
+            if routed is None:
+                self.counters["fallback"] += 1
+            else:
+                self.counters["routed"] += 1
+                self.intents[intent] += 1
+
+        if routed is not None:
+            routerLog.info(f"Message answered by the intent router: {intent}")
+        return routed
+
+    def stats(self) -> dict:
+        with self.lock:
+            messages = self.counters["messages"]
+            return {
+                **self.counters,
+                "hitRate": round(self.counters["routed"] / messages, 4) if messages else 0.0,
+                "intents": dict(self.intents),
+            }
@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+# ========================
+# COLA DE EJECUCIONES (JOBS)
+# ========================
+
+jobLog = logging.getLogger("jobQueue")
+
+finalStatuses = ("succeeded", "failed", "cancelled")
+
+
+class JobQueue:
+    """
+    In-process queue for script executions. submit() returns a job ID right away and
+    the script runs on a worker thread. Job state is kept in a local SQLite file so
+    /jobs/{id} keeps answering for finished jobs.
+
+    - runner(scriptID, params, cancelEvent, onOutput) -> result dict, usually api.runScript.
+      onOutput(line) is called for every output line while the script runs, see followOutput().
+    - maxWorkers: executions running at the same time, all scripts together.
+    - scriptLimits: {scriptID: max running at the same time}, defaultLimit for the rest.
+    """
+
+    def __init__(self, runner, dbPath, maxWorkers=8, scriptLimits=None, defaultLimit=2):
+        self.runner = runner
+        self.dbPath = dbPath
+        self.maxWorkers = maxWorkers
+        self.scriptLimits = scriptLimits or {}
+        self.defaultLimit = defaultLimit
+        self.executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="job")
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.running = {}
+        # jobID -> {"scriptID", "params", "cancelEvent", "output", "done"} for jobs not finished yet.
+        # Parameters (passwords included) only live in memory.
+        self.active = {}
+        # Wakes up the followOutput() readers when a job prints a line or finishes
+        self.outputReady = threading.Condition()
+        self.initDB()
+
+    # ---------- SQLite ----------
+
+    def connectDB(self):
+        conn = sqlite3.connect(self.dbPath, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def initDB(self):
+        with closing(self.connectDB()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " scriptID TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " createdAt REAL NOT NULL,"
+                " startedAt REAL,"
+                " finishedAt REAL,"
+                " result TEXT,"
+                " error TEXT)"
+            )
+            # Jobs that were queued or running when the server stopped will never finish
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Server restarted before the job finished',"
+                " finishedAt = ? WHERE status IN ('queued', 'running')",
+                (time.time(),),
+            )
+
+    def updateJob(self, jobID, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self.connectDB()) as conn, conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), jobID))
+
+    # ---------- API ----------
+
+    def submit(self, scriptID: str, params: dict) -> str:
+        jobID = uuid.uuid4().hex
+        with closing(self.connectDB()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (id, scriptID, status, createdAt) VALUES (?, ?, 'queued', ?)",
+                (jobID, scriptID, time.time()),
+            )
+
+        with self.lock:
+            self.active[jobID] = {
+                "scriptID": scriptID,
+                "params": params,
+                "cancelEvent": threading.Event(),
+                "output": [],
+                "done": False,
+            }
+            self.pending.append(jobID)
+            self.dispatch()
+
+        jobLog.info(f"Job {jobID} queued for {scriptID}")
+        return jobID
+
+    def get(self, jobID: str):
+        with closing(self.connectDB()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (jobID,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        with self.lock:
+            if jobID in self.pending:
+                job["position"] = list(self.pending).index(jobID) + 1
+            if jobID in self.active:
+                job["cancelRequested"] = self.active[jobID]["cancelEvent"].is_set()
+        return job
+
+    def cancel(self, jobID: str):
+        """
+        Queued jobs are dropped right away. Running jobs get their cancel event set:
+        subprocess runs are killed, in-process runs start no more devices (the devices
+        already connected finish) and end as cancelled.
+        """
+        with self.lock:
+            job = self.active.get(jobID)
+            if job is not None:
+                job["cancelEvent"].set()
+                if jobID in self.pending:
+                    self.pending.remove(jobID)
+                    del self.active[jobID]
+                    self.updateJob(jobID, status="cancelled", finishedAt=time.time())
+                    self.finishOutput(job)
+
+        if job is not None:
+            jobLog.info(f"Cancel requested for job {jobID}")
+        return self.get(jobID)
+
+    def followOutput(self, jobID: str, keepAlive: float = 15):
+        """
+        Generator with the output lines of a job, from the first one, as the script prints
+        them. Yields None every keepAlive seconds without output. Returns when the job ends
+        (right away for jobs that are not queued or running).
+        """
+        with self.lock:
+            job = self.active.get(jobID)
+        if job is None:
+            return
+
+        index = 0
+        while True:
+            with self.outputReady:
+                if index >= len(job["output"]) and not job["done"]:
+                    self.outputReady.wait(keepAlive)
+                lines = job["output"][index:]
+                done = job["done"]
+            index += len(lines)
+
+            for line in lines:
+                yield line
+            if done and index >= len(job["output"]):
+                return
+            if not lines:
+                yield None
+
+    def depth(self) -> dict:
+        with self.lock:
+            return {"queued": len(self.pending), "running": sum(self.running.values())}
+
+    # ---------- Workers ----------
+
+    def limitFor(self, scriptID: str) -> int:
+        return self.scriptLimits.get(scriptID, self.defaultLimit)
+
+    def dispatch(self):
+        # Called with self.lock held. Starts every queued job allowed by the limits.
+        totalRunning = sum(self.running.values())
+        for jobID in list(self.pending):
+            if totalRunning >= self.maxWorkers:
+                break
+            scriptID = self.active[jobID]["scriptID"]
+            if self.running.get(scriptID, 0) >= self.limitFor(scriptID):
+                continue
+            self.pending.remove(jobID)
+            self.running[scriptID] = self.running.get(scriptID, 0) + 1
+            totalRunning += 1
+            self.executor.submit(self.runJob, jobID)
+
+    def finishOutput(self, job: dict):
+        with self.outputReady:
+            job["done"] = True
+            self.outputReady.notify_all()
+
+    def runJob(self, jobID: str):
+        job = self.active[jobID]
+        scriptID = job["scriptID"]
+        self.updateJob(jobID, status="running", startedAt=time.time())
+        jobLog.info(f"Job {jobID} started for {scriptID}")
+
+        def onOutput(line):
+            with self.outputReady:
+                job["output"].append(line)
+                self.outputReady.notify_all()
+
+        try:
+            result = self.runner(scriptID, job["params"], job["cancelEvent"], onOutput)
+            if result.get("cancelled"):
+                status = "cancelled"
+            elif "error" in result or result.get("returncode"):
+                status = "failed"
+            else:
+                status = "succeeded"
+            self.updateJob(jobID, status=status, finishedAt=time.time(), result=json.dumps(result))
+        except Exception as e:
+            jobLog.error(f"Job {jobID} failed: {e}\n{traceback.format_exc()}")
+            self.updateJob(jobID, status="failed", finishedAt=time.time(), error=str(e))
+        finally:
+            # The final status is already saved, so readers of the stream can fetch it
+            self.finishOutput(job)
+            with self.lock:
+                self.running[scriptID] -= 1
+                del self.active[jobID]
+                self.dispatch()
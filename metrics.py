@@ -0,0 +1,141 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# ========================
+# METRICAS (FORMATO PROMETHEUS)
+# ========================
+
+# Upper bounds in seconds: from a cached show result to a slow device over a WAN
+secondsBuckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+tokenBuckets = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+def escapeLabel(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def formatLabels(labels, extra=()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escapeLabel(value)}"' for name, value in pairs) + "}"
+
+
+def formatValue(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative histogram per label set, same buckets for all of them.
+    """
+
+    def __init__(self, name: str, help: str, buckets=secondsBuckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        # labels (sorted tuple of pairs) -> [count per bucket + one for +Inf, sum]
+        self.series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted((name, str(v)) for name, v in labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self.series[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = [(key, list(counts), total) for key, (counts, total) in sorted(self.series.items())]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{formatLabels(key, [('le', formatValue(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_sum{formatLabels(key)} {formatValue(total)}")
+            lines.append(f"{self.name}_count{formatLabels(key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    Value read when /metrics is scraped: collect() -> {labels dict as tuple of pairs: value}.
+    """
+
+    def __init__(self, name: str, help: str, collect):
+        self.name = name
+        self.help = help
+        self.collect = collect
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{formatLabels(key)} {formatValue(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def histogram(self, name: str, help: str, buckets=secondsBuckets) -> Histogram:
+        # Get or create, so modules can declare the same metric
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(name, help, buckets)
+            return self.metrics[name]
+
+    def gauge(self, name: str, help: str, collect) -> Gauge:
+        with self.lock:
+            self.metrics[name] = Gauge(name, help, collect)
+            return self.metrics[name]
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+llmSeconds = registry.histogram("netops_llm_request_seconds", "Latency of the chat completion calls.")
+llmPromptTokens = registry.histogram("netops_llm_prompt_tokens", "Prompt tokens per chat completion.", tokenBuckets)
+llmCompletionTokens = registry.histogram("netops_llm_completion_tokens", "Completion tokens per chat completion.", tokenBuckets)
+chatStageSeconds = registry.histogram("netops_chat_stage_seconds", "Time of each stage of a /chat request.")
+scriptSeconds = registry.histogram("netops_script_run_seconds", "Wall time of a script execution by script ID.")
+deviceStageSeconds = registry.histogram(
+    "netops_device_stage_seconds", "SSH stages per device (connect, enable, command, config, disconnect)."
+)
+probeSeconds = registry.histogram("netops_reachability_probe_seconds", "TCP 22 probes of validateIP.")
+
+# Metrics sent by the scripts (scripts/scriptMetrics.py) by name
+scriptHistograms = {
+    "device_stage_seconds": deviceStageSeconds,
+    "probe_seconds": probeSeconds,
+}
+
+
+def observeScriptMetric(name, value, labels):
+    histogram = scriptHistograms.get(name)
+    if histogram is None:
+        histogram = registry.histogram(f"netops_{name}", f"{name} sent by the scripts.")
+    histogram.observe(float(value), **labels)
@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import itertools
+import logging
+import os
+import tempfile
+import time
+
+# ========================
+# ALMACÉN DE SALIDAS GRANDES
+# ========================
+
+storeLog = logging.getLogger("resultStore")
+
+
+class ResultStore:
+    """
+    Content-addressed store for large script outputs. Each text is saved once,
+    gzip-compressed, under its SHA-256: <rootDir>/<first 2 hex>/<sha256>.gz.
+    The same output (same command on the same devices) is stored only once.
+
+    - spillBytes: outputs bigger than this are stored and replaced by a preview + handle.
+    - previewLines: lines kept in the job result (and in the chat) as a preview.
+    """
+
+    def __init__(self, rootDir, spillBytes=64 * 1024, previewLines=40):
+        self.rootDir = rootDir
+        self.spillBytes = spillBytes
+        self.previewLines = previewLines
+        os.makedirs(rootDir, exist_ok=True)
+
+    def pathFor(self, resultID: str) -> str:
+        return os.path.join(self.rootDir, resultID[:2], f"{resultID}.gz")
+
+    def isValidID(self, resultID: str) -> bool:
+        return len(resultID) == 64 and all(c in "0123456789abcdef" for c in resultID)
+
+    def put(self, text: str) -> dict:
+        data = text.encode("utf-8")
+        resultID = hashlib.sha256(data).hexdigest()
+        path = self.pathFor(resultID)
+
+        if os.path.exists(path):
+            # Already stored: only refresh the date so prune() keeps it
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Temporary file + rename, a reader never sees half a gzip file
+            fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as file, gzip.GzipFile(fileobj=file, mode="wb", mtime=0) as gz:
+                gz.write(data)
+            os.replace(tmpPath, path)
+            storeLog.info(f"Stored result {resultID} ({len(data)} bytes)")
+
+        return {"id": resultID, "bytes": len(data), "lines": text.count("\n") + (0 if text.endswith("\n") else 1)}
+
+    def exists(self, resultID: str) -> bool:
+        return self.isValidID(resultID) and os.path.exists(self.pathFor(resultID))
+
+    def page(self, resultID: str, offset: int = 0, limit: int = 200) -> dict:
+        """
+        Lines [offset, offset + limit) of a stored output. Only the page is kept in
+        memory, the rest of the file is decompressed and skipped.
+        """
+        with gzip.open(self.pathFor(resultID), "rt", encoding="utf-8", newline="") as file:
+            lines = [line.rstrip("\n") for line in itertools.islice(file, offset, offset + limit)]
+            hasMore = file.readline() != ""
+
+        return {
+            "id": resultID,
+            "offset": offset,
+            "limit": limit,
+            "lines": lines,
+            "nextOffset": offset + len(lines) if hasMore else None,
+        }
+
+    def spill(self, result: dict, fields=("stdout", "stderr")) -> dict:
+        """
+        Replace every field of a run result bigger than spillBytes with its first
+        previewLines lines and add "<field>Ref" with the handle of the full text.
+        """
+        for field in fields:
+            text = result.get(field)
+            # UTF-8 size: non-ASCII output has more bytes than characters (never fewer)
+            if not isinstance(text, str) or (len(text) <= self.spillBytes and len(text.encode("utf-8")) <= self.spillBytes):
+                continue
+            handle = self.put(text)
+            preview = text.split("\n", self.previewLines)[:self.previewLines]
+            result[field] = "\n".join(preview)
+            result[f"{field}Ref"] = handle
+        return result
+
+    def prune(self, maxAge: float):
+        # Remove the outputs not stored again in the last maxAge seconds
+        cutoff = time.time() - maxAge
+        removed = 0
+        for folder in os.listdir(self.rootDir):
+            folderPath = os.path.join(self.rootDir, folder)
+            if not os.path.isdir(folderPath):
+                continue
+            for name in os.listdir(folderPath):
+                path = os.path.join(folderPath, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        if removed:
+            storeLog.info(f"Removed {removed} results older than {maxAge} seconds")
+        return removed
+
+    def stats(self) -> dict:
+        files = 0
+        storedBytes = 0
+        for folder in os.listdir(self.rootDir):
+            folderPath = os.path.join(self.rootDir, folder)
+            if not os.path.isdir(folderPath):
+                continue
+            for name in os.listdir(folderPath):
+                if name.endswith(".gz"):
+                    files += 1
+                    storedBytes += os.path.getsize(os.path.join(folderPath, name))
+        return {"results": files, "storedBytes": storedBytes, "spillBytes": self.spillBytes}
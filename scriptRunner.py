@@ -0,0 +1,244 @@
+import contextvars
+import importlib
+import io
+import logging
+import os
+import sys
+import threading
+import traceback
+
+from strings import scriptsAvailable
+
+# ========================
+# EJECUCIÓN IN-PROCESS DE LOS SCRIPTS
+# ========================
+
+runnerLog = logging.getLogger("scriptRunner")
+
+baseScriptDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts")
+
+# resultProtocol.py lives in the scripts folder and is shared by all the scripts
+sys.path.append(baseScriptDir)
+import resultProtocol
+from netops_core import runFolder
+
+# scriptID -> {"folder": ..., "modules": {name: module}, "function": callable}
+loadedScripts = {}
+
+# Loading swaps the modules of a script folder in sys.modules, one folder at a time.
+# Runs do not need it: the scripts write under their own folder (absolute paths) and
+# what belongs to a run (log folder, result records, output) is kept in context
+# variables, so several in-process runs happen at the same time.
+loadLock = threading.Lock()
+
+# Output of the in-process run the current thread works for, see RunStdout
+runOutput = contextvars.ContextVar("runOutput", default=None)
+
+
+def loadScriptModules(folder: str, moduleName: str) -> dict:
+    """
+    Import moduleName from scripts/<folder> without clashing with the other script
+    folders, which all use the same module names (functions, log, utils, ...).
+    Returns the modules that belong to the folder.
+    """
+    folderPath = os.path.join(baseScriptDir, folder)
+    folderNames = [f[:-3] for f in os.listdir(folderPath) if f.endswith(".py")]
+
+    with loadLock:
+        saved = {name: sys.modules.pop(name) for name in folderNames if name in sys.modules}
+        sys.path.insert(0, folderPath)
+        try:
+            # logs/ and Outputs/ must exist before log.py opens its handlers
+            importlib.import_module("utils").mkdir()
+            # functions is always needed to validate the devices
+            importlib.import_module("functions")
+            importlib.import_module(moduleName)
+
+            modules = {}
+            for name in folderNames:
+                module = sys.modules.get(name)
+                if module is not None and os.path.dirname(os.path.abspath(getattr(module, "__file__", ""))) == folderPath:
+                    modules[name] = sys.modules.pop(name)
+            return modules
+        finally:
+            sys.path.remove(folderPath)
+            for name in folderNames:
+                sys.modules.pop(name, None)
+            sys.modules.update(saved)
+
+
+def loadScripts():
+    """
+    Load once (at startup) every script of the catalog that declares an in-process callable.
+    Scripts that fail to load keep running as a subprocess.
+    """
+    if not isinstance(sys.stdout, RunStdout):
+        sys.stdout = RunStdout(sys.stdout)
+    for scriptID, info in scriptsAvailable.items():
+        spec = info.get("inProcess")
+        if not spec or scriptID in loadedScripts:
+            continue
+        try:
+            modules = loadScriptModules(info["folder"], spec["module"])
+            loadedScripts[scriptID] = {
+                "folder": os.path.join(baseScriptDir, info["folder"]),
+                "modules": modules,
+                "function": getattr(modules[spec["module"]], spec["function"]),
+            }
+            runnerLog.info(f"Loaded {scriptID} in-process: {spec['module']}.{spec['function']}")
+        except Exception as e:
+            runnerLog.error(f"Could not load {scriptID} in-process, it will run as a subprocess: {e}\n{traceback.format_exc()}")
+
+
+def isLoaded(scriptID: str) -> bool:
+    return scriptID in loadedScripts
+
+
+def buildArgs(scriptID: str, params: dict) -> list:
+    """
+    Translate the chat parameters to the arguments of the script function, using the
+    "args" list of the catalog. validIPs and netDevice are built the same way main.py does.
+    """
+    spec = scriptsAvailable[scriptID]["inProcess"]
+    functions = loadedScripts[scriptID]["modules"]["functions"]
+
+    args = []
+    for name in spec["args"]:
+        if name == "validIPs":
+            devices = [d.strip() for d in str(params["devices"]).split(",") if d.strip()]
+            validIPs = []
+            for device, ipOut in zip(devices, functions.validateIPsBatch(devices)):
+                if ipOut:
+                    validIPs.append(ipOut)
+                else:
+                    resultProtocol.emitDevice(
+                        scriptID, device, "unreachable", 0,
+                        error="invalid or unreachable on TCP 22", errorClass="Unreachable",
+                    )
+            if not validIPs:
+                raise ValueError("No valid IP addresses found after validation.")
+            args.append(validIPs)
+        elif name == "netDevice":
+            args.append({"password": params["password"], "secret": params["password"]})
+        else:
+            args.append(params[name])
+    return args
+
+
+def buildKwargs(scriptID: str, params: dict) -> dict:
+    """
+    Optional chat parameters of the catalog ("optionalArgs": {param: argument}), passed
+    as keyword arguments only when the user gave them.
+    """
+    spec = scriptsAvailable[scriptID]["inProcess"]
+    return {
+        argName: params[name]
+        for name, argName in spec.get("optionalArgs", {}).items()
+        if params.get(name) not in (None, "")
+    }
+
+
+class LineWriter(io.StringIO):
+    """
+    stdout replacement that keeps everything written and also passes every complete
+    line to onLine, so the output of an in-process run can be streamed.
+    """
+
+    def __init__(self, onLine=None):
+        super().__init__()
+        self.onLine = onLine
+        self.partial = ""
+        # The device threads of a run print at the same time
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            written = super().write(text)
+            if self.onLine is not None:
+                lines = (self.partial + text).split("\n")
+                self.partial = lines.pop()
+                for line in lines:
+                    self.onLine(line)
+            return written
+
+    def flushPartial(self):
+        with self.lock:
+            if self.onLine is not None and self.partial:
+                self.onLine(self.partial)
+            self.partial = ""
+
+
+class RunStdout:
+    """
+    sys.stdout of the backend once the scripts are loaded. The prints of a thread that
+    works for an in-process run go to the output of that run, the rest to the real stdout.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        return (runOutput.get() or self.stream).write(text)
+
+    def flush(self):
+        if runOutput.get() is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def runInProcess(scriptID: str, params: dict, onOutput=None, connectHandler=None, cancelEvent=None) -> dict:
+    """
+    Call the script function directly in the backend process. Returns the same
+    {"returncode", "stdout", "stderr", "devices", "summary"} dict as the subprocess runner.
+    onOutput(line) gets the output lines while the script runs. Scripts whose catalog
+    entry has "resultCallback" hand over each device result as soon as it is ready.
+    connectHandler replaces netmiko ConnectHandler for scripts whose catalog entry has
+    "connectHandler" (the backend session pool). cancelEvent goes to the argument named
+    by "cancelEvent" in the catalog: once set, the script starts no more devices and the
+    result has "cancelled": True.
+    """
+    script = loadedScripts[scriptID]
+    spec = scriptsAvailable[scriptID]["inProcess"]
+    stdout = LineWriter(onOutput)
+    returncode = 0
+    stderr = ""
+    records = []
+
+    kwargs = {}
+    if spec.get("resultCallback"):
+        kwargs[spec["resultCallback"]] = lambda outText: stdout.write(outText + "\n\n")
+    if connectHandler is not None and spec.get("connectHandler"):
+        kwargs[spec["connectHandler"]] = connectHandler
+    if cancelEvent is not None and spec.get("cancelEvent"):
+        kwargs[spec["cancelEvent"]] = cancelEvent
+
+    # Log folder, per-device records (same as main.py --format ndjson) and prints of this run
+    tokens = [
+        (runFolder, runFolder.set(script["folder"])),
+        (resultProtocol.runSink, resultProtocol.runSink.set(records.append)),
+        (runOutput, runOutput.set(stdout)),
+    ]
+    try:
+        out = script["function"](*buildArgs(scriptID, params), **kwargs, **buildKwargs(scriptID, params))
+        # With resultCallback the results were already written one by one
+        if isinstance(out, str) and out and not spec.get("resultCallback"):
+            stdout.write(out + "\n")
+    except Exception as e:
+        returncode = 1
+        stderr = f"{e}\n{traceback.format_exc()}"
+    finally:
+        for variable, token in reversed(tokens):
+            variable.reset(token)
+        stdout.flushPartial()
+
+    result = {
+        "returncode": returncode,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr,
+        **resultProtocol.collect(records),
+    }
+    if cancelEvent is not None and cancelEvent.is_set() and spec.get("cancelEvent"):
+        result["cancelled"] = True
+    return result
@@ -1,14 +1,17 @@
 from netmiko import ConnectHandler
 # from functions import logInCSV
+from functions import scriptName, outputPath
 from log import authLog
+from netops_core import outputForLog, deviceParams, deviceSession, deviceHostname, inventory, SiteRateLimiter, ContextExecutor
+import scriptMetrics
+import resultProtocol
 
 from threading import Lock
 import concurrent.futures
 from tqdm import tqdm
 import traceback
 import getpass
-import os
-import re
+import time
 
 aclCommnd = "snmp-server group grpallRO v3 priv read fullview write noview notify fullview"
 aclCommndNX = "no snmp-server user anthemnmsa use-ipv4acl SNMP-RO"
@@ -19,93 +22,161 @@ removeNXSNMP = "no snmp-server user anthemnmsa"
 userNx = "username anthemnmsa role vdc-admin"
 NXcred = "snmp-server user anthemnmsa vdc-admin auth sha PASSWORD priv aes-128 PASSWORD"
 
-def aclRemoval(validIPs, username, password):
-    # This function is to remove the ACL from a SNMP group 
-    results = []
-    
-    for validDeviceIP in validIPs:
-        try:
-            validDeviceIP = validDeviceIP.strip()
-            currentNetDevice = {
-                'device_type': 'cisco_xe', #'cisco_xe' 'cisco_nxos'
-                'ip': validDeviceIP,
-                'username': username,
-                'password': password,
-                'secret': password,
-                'global_delay_factor': 2.0,
-                'timeout': 120,
-                'session_log': 'Outputs/netmikoLog.txt',
-                'verbose': False,
-                'session_log_file_mode': 'append'
-            }
-
-            # tqdm.write(f"INFO: Connecting to device {validDeviceIP}...")
-            with ConnectHandler(**currentNetDevice) as sshAccess:
-                authLog.info(f"User {username} is now running commands at: {validDeviceIP}")
-                authLog.info(f"Generating hostname for {validDeviceIP}")
-                shHostnameOut = re.sub(".mgmt.internal.das|.cm.mgmt.internal.das|.mgmt.wellpoint.com","#", validDeviceIP)
-                authLog.info(f"Hostname for {validDeviceIP}: {shHostnameOut}")
-                # tqdm.write(f"INFO: This is the hostname: {shHostnameOut}")
+# Config lines sent in one send_config_set per device
+aclCommands = [aclCommnd] # For Nexus [aclCommndNX], for IOS-XE [aclCommnd]
+
+def printDevice(text):
+    # Device lines of the text output. With result records (ndjson or in-process) the
+    # record carries the same output and the stdout lines would break the NDJSON stream
+    if resultProtocol.collecting():
+        return
+    with resultProtocol.writeLock:
+        print(text)
+
+def aclRemovalDevice(validDeviceIP, username, password, rateLimiter=None, sessionLog=outputPath('Outputs', 'netmikoLog.txt')):
+    # Removes the ACL from the SNMP group of one device, returns (device, status, error)
+    startTime = time.perf_counter()
+    validDeviceIP = validDeviceIP.strip()
+    try:
+        currentNetDevice = deviceParams(validDeviceIP, username, password, sessionLog=sessionLog)
+
+        # Logins of the same site are spaced out (TACACS)
+        if rateLimiter is not None:
+            rateLimiter.acquire(validDeviceIP)
+
+        # tqdm.write(f"INFO: Connecting to device {validDeviceIP}...")
+        with deviceSession(ConnectHandler, currentNetDevice, scriptName) as sshAccess:
+            authLog.info(f"User {username} is now running commands at: {validDeviceIP}")
+            authLog.info(f"Generating hostname for {validDeviceIP}")
+            shHostnameOut = deviceHostname(validDeviceIP) + '#'
+            authLog.info(f"Hostname for {validDeviceIP}: {shHostnameOut}")
+            # tqdm.write(f"INFO: This is the hostname: {shHostnameOut}")
+            with scriptMetrics.stage(scriptName, "enable"):
                 sshAccess.enable()
-                
-                # tqdm.write(f"Configuring: {aclCommnd}, on device: {validDeviceIP}")
-                
-                # userNxOUT = sshAccess.send_config_set(userNx) # For Nexus only
-                # tqdm.write(f"{shHostnameOut}{userNx}\n{userNxOUT}")
-                # authLog.info(f"{shHostnameOut}{userNx}\n{userNxOUT}")
-                
-                
-                # NXcredOut = sshAccess.send_config_set(NXcred) # For Nexus only
-                # tqdm.write(f"{shHostnameOut}{NXcred}\n{NXcredOut}")
-                # authLog.info(f"{shHostnameOut}{NXcred}\n{NXcredOut}")
-                
-                
-                aclCommndOut = sshAccess.send_config_set(aclCommnd) # For Nexus aclCommndNX, for IOS-XE aclCommnd
-                authLog.info(f"{shHostnameOut}{aclCommnd}\n{aclCommndOut}")
-                print(f"Removing ACL from SNMP Group on device {validDeviceIP}:\n{aclCommndOut}") #\n{shHostnameOut}{aclCommnd}
-
-                # tqdm.write(f"Verifying config with: {verifyCommd}, on device: {validDeviceIP}")
+
+            # tqdm.write(f"Configuring: {aclCommnd}, on device: {validDeviceIP}")
+
+            # userNxOUT = sshAccess.send_config_set(userNx) # For Nexus only
+            # tqdm.write(f"{shHostnameOut}{userNx}\n{userNxOUT}")
+            # authLog.info(f"{shHostnameOut}{userNx}\n{userNxOUT}")
+
+
+            # NXcredOut = sshAccess.send_config_set(NXcred) # For Nexus only
+            # tqdm.write(f"{shHostnameOut}{NXcred}\n{NXcredOut}")
+            # authLog.info(f"{shHostnameOut}{NXcred}\n{NXcredOut}")
+
+
+            with scriptMetrics.stage(scriptName, "config"):
+                aclCommndOut = sshAccess.send_config_set(aclCommands)
+            authLog.info(f"{shHostnameOut}{aclCommnd}\n{outputForLog(aclCommndOut)}")
+            printDevice(f"Removing ACL from SNMP Group on device {validDeviceIP}:\n{aclCommndOut}") #\n{shHostnameOut}{aclCommnd}
+
+            # tqdm.write(f"Verifying config with: {verifyCommd}, on device: {validDeviceIP}")
+            with scriptMetrics.stage(scriptName, "command"):
                 verifyCommdOut = sshAccess.send_command_timing(verifyCommd) # For Nexus verifyCommndNX, for IOS-XE verifyCommd
-                # tqdm.write(f"{shHostnameOut}{verifyCommd}\n{verifyCommdOut}")
-                authLog.info(f"{shHostnameOut}{verifyCommd}\n{verifyCommdOut}")
-
-                if "access 61" in verifyCommdOut: # For Nexus "ipv4:SNMP-RO", for IOS-XE "access 61"
-                    # tqdm.write(f"INFO: Device:{validDeviceIP}, not configured properly")
-                    authLog.info(f"Device:{validDeviceIP}, not configured properly")
-                    # logInCSV(validDeviceIP, "Failed to configure devices")
-
-                else:
-                    print(f"INFO: Device:{validDeviceIP}, configured properly\n")
-                    authLog.info(f"Device:{validDeviceIP}, configured properly")
-                    # logInCSV(validDeviceIP, "Successfully configured devices", verifyCommdOut)
-                    outText1 = f"ACL from SNMP Group on device {validDeviceIP} removed successfully"
-                
+            # tqdm.write(f"{shHostnameOut}{verifyCommd}\n{verifyCommdOut}")
+            authLog.info(f"{shHostnameOut}{verifyCommd}\n{outputForLog(verifyCommdOut)}")
+
+            configured = "access 61" not in verifyCommdOut # For Nexus "ipv4:SNMP-RO", for IOS-XE "access 61"
+            if not configured:
+                # tqdm.write(f"INFO: Device:{validDeviceIP}, not configured properly")
+                authLog.info(f"Device:{validDeviceIP}, not configured properly")
+                # logInCSV(validDeviceIP, "Failed to configure devices")
+
+            else:
+                printDevice(f"INFO: Device:{validDeviceIP}, configured properly\n")
+                authLog.info(f"Device:{validDeviceIP}, configured properly")
+                # logInCSV(validDeviceIP, "Successfully configured devices", verifyCommdOut)
+
+            # One copy run start per device, after the whole batch
+            with scriptMetrics.stage(scriptName, "save"):
                 writeMemOut = sshAccess.send_command_timing(writeMem)
-                # tqdm.write(f"INFO: Running configuration saved for device {validDeviceIP}")
-                authLog.info(f"Running configuration saved for device {validDeviceIP}\n{shHostnameOut}{writeMem}\n{writeMemOut}")
-            
-                # results.append(outText)
-                # results.append(outText1)
-
-        except Exception as error:
-            # tqdm.write(f"ERROR: An error occurred: {error}\n{traceback.format_exc()}")
-            authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}\n{traceback.format_exc()}")
-            results.append(f"Error on {validDeviceIP}, error: {error}")
-            # logInCSV(validDeviceIP, "Failed Devices", error)
-
-def aclRemovalThread(validIPs, username, password, maxThreads=100):
-    with concurrent.futures.ThreadPoolExecutor(max_workers=maxThreads) as executor:
-        futureToIP = {
-            executor.submit(aclRemoval, validDeviceIP, username, password): validDeviceIP
-            for validDeviceIP in validIPs
+            # tqdm.write(f"INFO: Running configuration saved for device {validDeviceIP}")
+            authLog.info(f"Running configuration saved for device {validDeviceIP}\n{shHostnameOut}{writeMem}\n{outputForLog(writeMemOut)}")
+            error = None if configured else "ACL still applied to the SNMP group after the change"
+            resultProtocol.emitDevice(
+                scriptName, validDeviceIP, "ok" if configured else "failed", time.perf_counter() - startTime,
+                hostname=shHostnameOut.rstrip("#"), command=aclCommnd,
+                output=f"{aclCommndOut}\n{shHostnameOut}{verifyCommd}\n{verifyCommdOut}",
+                error=error, errorClass=None if configured else "VerificationFailed",
+            )
+            return validDeviceIP, "ok" if configured else "failed", error
+
+    except Exception as error:
+        # tqdm.write(f"ERROR: An error occurred: {error}\n{traceback.format_exc()}")
+        authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}\n{traceback.format_exc()}")
+        resultProtocol.emitDevice(scriptName, validDeviceIP, "failed", time.perf_counter() - startTime, command=aclCommnd, error=error)
+        # logInCSV(validDeviceIP, "Failed Devices", error)
+        return validDeviceIP, "failed", str(error)
+
+def aclSummary(results):
+    # Text returned to the backend (and printed by main.py) after all the devices
+    failed = [(device, error) for device, status, error in results if status == "failed"]
+    cancelled = [device for device, status, error in results if status == "cancelled"]
+    configured = len(results) - len(failed) - len(cancelled)
+    lines = [f"Summary: {len(results)} devices, {configured} configured, {len(failed)} failed"]
+    if cancelled:
+        lines[0] += f", {len(cancelled)} not started (run cancelled)"
+    for device, error in failed:
+        lines.append(f"  FAILED {device}: {error}")
+    authLog.info("\n".join(lines))
+    return "\n".join(lines)
+
+def cancelledDevice(validDeviceIP, cancelEvent):
+    # (device, "cancelled", None) when the run was cancelled before this device, else None
+    if cancelEvent is not None and cancelEvent.is_set():
+        authLog.info(f"Run cancelled, device {validDeviceIP.strip()} not configured")
+        return validDeviceIP.strip(), "cancelled", None
+    return None
+
+def aclRemoval(validIPs, username, password, cancelEvent=None):
+    # This function is to remove the ACL from a SNMP group, one device after the other.
+    # cancelEvent (optional) stops the run before the next device once it is set
+    inventory.preload(validIPs)
+    results = [
+        cancelledDevice(validDeviceIP, cancelEvent) or aclRemovalDevice(validDeviceIP, username, password)
+        for validDeviceIP in validIPs
+    ]
+    inventory.flush()
+    return aclSummary(results)
+
+def aclRemovalThread(validIPs, username, password, maxThreads=1, siteRate=None, siteBurst=None, cancelEvent=None):
+    # Same as aclRemoval with up to maxThreads devices at the same time (one by one unless
+    # the caller asks for more, config changes are not parallel by default). The logins of each
+    # site are rate limited (netops_core/ratelimit.py, NETOPS_SITE_LOGIN_RATE / _BURST).
+    # Once cancelEvent (optional) is set the devices not started yet are skipped.
+    maxThreads = max(1, int(maxThreads))
+    rateLimiter = SiteRateLimiter(siteRate, siteBurst)
+    results = [None] * len(validIPs)
+    inventory.preload(validIPs)
+
+    def runDevice(validDeviceIP):
+        cancelled = cancelledDevice(validDeviceIP, cancelEvent)
+        if cancelled:
+            return cancelled
+        sessionLog = outputPath("Outputs", f"netmikoLog {validDeviceIP.strip()}.txt")
+        return aclRemovalDevice(validDeviceIP, username, password, rateLimiter, sessionLog)
+
+    authLog.info(f"Removing the SNMP group ACL on {len(validIPs)} devices with {maxThreads} threads")
+    with ContextExecutor(max_workers=maxThreads) as executor:
+        futureToIndex = {
+            executor.submit(runDevice, validDeviceIP): index
+            for index, validDeviceIP in enumerate(validIPs)
         }
-        
-        for future in tqdm(concurrent.futures.as_completed(futureToIP), total=len(futureToIP), desc="Testing devices") :
-            ipAddress = futureToIP[future]
+
+        # No progress bar when the backend runs the script (records instead)
+        progress = tqdm(
+            concurrent.futures.as_completed(futureToIndex), total=len(futureToIndex), desc="Configuring devices",
+            disable=resultProtocol.collecting(),
+        )
+        for future in progress:
+            index = futureToIndex[future]
             try:
-                future.result()
+                results[index] = future.result()
             except Exception as error:
-                authLog.error(f"IP Address: {ipAddress} with thread failed with exception/error: {error}\n{traceback.format_exc()}")
+                authLog.error(f"IP Address: {validIPs[index]} with thread failed with exception/error: {error}\n{traceback.format_exc()}")
+                results[index] = (validIPs[index], "failed", str(error))
                 # logInCSV(ipAddress, "Devices Threads with errors", "Error:", error)
 
-    os.system("PAUSE")
+    inventory.flush()
+    return aclSummary(results)
@@ -1,12 +1,25 @@
 from log import authLog
 from netmiko.exceptions import NetMikoAuthenticationException, NetMikoTimeoutException
 
-import socket
 import getpass
-import csv
 import traceback
+import sys
+import os
 from datetime import datetime
 
+# netops_core lives in the scripts folder and is shared by all the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netops_core import DeviceResolver, ScriptOutputs
+
+# Label of the metrics sent by this script (its folder name)
+scriptName = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
+# Output files in the folder of the script, whatever the current folder is (netops_core/output.py)
+outputs = ScriptOutputs(os.path.dirname(os.path.abspath(__file__)))
+outputPath = outputs.path
+logInCSV = outputs.logInCSV
+genTxtFile = outputs.genTxtFile
+
 def checkIsDigit(input_str):
     try:
         authLog.info(f"String successfully validated selection number {input_str}, from checkIsDigit function.")
@@ -16,66 +29,11 @@ def checkIsDigit(input_str):
         authLog.error(f"Invalid option chosen: {input_str}, error: {error}")
         authLog.error(traceback.format_exc())
                 
-def validateIP(deviceIP):
-    hostnamesResolution = [
-        f'{deviceIP}.mgmt.internal.das',
-        f'{deviceIP}.cm.mgmt.internal.das',
-        f'{deviceIP}.mgmt.wellpoint.com'
-    ]
-        
-    def checkConnect22(ipAddress, port=22, timeout=3):
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as connectTest:
-                connectTest.settimeout(timeout)
-                connectTestOut = connectTest.connect_ex((ipAddress, port))
-                return connectTestOut == 0
-        except socket.error as error:
-            authLog.error(f"Device {ipAddress} is not reachable on port TCP 22.")
-            authLog.error(f"Error:{error}\n{traceback.format_exc()}")
-            return False
-
-    def validIP(ip):
-        try:
-            socket.inet_aton(ip)
-            authLog.info(f"IP successfully validated: {deviceIP}")
-            return True
-        except socket.error:
-            authLog.error(f"IP: {ip} is not an IP Address, will attempt to resolve hostname.")
-            return False
-
-    def resolveHostname(hostname):
-        try:
-            hostnameOut = socket.gethostbyname(hostname)
-            authLog.info(f"Hostname successfully validated: {hostname}")
-            return hostnameOut
-        except socket.gaierror:
-            authLog.error(f"Was not posible to resolve hostname: {hostname}")
-            return None
-
-    if validIP(deviceIP):
-        if checkConnect22(deviceIP):
-            authLog.info(f"Device IP {deviceIP} is reachable on Port TCP 22.")
-            # print(f"INFO: Device IP {deviceIP} is reachable on Port TCP 22.")
-            return deviceIP
-
-    for hostname in hostnamesResolution:
-        resolvedIP = resolveHostname(hostname)
-        if resolvedIP and checkConnect22(resolvedIP):
-            authLog.info(f"Device IP {hostname} is reachable on Port TCP 22.")
-            # print(f"INFO: Device IP {hostname} is reachable on Port TCP 22.")
-            return hostname    
-
-    hostnameStr = ', '.join(hostnamesResolution)  
-    
-    authLog.error(f"Not a valid IP address or hostname: {hostnameStr}")
-    authLog.error(traceback.format_exc())
-    print(f"ERROR: Invalid IP address or hostname: {hostnameStr}")
-
-    with open('Outputs/Invalid Destinations (unreachable).csv', mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([hostnameStr])
-    
-    return None
+# validateIP / validateIPsBatch are the same for all the scripts (scripts/netops_core/resolution.py)
+resolver = DeviceResolver(scriptName, unreachableFile=outputPath('Outputs', 'Invalid Destinations (unreachable).csv'), printUnreachable=True)
+checkConnect22 = resolver.checkConnect22
+validateIP = resolver.validateIP
+validateIPsBatch = resolver.validateIPsBatch
 
 def requestLogin():
     username = input("Please enter your username: ")
@@ -89,31 +47,6 @@ def requestLogin():
 def checkYNInput(stringInput):
     return stringInput.strip().lower() in ['y', 'n']
 
-def logInCSV(validDeviceIP, filename="", *args):
-    # print(f"INFO: File created: {filename}")
-    with open(f'Outputs/{filename}.csv', mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([validDeviceIP, *args])
-        authLog.info(f"Appended device: {validDeviceIP} to file {filename}")
-
-def genTxtFile(validDeviceIP, username, filename="", *args):
-    with open(f"Outputs/{validDeviceIP} {filename}.txt","a") as failedDevices:
-        failedDevices.write(f"User {username} connected to {validDeviceIP}\n\n")
-        for arg in args:
-            if isinstance(arg, dict):
-                for key,values in arg.items():
-                    failedDevices.write(f"{key}: ")
-                    failedDevices.write(", ".join(str(v) for v in values))
-                    failedDevices.write("\n")
-            
-            elif isinstance(arg, list):
-                for item in arg:
-                    failedDevices.write(item)
-                    failedDevices.write("\n")
-
-            elif isinstance(arg, str):
-                failedDevices.write(arg + "\n")
-
 # def createPDF(devicesErrList, user):
 #     dateHour = datetime.now()
 #     dateHourOut = dateHour.strftime("%Y-%m-%d %H:%M:%S")
@@ -6,9 +6,10 @@ def main():
     # Crear carpetas logs/Outputs si no existen
     mkdir()
 
-    from functions import validateIP
-    from commandsCLI import aclRemoval
+    from functions import validateIPsBatch, scriptName
+    from commandsCLI import aclRemoval, aclRemovalThread
     from log import authLog
+    import resultProtocol
 
     """
     Modo NO interactivo, pensado para ser llamado desde FastAPI / backend.
@@ -18,6 +19,8 @@ def main():
         --devices "10.1.1.1,10.1.1.2" \
         --username luis \
         --password cisco \
+        --threads 20 \
+        --format ndjson
     """
 
     parser = argparse.ArgumentParser(
@@ -38,25 +41,50 @@ def main():
         required=True,
         help="Password to use for device login (also used as enable password).",
     )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Number of devices to configure at the same time. Default 1: one by one, config changes are opt-in parallel.",
+    )
+    parser.add_argument(
+        "--site-rate",
+        type=float,
+        default=None,
+        help="Logins per second per site with --threads > 1 (default NETOPS_SITE_LOGIN_RATE or 2, 0 = no limit).",
+    )
+    parser.add_argument(
+        "--site-burst",
+        type=int,
+        default=None,
+        help="Logins allowed at once per site with --threads > 1 (default NETOPS_SITE_LOGIN_BURST or 4).",
+    )
+
+    parser.add_argument(
+        "--format",
+        choices=["text", "ndjson"],
+        default="text",
+        help="ndjson: one JSON record per device on stdout (see scripts/resultProtocol.py).",
+    )
 
     args = parser.parse_args()
 
+    # Registros por device para el backend
+    resultProtocol.enabled = args.format == "ndjson"
+
     def validateIPs(devices: str):
         """
         Recibe un string tipo '10.1.1.1,10.1.1.2'
-        Valida cada IP/hostname con validateIP y devuelve la lista de válidas.
+        Valida todas las IPs/hostnames a la vez con validateIPsBatch y devuelve la lista de válidas.
         """
         validIPs = []
-        raw_list = devices.split(",")
-        for ip in raw_list:
-            ip = ip.strip()
-            if not ip:
-                continue
-            ipOut = validateIP(ip)
+        raw_list = [ip.strip() for ip in devices.split(",") if ip.strip()]
+        for ip, ipOut in zip(raw_list, validateIPsBatch(raw_list)):
             if ipOut is not None:
                 validIPs.append(ipOut)
             else:
                 authLog.info(f"IP address {ip} is invalid or unreachable.")
+                resultProtocol.emitDevice(scriptName, ip, "unreachable", 0, error="invalid or unreachable on TCP 22", errorClass="Unreachable")
 
         if not validIPs:
             raise ValueError("No valid IP addresses found after validation.")
@@ -74,11 +102,21 @@ def main():
         f"Devices={validIPs}, username={args.username}"
     )
 
-    # Reusar tu función existente
-    aclRemoval(validIPs, args.username, args.password)
-
-    print("INFO: Non-interactive run completed successfully.")
-    print(f"INFO: Devices: {validIPs}")
+    if args.threads > 1:
+        summary = aclRemovalThread(
+            validIPs, args.username, args.password,
+            maxThreads=args.threads, siteRate=args.site_rate, siteBurst=args.site_burst,
+        )
+    else:
+        # Reusar tu función existente
+        summary = aclRemoval(validIPs, args.username, args.password)
+
+    # Resumen de OK / fallidos, también en modo ndjson (el backend lo muestra como texto)
+    print(summary, flush=True)
+
+    if not resultProtocol.enabled:
+        print("INFO: Non-interactive run completed successfully.")
+        print(f"INFO: Devices: {validIPs}")
 
 
     # return showCommandOut
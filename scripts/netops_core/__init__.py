@@ -0,0 +1,16 @@
+# Code shared by the scripts under scripts/: device inventory and resolution, SSH sessions,
+# output files, reports and logging. Each script folder imports it (functions.py, log.py,
+# utils.py, commandsCLI.py), so pooling, caching and concurrency changes made here apply
+# to every script.
+# The scripts folder must be in sys.path (the script modules append it before importing).
+
+from netops_core import inventory
+from netops_core.resolution import (
+    DeviceResolver, dnsSuffixes, hostnameCandidates, shortHostname, deviceHostname, validIP, resolveHostname,
+)
+from netops_core.connection import commandList, deviceParams, deviceSession, stage
+from netops_core.output import outputLock, ScriptOutputs, mkdir, failedDevices, logInCSV, genTxtFile, filterFilename
+from netops_core.context import runFolder, ContextExecutor
+from netops_core.logs import setupLogging, outputForLog
+from netops_core.ratelimit import SiteRateLimiter, siteOf
+from netops_core.report import ReportStream, submitReport, writeReport
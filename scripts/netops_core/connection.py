@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+import time
+
+import scriptMetrics
+
+from netops_core import inventory
+
+# SSH sessions of the scripts. The connection handler (netmiko ConnectHandler) is passed by
+# the script, so each script keeps its own import and a test or benchmark can replace it.
+
+def commandList(commands):
+    # One command (str) or an ordered list of them, as a list without the empty ones
+    if isinstance(commands, str):
+        commands = [commands]
+    return [command.strip() for command in commands if command and command.strip()]
+
+def deviceParams(deviceIP, username, password, secret=None, sessionLog='Outputs/netmikoLog.txt',
+                 deviceType='cisco_xe', verbose=False, **extra):
+    # Netmiko parameters shared by every script, extra ones (port, fast_cli, ...) are added as they are
+    params = {
+        'device_type': deviceType,
+        'ip': deviceIP.strip(),
+        'username': username,
+        'password': password,
+        'secret': secret if secret is not None else password,
+        'global_delay_factor': 2.0,
+        'timeout': 120,
+        'session_log': sessionLog,
+        'verbose': verbose,
+        'session_log_file_mode': 'append'
+    }
+    params.update(extra)
+    return params
+
+@contextmanager
+def deviceSession(connectHandler, device, script):
+    # "with ConnectHandler(**device) as sshAccess" timing the connect and the disconnect.
+    # A successful login is recorded in the device inventory (last seen and login time). The
+    # device_type of the inventory is only set by platform detection, each script connects
+    # with its own.
+    start = time.perf_counter()
+    with scriptMetrics.deviceSession(connectHandler, device, script) as sshAccess:
+        inventory.seen(device['ip'], time.perf_counter() - start)
+        yield sshAccess
+
+def stage(script, stageName):
+    # Time of one SSH stage of a device: enable, command, config, save
+    return scriptMetrics.stage(script, stageName)
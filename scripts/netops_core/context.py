@@ -0,0 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
+
+# The backend runs several scripts at the same time in its own process (scriptRunner.py),
+# so what belongs to one run is kept in context variables instead of process wide state
+# (working directory, sys.stdout, module globals): runFolder here, the result sink in
+# resultProtocol.py and the output of the run in scriptRunner.py.
+# Threads started by the scripts keep the context of their run through ContextExecutor.
+# Standalone runs (main.py) never set them.
+
+# Folder of the script the current thread works for, its logs go to <runFolder>/logs
+runFolder = ContextVar("runFolder", default=None)
+
+class ContextExecutor(ThreadPoolExecutor):
+    # ThreadPoolExecutor whose tasks run with the context variables of the thread that submits them
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(copy_context().run, fn, *args, **kwargs)
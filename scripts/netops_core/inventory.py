@@ -0,0 +1,189 @@
+from contextlib import closing
+from threading import Lock
+import traceback
+import logging
+import sqlite3
+import atexit
+import time
+import os
+
+# Local device inventory shared by every script and the backend: what the scripts learn
+# about a device (DNS name that answered, address, winning DNS suffix, short hostname,
+# netmiko device_type, platform, last time seen and its login latency) is kept between
+# runs, so a large run reads it with one query instead of discovering it again.
+#   NETOPS_INVENTORY_DB              SQLite file (default scripts/deviceInventory.db)
+#   NETOPS_RESOLUTION_TTL            seconds a resolved name is trusted (default 86400)
+#   NETOPS_RESOLUTION_NEGATIVE_TTL   seconds a device with no answering name is skipped (default 600)
+#   NETOPS_PLATFORM_TTL              seconds a learned platform is trusted (default 604800)
+#
+# One row per device token: the name or IP typed by the user and the name the scripts
+# connect to (validateIP stores both). hostname NULL with resolvedAt set is a negative
+# entry: none of the DNS suffixes answered.
+
+inventoryPath = os.getenv(
+    "NETOPS_INVENTORY_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "deviceInventory.db"),
+)
+resolutionTTL = int(os.getenv("NETOPS_RESOLUTION_TTL", "86400"))
+negativeTTL = int(os.getenv("NETOPS_RESOLUTION_NEGATIVE_TTL", "600"))
+platformTTL = int(os.getenv("NETOPS_PLATFORM_TTL", "604800"))
+
+columns = (
+    "hostname", "address", "suffix", "shortName", "candidates", "resolvedAt",
+    "deviceType", "platform", "platformAt", "lastSeen", "lastLatency",
+)
+
+authLog = logging.getLogger('infoLog')
+
+# SQLite limit of parameters per statement is 999 on old builds
+chunkSize = 500
+
+# Records of the devices of the current run (preload / lookupMany), so the per-device
+# code of the scripts reads them from memory
+memory = {}
+memoryLock = Lock()
+
+# Devices seen during the run, written in one transaction by flush()
+pending = {}
+pendingLock = Lock()
+pendingLimit = 500
+
+def connectInventory():
+    conn = sqlite3.connect(inventoryPath, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS inventory ("
+        " device TEXT PRIMARY KEY,"
+        " hostname TEXT,"
+        " address TEXT,"
+        " suffix TEXT,"
+        " shortName TEXT,"
+        " candidates TEXT,"
+        " resolvedAt REAL,"
+        " deviceType TEXT,"
+        " platform TEXT,"
+        " platformAt REAL,"
+        " lastSeen REAL,"
+        " lastLatency REAL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS inventoryHostname ON inventory (hostname)")
+    conn.execute("CREATE INDEX IF NOT EXISTS inventoryAddress ON inventory (address)")
+    conn.execute("CREATE INDEX IF NOT EXISTS inventoryLastSeen ON inventory (lastSeen)")
+    return conn
+
+def lookupMany(devices):
+    # {device: record} of the devices found, one query per chunkSize devices.
+    # The records are also kept in memory for get()
+    devices = list(dict.fromkeys(str(device).strip() for device in devices))
+    records = {}
+    try:
+        with closing(connectInventory()) as conn:
+            conn.row_factory = sqlite3.Row
+            for start in range(0, len(devices), chunkSize):
+                chunk = devices[start:start + chunkSize]
+                rows = conn.execute(
+                    f"SELECT * FROM inventory WHERE device IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                records.update((row["device"], dict(row)) for row in rows)
+    except sqlite3.Error as error:
+        authLog.error(f"Device inventory not available, error: {error}\n{traceback.format_exc()}")
+        return {}
+
+    with memoryLock:
+        memory.update(records)
+    return records
+
+def lookup(device):
+    return lookupMany([device]).get(str(device).strip())
+
+def preload(devices):
+    # Called once by the scripts before the device loop
+    records = lookupMany(devices)
+    authLog.info(f"Device inventory: {len(records)} of {len(devices)} devices known")
+    return records
+
+def get(device):
+    # Record loaded by preload / lookupMany, or None (no query)
+    with memoryLock:
+        return memory.get(str(device).strip())
+
+def upsertMany(entries):
+    # entries: dicts with "device" and any of the columns. Only the given columns are
+    # written, the rest of the row is kept. One transaction for all of them.
+    groups = {}
+    for entry in entries:
+        fields = tuple(name for name in entry if name in columns)
+        groups.setdefault(fields, []).append(entry)
+
+    try:
+        with closing(connectInventory()) as conn, conn:
+            for fields, group in groups.items():
+                names = ("device",) + fields
+                updates = ", ".join(f"{name} = excluded.{name}" for name in fields) or "device = excluded.device"
+                conn.executemany(
+                    f"INSERT INTO inventory ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+                    f" ON CONFLICT (device) DO UPDATE SET {updates}",
+                    [tuple(entry[name] for name in names) for entry in group],
+                )
+    except sqlite3.Error as error:
+        authLog.error(f"Could not save {len(entries)} devices in the inventory, error: {error}")
+        return
+
+    with memoryLock:
+        for entry in entries:
+            if entry["device"] in memory:
+                memory[entry["device"]].update(entry)
+
+def upsert(device, **fields):
+    upsertMany([{"device": device, **fields}])
+
+def resolution(record, candidates):
+    # Same answer as the old resolution cache: (found, hostname, address), found with
+    # hostname None is a negative entry. Negative entries only count when the same DNS
+    # suffixes were tried, since the scripts do not all try the same list.
+    if not record or record.get("resolvedAt") is None:
+        return False, None, None
+    age = time.time() - record["resolvedAt"]
+    if record["hostname"] is not None and age < resolutionTTL:
+        authLog.info(f"Device inventory hit for {record['device']}: {record['hostname']} ({record['address']}), {int(age)}s old")
+        return True, record["hostname"], record["address"]
+    if record["hostname"] is None and age < negativeTTL and record["candidates"] == ",".join(candidates):
+        authLog.info(f"Device inventory negative hit for {record['device']}, {int(age)}s old")
+        return True, None, None
+    return False, None, None
+
+def forgetResolution(device):
+    upsert(device, hostname=None, address=None, suffix=None, resolvedAt=None)
+
+def platformOf(device):
+    # (platform, deviceType) learned less than platformTTL ago, or (None, None)
+    record = get(device) or lookup(device)
+    if not record or record.get("platformAt") is None or time.time() - record["platformAt"] >= platformTTL:
+        return None, None
+    authLog.info(f"Device inventory platform of {device}: {record['platform']} ({record['deviceType']})")
+    return record["platform"], record["deviceType"]
+
+def storePlatform(device, platform, deviceType):
+    upsert(device, platform=platform, deviceType=deviceType, platformAt=time.time())
+
+def forgetPlatform(device):
+    upsert(device, platform=None, platformAt=None)
+
+def seen(device, latency, **fields):
+    # A script logged in to the device, latency is the login time in seconds.
+    # Buffered, written by flush() (the scripts call it at the end of the run)
+    entry = {"device": str(device).strip(), "lastSeen": time.time(), "lastLatency": round(latency, 3), **fields}
+    with pendingLock:
+        pending[entry["device"]] = entry
+        full = len(pending) >= pendingLimit
+    if full:
+        flush()
+
+def flush():
+    with pendingLock:
+        entries = list(pending.values())
+        pending.clear()
+    if entries:
+        upsertMany(entries)
+
+atexit.register(flush)
@@ -0,0 +1,145 @@
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from threading import Lock
+import hashlib
+import logging
+import atexit
+import queue
+import json
+import os
+
+from netops_core.context import runFolder
+
+# Logging of the scripts, shared by every script folder under scripts/ (each log.py calls setupLogging).
+# - The log calls only put the record in a queue, a background thread writes the file:
+#   the device threads never wait for the disk.
+# - Each script logs to logs/systemLogs.txt in its folder. In-process runs of the backend
+#   log to the folder of the script being run (runFolder, netops_core/context.py), so every
+#   script keeps its own file while several of them run at the same time.
+# - Settings:
+#   NETOPS_LOG_MAX_BYTES   rotate the file at this size (default 10 MB, 0 = never)
+#   NETOPS_LOG_BACKUPS     rotated files kept (default 5)
+#   NETOPS_LOG_ROTATE_WHEN rotate by time instead of size ("midnight", "H", "D", ...)
+#   NETOPS_LOG_FORMAT      text (default) | json: one JSON object per line
+#   NETOPS_LOG_OUTPUTS     full (default) | digest: command outputs logged as size + SHA-256
+
+logFormat = "%(asctime)s - %(levelname)s - %(message)s"
+completeFormat = "%(asctime)s - %(levelname)s - %(message)s - %(pathname)s - %(module)s - %(lineno)d - %(process)d - %(thread)d"
+
+maxBytes = int(os.getenv("NETOPS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+backupCount = int(os.getenv("NETOPS_LOG_BACKUPS", "5"))
+rotateWhen = os.getenv("NETOPS_LOG_ROTATE_WHEN", "")
+jsonLines = os.getenv("NETOPS_LOG_FORMAT", "text").lower() == "json"
+outputDigests = os.getenv("NETOPS_LOG_OUTPUTS", "full").lower() == "digest"
+
+# Same loggers and levels as the old dictConfig of log.py
+loggerLevels = (("debugLog", logging.DEBUG), ("errorLog", logging.ERROR), ("infoLog", logging.INFO))
+
+logQueue = queue.SimpleQueue()
+listener = None
+logFile = None
+defaultLogPath = None
+setupLock = Lock()
+
+class TextFormatter(logging.Formatter):
+    # debugLog keeps the complete format, the other loggers the short one
+    def __init__(self):
+        super().__init__(logFormat)
+        self.complete = logging.Formatter(completeFormat)
+
+    def format(self, record):
+        if record.name == "debugLog":
+            return self.complete.format(record)
+        return super().format(record)
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.thread,
+        })
+
+class ScriptQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Runs in the thread that logs: message formatted here, file chosen by the current folder
+        record = super().prepare(record)
+        record.logPath = currentLogPath()
+        return record
+
+class FileRouter(logging.Handler):
+    # Runs in the writer thread: one rotating file handler per log file
+    def __init__(self):
+        super().__init__()
+        self.files = {}
+
+    def fileHandler(self, path):
+        handler = self.files.get(path)
+        if handler is None:
+            if rotateWhen:
+                handler = TimedRotatingFileHandler(path, when=rotateWhen, backupCount=backupCount, encoding="utf-8", delay=True)
+            else:
+                handler = RotatingFileHandler(path, maxBytes=maxBytes, backupCount=backupCount, encoding="utf-8", delay=True)
+            handler.setFormatter(JsonFormatter() if jsonLines else TextFormatter())
+            self.files[path] = handler
+        return handler
+
+    def emit(self, record):
+        try:
+            self.fileHandler(getattr(record, "logPath", None) or defaultLogPath).handle(record)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for handler in self.files.values():
+            handler.close()
+        super().close()
+
+def currentLogPath():
+    folder = runFolder.get()
+    if folder is not None:
+        return os.path.join(folder, "logs", os.path.basename(logFile))
+    path = os.path.abspath(logFile)
+    if os.path.isdir(os.path.dirname(path)):
+        return path
+    # Backend code outside a script folder: file of the first script loaded
+    return defaultLogPath
+
+def setupLogging(fileName="logs/systemLogs.txt"):
+    global listener, logFile, defaultLogPath
+    with setupLock:
+        if listener is None:
+            logFile = fileName
+            defaultLogPath = os.path.abspath(fileName)
+            handler = ScriptQueueHandler(logQueue)
+            for name, level in loggerLevels:
+                logger = logging.getLogger(name)
+                logger.setLevel(level)
+                logger.handlers = [handler]
+            router = FileRouter()
+            listener = QueueListener(logQueue, router)
+            listener.start()
+            # Write the records still in the queue before the script ends
+            atexit.register(stopLogging)
+    return logging.getLogger("infoLog"), logging.getLogger("errorLog")
+
+def stopLogging():
+    global listener
+    with setupLock:
+        if listener is not None:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+            listener = None
+
+def outputForLog(output):
+    # Command output as logged: the full text, or its size and hash with NETOPS_LOG_OUTPUTS=digest
+    if not outputDigests or output is None:
+        return output
+    data = str(output).encode("utf-8", "replace")
+    lines = str(output).count("\n") + 1
+    return f"[output: {len(data)} bytes, {lines} lines, sha256 {hashlib.sha256(data).hexdigest()[:16]}]"
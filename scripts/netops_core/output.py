@@ -0,0 +1,78 @@
+from threading import RLock
+import traceback
+import logging
+import csv
+import re
+import os
+
+# Output files of the scripts (Outputs/, logs/), in the folder of the script.
+
+authLog = logging.getLogger('infoLog')
+
+# Serializes the writes to the Outputs folder when several devices run at the same time
+outputLock = RLock()
+
+class ScriptOutputs:
+    # Output files of one script, under its folder whatever the current folder is (the backend
+    # runs the scripts in its own process). functions.py / utils.py of each script bind these
+    # methods to the script folder, the same way they bind validateIP to a DeviceResolver.
+    def __init__(self, folder=""):
+        self.folder = folder
+
+    def path(self, *parts):
+        return os.path.join(self.folder, *parts)
+
+    def mkdir(self):
+        for path in (self.path("logs"), self.path("Outputs")):
+            if not os.path.exists(path):
+                try:
+                    os.mkdir(path)
+                except Exception as Error:
+                    print(f"ERROR: Wasn't possible to create new folder \"{path}\"")
+                    print(traceback.format_exc())
+
+    def failedDevices(self, username, validDeviceIP="", error=""):
+        authLog.error(f"Device: {validDeviceIP} had an error")
+        authLog.error(traceback.format_exc())
+        with outputLock:
+            with open(self.path("Outputs", "Devices with errors.txt"), "a") as failedDevices:
+                failedDevices.write(f"User {username} connected to {validDeviceIP} got an error:\n{error}.\n")
+
+    def logInCSV(self, validDeviceIP, filename="", *args):
+        authLog.info(f"File created: {filename}")
+        with outputLock:
+            with open(self.path("Outputs", f"{filename}.csv"), mode='a', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow([validDeviceIP, *args])
+        authLog.info(f"Appended device: {validDeviceIP} to file {filename}")
+
+    def genTxtFile(self, validDeviceIP, username, filename="", *args):
+        with outputLock:
+            with open(self.path("Outputs", f"{validDeviceIP} {filename}.txt"), "a") as file:
+                file.write(f"User {username} connected to {validDeviceIP}\n\n")
+                for arg in args:
+                    if isinstance(arg, dict):
+                        for key,values in arg.items():
+                            file.write(f"{key}: ")
+                            file.write(", ".join(str(v) for v in values))
+                            file.write("\n")
+
+                    elif isinstance(arg, list):
+                        for item in arg:
+                            file.write(item)
+                            file.write("\n")
+
+                    elif isinstance(arg, str):
+                        file.write(arg + "\n")
+
+# Relative to the current folder, for code that is not bound to a script folder
+cwdOutputs = ScriptOutputs()
+mkdir = cwdOutputs.mkdir
+failedDevices = cwdOutputs.failedDevices
+logInCSV = cwdOutputs.logInCSV
+genTxtFile = cwdOutputs.genTxtFile
+
+def filterFilename(filename):
+    # Replace any character that is not alphanumeric, underscore, hyphen or space
+    filename = re.sub(r'[|]', '_', filename)
+    return re.sub(r'[^a-zA-Z0-9_\- ]', '_', filename)
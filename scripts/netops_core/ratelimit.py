@@ -0,0 +1,72 @@
+from threading import Lock
+import ipaddress
+import logging
+import time
+import re
+import os
+
+from netops_core.resolution import shortHostname
+
+# Login rate limit per site, so a parallel run does not send hundreds of TACACS
+# authentications to the same site at once. Token bucket per site: burst logins right
+# away, then rate logins per second.
+#   NETOPS_SITE_LOGIN_RATE   logins per second per site (default 2, 0 = no limit)
+#   NETOPS_SITE_LOGIN_BURST  logins allowed at once per site (default 4)
+#   NETOPS_SITE_PATTERN      regex on the short hostname, group 1 is the site
+#                            (default: the letters before the first digit, "nyc" for "nyc01sw02")
+# IP addresses are grouped by /24.
+
+authLog = logging.getLogger('infoLog')
+
+siteLoginRate = float(os.getenv("NETOPS_SITE_LOGIN_RATE", "2"))
+siteLoginBurst = int(os.getenv("NETOPS_SITE_LOGIN_BURST", "4"))
+sitePattern = re.compile(os.getenv("NETOPS_SITE_PATTERN", r"^([A-Za-z]+)"))
+
+def siteOf(device):
+    device = device.strip()
+    try:
+        return str(ipaddress.ip_network(f"{device}/24", strict=False))
+    except ValueError:
+        pass
+    hostname = shortHostname(device)
+    match = sitePattern.match(hostname)
+    return match.group(1).lower() if match else hostname.lower()
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = Lock()
+
+    def reserve(self):
+        # Takes one token and returns the seconds to wait before using it
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class SiteRateLimiter:
+    def __init__(self, rate=None, burst=None):
+        self.rate = siteLoginRate if rate is None else float(rate)
+        self.burst = siteLoginBurst if burst is None else int(burst)
+        self.buckets = {}
+        self.lock = Lock()
+
+    def acquire(self, device):
+        # Blocks until the site of the device can take one more login, returns the seconds waited
+        if self.rate <= 0:
+            return 0.0
+        site = siteOf(device)
+        with self.lock:
+            bucket = self.buckets.get(site)
+            if bucket is None:
+                bucket = self.buckets[site] = TokenBucket(self.rate, self.burst)
+        wait = bucket.reserve()
+        if wait > 0:
+            authLog.info(f"Login rate limit for site {site}: device {device} waits {wait:.2f}s")
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,288 @@
+from datetime import datetime
+from functools import lru_cache
+from threading import Lock
+import traceback
+import logging
+import base64
+import html
+import uuid
+import csv
+import io
+import os
+
+from netops_core.context import ContextExecutor
+
+# Table reports of the scripts (one row per device), written by a background worker so
+# the run does not wait for them. Every report gets its own file names, two runs at the
+# same time never write the same file. The rows are written one by one to every format,
+# with ReportStream each one as soon as its device is done (submitReport takes them all
+# at the end of the run).
+#   NETOPS_REPORT_FORMATS       formats to write (default "pdf,csv,html")
+#   NETOPS_REPORT_DIR           folder of the reports, relative to the script folder (default "Outputs")
+#   NETOPS_REPORT_PDF_MAX_ROWS  the PDF is skipped above this number of rows, CSV and
+#                               HTML are still written (default 2000, 0 = no limit)
+
+authLog = logging.getLogger('infoLog')
+
+reportFormats = [f.strip().lower() for f in os.getenv("NETOPS_REPORT_FORMATS", "pdf,csv,html").split(",") if f.strip()]
+reportDir = os.getenv("NETOPS_REPORT_DIR", "Outputs")
+pdfMaxRows = int(os.getenv("NETOPS_REPORT_PDF_MAX_ROWS", "2000"))
+
+# One worker: the reports of a run are written in order and never compete with the devices
+executor = None
+executorLock = Lock()
+
+@lru_cache(maxsize=None)
+def loadAsset(path):
+    # Logos and other layout files, read once per process
+    with open(path, "rb") as file:
+        return file.read()
+
+def reportPaths(directory, name, formats):
+    # "<name> 2024-01-31 10-15-00 1a2b3c4d.<format>", same stem for all the formats of a report
+    stamp = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
+    stem = os.path.join(directory, f"{name} {stamp} {uuid.uuid4().hex[:8]}")
+    return {fmt: f"{stem}.{fmt}" for fmt in formats}
+
+class CSVWriter:
+    def __init__(self, path, title, columns, user, dateHour, logos):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def row(self, values):
+        self.writer.writerow(values)
+
+    def close(self):
+        self.file.close()
+
+class HTMLWriter:
+    def __init__(self, path, title, columns, user, dateHour, logos):
+        self.file = open(path, "w", encoding="utf-8")
+        logoTags = "".join(
+            f'<img src="data:image/png;base64,{base64.b64encode(loadAsset(logo)).decode()}" style="width:{w * 4}px">'
+            for logo, x, w in logos
+        )
+        headerCells = "".join(f"<th>{html.escape(column)}</th>" for column in columns)
+        self.file.write(
+            f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>\n"
+            "<style>body{font-family:Arial,sans-serif}h1{color:#0066cc;text-align:center}"
+            "table{border-collapse:collapse;width:100%}th{background:#dcdcdc}"
+            "th,td{border:1px solid #999;padding:4px;text-align:left}"
+            ".logos{display:flex;justify-content:space-between}</style></head><body>\n"
+            f"<div class=\"logos\">{logoTags}</div>\n<h1>{html.escape(title)}</h1>\n"
+            f"<p>Results from {html.escape(dateHour)} - User: {html.escape(user)}</p>\n"
+            f"<table>\n<tr>{headerCells}</tr>\n"
+        )
+
+    def row(self, values):
+        self.file.write("<tr>" + "".join(f"<td>{html.escape(str(value))}</td>" for value in values) + "</tr>\n")
+
+    def close(self):
+        self.file.write("</table>\n</body></html>\n")
+        self.file.close()
+
+class PDFWriter:
+    # Same layout the scripts had: blue title, logos, date line, grey header, bordered rows.
+    # The first column is 60 wide, the second one takes the rest of the page.
+    lineHeight = 6
+    columnWidths = (60, 130)
+
+    def __init__(self, path, title, columns, user, dateHour, logos):
+        from fpdf import FPDF
+
+        self.path = path
+        self.columns = columns
+        self.pdf = pdf = FPDF()
+        # Width of every word, measured once per report instead of laying out each cell twice
+        self.widths = {}
+        pdf.add_page()
+
+        pdf.set_font("Arial", 'B', 20)
+        pdf.set_text_color(0, 102, 204)
+        pdf.cell(0, 12, title, ln=True, align='C')
+
+        for logo, x, w in logos:
+            pdf.image(io.BytesIO(loadAsset(logo)), x=x, y=12, w=w)
+
+        pdf.ln(6)
+
+        pdf.set_font("Arial", '', 14)
+        pdf.set_text_color(0, 0, 0)
+        pdf.cell(0, 10, f"Results from {dateHour} - User: {user}", ln=True)
+
+        pdf.set_draw_color(0, 102, 204)
+        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
+
+        pdf.ln(5)
+        self.tableHeader()
+        pdf.set_fill_color(245, 245, 245)
+
+    def tableHeader(self):
+        pdf = self.pdf
+        pdf.set_font("Arial", 'B', 12)
+        pdf.set_fill_color(220, 220, 220)
+        pdf.cell(self.columnWidths[0], 10, self.columns[0], border=1, fill=True)
+        pdf.cell(0, 10, self.columns[1], border=1, ln=True, fill=True)
+        pdf.set_font("Arial", '', 12)
+
+    def measure(self, text):
+        width = self.widths.get(text)
+        if width is None:
+            width = self.widths[text] = self.pdf.get_string_width(text)
+        return width
+
+    def lineCount(self, text, width):
+        # Lines multi_cell will use for the text in a column of this width
+        maxWidth = width - 2 * self.pdf.c_margin
+        space = self.measure(" ")
+        lines, current = 1, 0.0
+        for word in str(text).split(" "):
+            wordWidth = self.measure(word)
+            if current and current + space + wordWidth > maxWidth:
+                lines += 1
+                current = 0.0
+            if wordWidth > maxWidth:
+                # multi_cell breaks the word itself, character by character
+                if current:
+                    lines += 1
+                current = 0.0
+                for char in word:
+                    charWidth = self.measure(char)
+                    if current + charWidth > maxWidth:
+                        lines += 1
+                        current = 0.0
+                    current += charWidth
+                continue
+            current += (space if current else 0.0) + wordWidth
+        return lines
+
+    def row(self, values):
+        pdf = self.pdf
+        rowHeight = max(self.lineCount(value, width) for value, width in zip(values, self.columnWidths)) * self.lineHeight
+
+        if pdf.get_y() + rowHeight > pdf.page_break_trigger:
+            pdf.add_page()
+            self.tableHeader()
+
+        x = pdf.get_x()
+        y = pdf.get_y()
+        offset = 0
+        for value, width in zip(values, self.columnWidths):
+            pdf.set_xy(x + offset, y)
+            pdf.multi_cell(width, self.lineHeight, str(value), border=0, fill=False)
+            offset += width
+
+        pdf.rect(x, y, sum(self.columnWidths), rowHeight)
+        pdf.line(x + self.columnWidths[0], y, x + self.columnWidths[0], y + rowHeight)
+        pdf.set_y(y + rowHeight)
+
+    def close(self):
+        self.pdf.ln(10)
+        self.pdf.output(self.path)
+
+reportWriters = {"csv": CSVWriter, "html": HTMLWriter, "pdf": PDFWriter}
+
+class ReportFiles:
+    # The files of one report, open while its rows arrive. A format that fails is logged
+    # and left out, the others are still written. folder: folder of the script, the report
+    # goes to its reportDir.
+    def __init__(self, name, title, columns, user, logos=(), formats=None, folder=""):
+        self.name = name
+        self.user = user
+        self.rows = 0
+        formats = [fmt for fmt in (formats or reportFormats) if fmt in reportWriters]
+
+        directory = os.path.join(folder, reportDir)
+        os.makedirs(directory, exist_ok=True)
+        dateHour = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.paths = reportPaths(directory, name, formats)
+        self.writers = {}
+        for fmt, path in self.paths.items():
+            try:
+                self.writers[fmt] = reportWriters[fmt](path, title, columns, user, dateHour, logos)
+            except Exception as error:
+                authLog.error(f"Report {name} could not start the {fmt} file: {error}\n{traceback.format_exc()}")
+
+    def row(self, values):
+        # CSV and HTML go to their files right away. The PDF is kept in memory until
+        # close(), so it is dropped once the report has more than pdfMaxRows rows
+        self.rows += 1
+        if "pdf" in self.writers and pdfMaxRows and self.rows > pdfMaxRows:
+            authLog.info(f"Report {self.name} has more than NETOPS_REPORT_PDF_MAX_ROWS={pdfMaxRows} rows, skipping the PDF")
+            del self.writers["pdf"]
+        for fmt, writer in list(self.writers.items()):
+            try:
+                writer.row(values)
+            except Exception as error:
+                authLog.error(f"Report {self.name} failed writing the {fmt} file: {error}\n{traceback.format_exc()}")
+                del self.writers[fmt]
+
+    def close(self):
+        # Returns {format: path} of the files written
+        written = {}
+        for fmt, writer in self.writers.items():
+            try:
+                writer.close()
+                written[fmt] = self.paths[fmt]
+                authLog.info(f"Report file created: {self.paths[fmt]}, requested by user: {self.user}")
+            except Exception as error:
+                authLog.error(f"Report {self.name} failed writing the {fmt} file: {error}\n{traceback.format_exc()}")
+        self.writers = {}
+        return written
+
+def writeReport(name, title, columns, rows, user, logos=(), formats=None, folder=""):
+    # Writes the report in every format and returns {format: path}
+    formats = [fmt for fmt in (formats or reportFormats) if fmt in reportWriters]
+    if "pdf" in formats and pdfMaxRows and len(rows) > pdfMaxRows:
+        authLog.info(f"Report {name} has {len(rows)} rows, more than NETOPS_REPORT_PDF_MAX_ROWS={pdfMaxRows}, skipping the PDF")
+        formats.remove("pdf")
+    if not formats:
+        return {}
+
+    report = ReportFiles(name, title, columns, user, logos, formats, folder)
+    for values in rows:
+        report.row(values)
+    return report.close()
+
+def reportExecutor():
+    # The worker thread is not a daemon, a script that ends right after queueing a report
+    # still writes it before exiting
+    global executor
+    with executorLock:
+        if executor is None:
+            executor = ContextExecutor(max_workers=1, thread_name_prefix="report")
+    return executor
+
+def submitReport(name, title, columns, rows, user, logos=(), formats=None, folder=""):
+    # Queues writeReport on the background worker and returns its Future. The rows are
+    # copied, the caller can keep using its list.
+    return reportExecutor().submit(writeReport, name, title, list(columns), [tuple(row) for row in rows], user, list(logos), formats, folder)
+
+class ReportStream:
+    # A report written by the background worker while the run goes on: the files are opened
+    # right away, each row is written as soon as its device is done and close() returns the
+    # Future of {format: path}. The worker runs the calls in the order they were made.
+    def __init__(self, name, title, columns, user, logos=(), formats=None, folder=""):
+        self.name = name
+        self.files = None
+        reportExecutor().submit(self.open, name, title, list(columns), user, list(logos), formats, folder)
+
+    def open(self, *args):
+        try:
+            self.files = ReportFiles(*args)
+        except Exception as error:
+            authLog.error(f"Report {self.name} could not be created: {error}\n{traceback.format_exc()}")
+
+    def row(self, values):
+        reportExecutor().submit(self.writeRow, tuple(values))
+
+    def writeRow(self, values):
+        if self.files is not None:
+            self.files.row(values)
+
+    def close(self):
+        return reportExecutor().submit(self.finish)
+
+    def finish(self):
+        return self.files.close() if self.files is not None else {}
@@ -0,0 +1,272 @@
+import concurrent.futures
+import traceback
+import logging
+import socket
+import time
+import csv
+import re
+import os
+
+import scriptMetrics
+
+from netops_core import inventory
+from netops_core.context import ContextExecutor
+
+# Device resolution of the scripts: the token typed by the user (IP, short name) to the
+# DNS name that answers on TCP 22. Every script tries the same DNS suffixes, so a name
+# found by one script (device inventory) is reused by the others and by the backend.
+
+authLog = logging.getLogger('infoLog')
+
+defaultSuffixes = [
+    '.mgmt.internal.das',
+    '.cm.mgmt.internal.das',
+    '.mgmt.wellpoint.com',
+    '.caremore.com',
+    '.healthcore.local'
+]
+
+# NETOPS_DNS_SUFFIXES: comma separated list that replaces the default one
+dnsSuffixes = [s.strip() for s in os.getenv("NETOPS_DNS_SUFFIXES", "").split(",") if s.strip()] or defaultSuffixes
+
+# Longest suffix first, so "x.cm.mgmt.internal.das" gives "x" and not "x.cm"
+suffixPattern = re.compile("|".join(re.escape(s) for s in sorted(dnsSuffixes, key=len, reverse=True)))
+
+def hostnameCandidates(deviceIP):
+    # Every DNS name validateIP tries for a device, in the same order
+    return [f'{deviceIP}{suffix}' for suffix in dnsSuffixes]
+
+def shortHostname(deviceName):
+    # Device name without the DNS suffix, used as the prompt of the outputs
+    return suffixPattern.sub("", deviceName)
+
+def suffixOf(hostname):
+    # DNS suffix that made the name answer, "" for IPs and names without one
+    return next((s for s in sorted(dnsSuffixes, key=len, reverse=True) if hostname.endswith(s)), "")
+
+def deviceHostname(device):
+    # shortHostname from the inventory when the run preloaded the device
+    record = inventory.get(device)
+    if record and record.get("shortName"):
+        return record["shortName"]
+    return shortHostname(device)
+
+def resolutionEntries(deviceIP, hostname, address, candidates):
+    # Inventory rows of a validateIP answer: the token typed by the user and, when it is
+    # different, the name that answered (the one the scripts connect to). hostname None
+    # is a negative entry.
+    entry = {
+        "device": deviceIP, "hostname": hostname, "address": address,
+        "candidates": ",".join(candidates), "resolvedAt": time.time(),
+    }
+    if hostname is None:
+        return [{**entry, "suffix": None}]
+    entry.update(suffix=suffixOf(hostname), shortName=shortHostname(hostname))
+    if hostname == deviceIP:
+        return [entry]
+    return [entry, {**entry, "device": hostname}]
+
+def forgottenEntry(deviceIP):
+    return {"device": deviceIP, "hostname": None, "address": None, "suffix": None, "resolvedAt": None}
+
+def validIP(ip):
+    try:
+        socket.inet_aton(ip)
+        authLog.info(f"IP successfully validated: {ip}")
+        return True
+    except socket.error:
+        authLog.error(f"IP: {ip} is not an IP Address, will attempt to resolve hostname.")
+        return False
+
+def resolveHostname(hostname):
+    try:
+        hostnameOut = socket.gethostbyname(hostname)
+        authLog.info(f"Hostname successfully validated: {hostname}")
+        return hostnameOut
+    except (socket.gaierror, UnicodeError):
+        authLog.error(f"Was not posible to resolve hostname: {hostname}")
+        return None
+
+class DeviceResolver:
+    """
+    validateIP / validateIPsBatch of one script.
+
+    - script: label of the probe metrics (folder name of the script).
+    - unreachableFile: CSV where the devices that did not answer are appended.
+    - printReachable / printUnreachable: also print the INFO / ERROR line of every device.
+    - candidates: function deviceIP -> DNS names to try, hostnameCandidates by default.
+    """
+
+    def __init__(self, script, unreachableFile='Devices unreachable.csv', printReachable=False,
+                 printUnreachable=False, candidates=None):
+        self.script = script
+        self.unreachableFile = unreachableFile
+        self.printReachable = printReachable
+        self.printUnreachable = printUnreachable
+        self.hostnameCandidates = candidates or hostnameCandidates
+
+    def reachable(self, hostname):
+        authLog.info(f"Device IP {hostname} is reachable on Port TCP 22.")
+        if self.printReachable:
+            print(f"INFO: Device IP {hostname} is reachable on Port TCP 22.")
+
+    def checkConnect22(self, ipAddress, port=22, timeout=3):
+        start = time.perf_counter()
+        reachable = False
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as connectTest:
+                connectTest.settimeout(timeout)
+                connectTestOut = connectTest.connect_ex((ipAddress, port))
+                reachable = connectTestOut == 0
+                return reachable
+        except socket.error as error:
+            authLog.error(f"Device {ipAddress} is not reachable on port TCP 22.")
+            authLog.error(f"Error:{error}\n{traceback.format_exc()}")
+            return False
+        finally:
+            scriptMetrics.observe("probe_seconds", time.perf_counter() - start, script=self.script, reachable=str(reachable).lower())
+
+    def probeHostname(self, hostname):
+        # Resolves the name (if it is not an IP) and tests TCP 22, used by validateIPsBatch.
+        # Returns the IP that answered or None
+        try:
+            socket.inet_aton(hostname)
+            resolvedIP = hostname
+        except socket.error:
+            resolvedIP = resolveHostname(hostname)
+        if resolvedIP and self.checkConnect22(resolvedIP):
+            return resolvedIP
+        return None
+
+    def logUnreachable(self, deviceIP):
+        hostnameStr = ', '.join(self.hostnameCandidates(deviceIP))
+
+        authLog.error(f"Not a valid IP address or hostname: {hostnameStr}")
+        if self.printUnreachable:
+            print(f"ERROR: Invalid IP address or hostname: {hostnameStr}")
+
+        with open(self.unreachableFile, mode='a', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow([hostnameStr])
+
+    def validateIP(self, deviceIP):
+        candidates = self.hostnameCandidates(deviceIP)
+
+        # A previous run (of any script) already found this device, skip the DNS suffixes
+        cached, cachedHostname, cachedIP = inventory.resolution(inventory.lookup(deviceIP), candidates)
+        if cached and cachedHostname is None:
+            self.logUnreachable(deviceIP)
+            return None
+        if cached:
+            if self.checkConnect22(cachedIP):
+                self.reachable(cachedHostname)
+                return cachedHostname
+            inventory.upsertMany([forgottenEntry(deviceIP)])
+
+        # Here is the first func call, validates if it's an IP Address x.x.x.x
+        if validIP(deviceIP):
+            if self.checkConnect22(deviceIP):
+                self.reachable(deviceIP)
+                inventory.upsertMany(resolutionEntries(deviceIP, deviceIP, deviceIP, candidates))
+                return deviceIP
+
+        # if not IP address, tries to resolve the hostname
+        for hostname in candidates:
+            resolvedIP = resolveHostname(hostname)
+            if resolvedIP and self.checkConnect22(resolvedIP):
+                self.reachable(hostname)
+                inventory.upsertMany(resolutionEntries(deviceIP, hostname, resolvedIP, candidates))
+                return hostname
+
+        self.logUnreachable(deviceIP)
+        inventory.upsertMany(resolutionEntries(deviceIP, None, None, candidates))
+        return None
+
+    def validateIPsBatch(self, deviceIPs, maxWorkers=50, deadline=120):
+        # Pre-flight for a whole device list. Gives the same answer as calling validateIP
+        # for each device (first reachable name or None, in the same order as deviceIPs),
+        # but every device and every DNS suffix is resolved and probed at the same time.
+        # maxWorkers caps the probes in flight, deadline caps the whole pre-flight in seconds
+        # (the lookup again of the stale devices included).
+        # The inventory is read with one query and written with one transaction.
+        endTime = time.monotonic() + deadline
+        results = [None] * len(deviceIPs)
+        candidatesList = {}
+        cachedDevices = {}
+        futures = {}
+        entries = []
+
+        records = inventory.lookupMany(deviceIPs)
+        for index, deviceIP in enumerate(deviceIPs):
+            candidates = self.hostnameCandidates(deviceIP)
+            cached, cachedHostname, cachedIP = inventory.resolution(records.get(deviceIP.strip()), candidates)
+            if cached and cachedHostname is None:
+                self.logUnreachable(deviceIP)
+            elif cached:
+                cachedDevices[index] = (cachedHostname, cachedIP)
+            else:
+                candidatesList[index] = ([deviceIP] if validIP(deviceIP) else []) + candidates
+
+        executor = ContextExecutor(max_workers=maxWorkers)
+        try:
+            # Devices found in the cache only need their known IP tested
+            for index, (cachedHostname, cachedIP) in cachedDevices.items():
+                futures[(index, cachedHostname)] = executor.submit(
+                    lambda ipAddress: ipAddress if self.checkConnect22(ipAddress) else None, cachedIP
+                )
+            for index, candidates in candidatesList.items():
+                for hostname in candidates:
+                    futures[(index, hostname)] = executor.submit(self.probeHostname, hostname)
+
+            done, notDone = concurrent.futures.wait(futures.values(), timeout=deadline)
+            if notDone:
+                authLog.error(f"Reachability pre-flight reached the deadline of {round(deadline, 1)}s with {len(notDone)} probes still pending")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        def probeResult(index, hostname):
+            future = futures[(index, hostname)]
+            if future in done and future.exception() is None:
+                return future.result()
+            return None
+
+        staleDevices = []
+        for index, (cachedHostname, cachedIP) in cachedDevices.items():
+            if probeResult(index, cachedHostname):
+                self.reachable(cachedHostname)
+                results[index] = cachedHostname
+            else:
+                entries.append(forgottenEntry(deviceIPs[index]))
+                staleDevices.append(index)
+
+        for index, candidates in candidatesList.items():
+            deviceIP = deviceIPs[index]
+            for hostname in candidates:
+                resolvedIP = probeResult(index, hostname)
+                if resolvedIP:
+                    self.reachable(hostname)
+                    entries.extend(resolutionEntries(deviceIP, hostname, resolvedIP, self.hostnameCandidates(deviceIP)))
+                    results[index] = hostname
+                    break
+            else:
+                self.logUnreachable(deviceIP)
+                # Only remember the failure when every probe had the chance to finish
+                if all(futures[(index, hostname)] in done for hostname in candidates):
+                    entries.extend(resolutionEntries(deviceIP, None, None, self.hostnameCandidates(deviceIP)))
+
+        # Written before the stale devices are looked up again
+        if entries:
+            inventory.upsertMany(entries)
+
+        # The cached name stopped answering, walk the DNS suffixes again for those devices,
+        # within the time left of the deadline
+        remaining = endTime - time.monotonic()
+        if staleDevices and remaining <= 0:
+            authLog.error(f"Reachability pre-flight reached the deadline of {deadline}s, {len(staleDevices)} stale devices not looked up again")
+            for index in staleDevices:
+                self.logUnreachable(deviceIPs[index])
+        elif staleDevices:
+            for index, hostname in zip(staleDevices, self.validateIPsBatch([deviceIPs[index] for index in staleDevices], maxWorkers, remaining)):
+                results[index] = hostname
+
+        return results
@@ -0,0 +1,138 @@
+from contextvars import ContextVar
+from threading import Lock
+import json
+import sys
+import os
+
+# Per-device results of the scripts, shared by every script folder under scripts/.
+# - main.py --format ndjson sets enabled = True: one JSON object per line on stdout,
+#   that runScript parses with parseRecord() while the script runs. The other stdout
+#   lines (INFO:, prints of the scripts) are plain text as before.
+# - In-process runs: scriptRunner sets runSink, the records of each run go to that run
+#   (threads of the scripts keep it, see netops_core/context.py). sink is the same for
+#   every run of the process (bench).
+# - Standalone runs: nothing is emitted.
+#
+# Device record:
+#   {"record": "device", "script": ..., "device": ..., "hostname": ..., "status": ...,
+#    "seconds": ..., "command": ..., "output": ..., "outputRef": ..., "errorClass": ..., "error": ...}
+#   status: ok | failed | timeout | unreachable
+#   outputRef: file where the script saved the output, if any
+#   Scripts may add their own fields (cacheAge, interfaces, halfDuplex, ...)
+#   Several commands on the same session (runShowCommands): "commands" keeps one entry per
+#   command, {"command", "output", "seconds", "outputRef", "cacheAge"}, see commandFields()
+
+enabled = False
+sink = None
+runSink = ContextVar("resultSink", default=None)
+
+failedStatuses = ("failed", "timeout", "unreachable")
+
+# Several device threads write records at the same time
+writeLock = Lock()
+
+def deviceRecord(script, device, status, seconds, hostname=None, command=None, output=None,
+                 outputRef=None, error=None, errorClass=None, **extra):
+    if errorClass is None and error:
+        errorClass = type(error).__name__ if isinstance(error, BaseException) else "Error"
+    record = {
+        "record": "device",
+        "script": script,
+        "device": device,
+        "hostname": hostname or device,
+        "status": status,
+        "seconds": round(seconds, 3),
+        "command": command,
+        "output": output,
+        "outputRef": os.path.abspath(outputRef) if outputRef else None,
+        "errorClass": errorClass,
+        "error": str(error) if error else None,
+    }
+    record.update(extra)
+    if record.get("commands"):
+        record["commands"] = [
+            {**entry, "outputRef": os.path.abspath(entry["outputRef"])} if entry.get("outputRef") else entry
+            for entry in record["commands"]
+        ]
+    return record
+
+def commandFields(entries):
+    # Fields of a device record for the commands run on it, entries in the order they ran.
+    # A single command keeps the fields of a single command record (command, output, ...)
+    if len(entries) == 1:
+        fields = {name: value for name, value in entries[0].items() if name != "seconds"}
+        return {**fields, "commands": entries}
+    return {"command": "; ".join(entry["command"] for entry in entries), "commands": entries}
+
+def currentSink():
+    return runSink.get() or sink
+
+def collecting():
+    # True when the records go somewhere (the backend reads them instead of the prints)
+    return enabled or currentSink() is not None
+
+def emit(record):
+    target = currentSink()
+    if target is not None:
+        target(record)
+    elif enabled:
+        line = json.dumps(record)
+        with writeLock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+def emitDevice(script, device, status, seconds, **fields):
+    emit(deviceRecord(script, device, status, seconds, **fields))
+
+def parseRecord(line):
+    # Returns the record of an NDJSON line, None for the plain text lines
+    line = line.strip()
+    if not line.startswith('{"record"'):
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+def formatRecord(record):
+    # Same text the scripts printed before the records existed
+    if record.get("status") in failedStatuses:
+        return f"Error on {record.get('device')}, error: {record.get('error')}"
+    if len(record.get("commands") or []) > 1:
+        # One block per command, the same text as one run per command
+        return "\n".join(formatRecord({**record, "cacheAge": None, **entry, "commands": None}) for entry in record["commands"])
+    prompt = f"{record.get('hostname')}#"
+    header = f"{prompt}{record['command']}" if record.get("command") else prompt
+    if record.get("cacheAge") is not None:
+        import showResultCache
+        header += f"  [from cache, {showResultCache.describeAge(record['cacheAge'])}]"
+    return f"{header}\n{record.get('output') or ''}"
+
+def summarize(records):
+    summary = {"devices": 0, "ok": 0, "failed": 0, "seconds": 0.0, "byStatus": {}}
+    for record in records:
+        if record.get("record") != "device":
+            continue
+        status = record.get("status")
+        summary["devices"] += 1
+        summary["byStatus"][status] = summary["byStatus"].get(status, 0) + 1
+        if status in failedStatuses:
+            summary["failed"] += 1
+        else:
+            summary["ok"] += 1
+        summary["seconds"] = round(summary["seconds"] + (record.get("seconds") or 0), 3)
+    return summary
+
+def collect(records):
+    # Fields added to the result of a run. The outputs are already in its stdout text,
+    # the device list keeps everything else.
+    devices = []
+    for record in records:
+        if record.get("record") != "device":
+            continue
+        device = {k: v for k, v in record.items() if k != "output"}
+        if device.get("commands"):
+            device["commands"] = [{k: v for k, v in entry.items() if k != "output"} for entry in device["commands"]]
+        devices.append(device)
+    return {"devices": devices, "summary": summarize(devices)}
@@ -0,0 +1,245 @@
+from log import authLog
+from functions import failedDevices, filterFilename, scriptName, outputPath
+from netops_core import outputLock, commandList, deviceHostname, inventory
+import showResultCache
+import scriptMetrics
+import resultProtocol
+
+import traceback
+import asyncio
+import time
+import re
+import os
+
+# Async SSH transport for the show commands (asyncssh instead of netmiko/paramiko).
+# All the devices run in one thread with an asyncio event loop, so a single process
+# can keep thousands of sessions open at the same time. The blocking work of a device
+# (show result cache, inventory, output files) runs in worker threads (asyncio.to_thread),
+# never on the loop.
+# Only needed with --transport asyncssh: pip install asyncssh
+
+sshPort = int(os.getenv("NETOPS_SSH_PORT", "22"))
+
+# Cisco IOS/IOS-XE prompt at the end of the output: "router1>" or "router1#"
+promptPattern = re.compile(r"(?:^|\n)([\w.\-@/:()]+)([>#])\s*$")
+passwordPattern = re.compile(r"[Pp]assword:\s*$")
+morePattern = re.compile(r"\s*--More--\s*$")
+
+class PromptTimeout(Exception):
+    # The device did not answer in time (login or prompt). The device timeout of the
+    # whole device is the asyncio.TimeoutError of showCommandsDevice.
+    pass
+
+async def readUntil(stdout, patterns, timeout, stdin=None):
+    # Reads from the channel until the buffer ends with one of the patterns.
+    # Returns (buffer, index of the pattern that matched).
+    # A --More-- pager (paging not disabled yet) is answered with a space.
+    buffer = ""
+    deadline = time.monotonic() + timeout
+    while True:
+        for index, pattern in enumerate(patterns):
+            if pattern.search(buffer):
+                return buffer, index
+        if stdin is not None and morePattern.search(buffer):
+            buffer = morePattern.sub("\n", buffer)
+            stdin.write(" ")
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise PromptTimeout(f"No prompt after {timeout} seconds, last output: {buffer[-200:]!r}")
+        try:
+            chunk = await asyncio.wait_for(stdout.read(65536), timeout=remaining)
+        except asyncio.TimeoutError:
+            raise PromptTimeout(f"No prompt after {timeout} seconds, last output: {buffer[-200:]!r}") from None
+        if not chunk:
+            raise ConnectionError(f"Channel closed, last output: {buffer[-200:]!r}")
+        buffer += chunk.replace("\r\n", "\n").replace("\r", "")
+
+def devicePrompt(hostname):
+    # Once the hostname is known only its own prompt ends the output
+    # (a config line ending in # or > is not taken as the prompt)
+    return re.compile(r"(?:^|\n)" + re.escape(hostname) + r"([>#])\s*$")
+
+def cleanOutput(buffer, shCommand):
+    # Removes the echoed command (first lines) and the prompt (last line)
+    lines = buffer.split("\n")
+    while lines and lines[0].strip() in ("", shCommand.strip()):
+        lines = lines[1:]
+    if lines and promptPattern.search("\n" + lines[-1]):
+        lines = lines[:-1]
+    return "\n".join(lines).strip("\n")
+
+def saveOutputs(validDeviceIP, username, shHostnameOut, results):
+    # Stores the outputs in the show result cache and the output files.
+    # Returns {command: entry}
+    entries = {}
+    for command, shCommandOut, commandSeconds in results:
+        showResultCache.store(validDeviceIP, username, command, shCommandOut)
+
+        filename = filterFilename(command)
+        outputRef = outputPath("Outputs", f"{filename} for device {validDeviceIP}.txt")
+        with outputLock:
+            with open(outputRef, "a") as file:
+                file.write(f"User {username} connected to device IP {validDeviceIP}\n\n")
+                file.write(f"{shHostnameOut}{command}\n{shCommandOut}")
+            if shCommandOut:
+                with open(outputPath("Outputs", "General Outputs.txt"), "a") as file:
+                    file.write(f"{shHostnameOut}{command}\n{shCommandOut}\n")
+        entries[command] = {
+            "command": command, "output": shCommandOut, "seconds": round(commandSeconds, 3), "outputRef": outputRef,
+        }
+    return entries
+
+def saveFailure(username, validDeviceIP, error):
+    with outputLock:
+        failedDevices(username, validDeviceIP, error)
+
+async def runCommand(validDeviceIP, username, netDevice, shCommands, timeout=120):
+    # Opens the session, goes to enable mode, disables paging and runs the commands in order.
+    # With NETOPS_SHOW_CACHE_VERIFY_LOGIN=1 the show result cache is read once the login
+    # worked, only the commands not found there are run.
+    # Returns (hostname prompt or None when nothing ran, [(command, output, seconds), ...], cached entries).
+    import asyncssh
+
+    connectStart = time.perf_counter()
+    with scriptMetrics.stage(scriptName, "connect"):
+        try:
+            conn = await asyncssh.connect(
+                validDeviceIP,
+                port=sshPort,
+                username=username,
+                password=netDevice['password'],
+                known_hosts=None,
+                connect_timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            raise PromptTimeout(f"No login after {timeout} seconds") from None
+    # seen() writes the inventory when its buffer is full
+    await asyncio.to_thread(inventory.seen, validDeviceIP, time.perf_counter() - connectStart)
+    try:
+        entries = {}
+        if showResultCache.verifyLogin:
+            entries = await asyncio.to_thread(showResultCache.cachedEntries, validDeviceIP, username, shCommands)
+        shCommands = [command for command in shCommands if command not in entries]
+        if not shCommands:
+            return None, [], entries
+
+        stdin, stdout, _ = await conn.open_session(term_type="vt100", term_size=(511, 24))
+        try:
+            buffer, _ = await readUntil(stdout, [promptPattern], timeout)
+            hostname, mode = promptPattern.search(buffer).groups()
+            prompt = devicePrompt(hostname)
+
+            if mode == ">":
+                authLog.info(f"Entering enable mode on {validDeviceIP}")
+                with scriptMetrics.stage(scriptName, "enable"):
+                    stdin.write("enable\n")
+                    buffer, index = await readUntil(stdout, [passwordPattern, prompt], timeout)
+                    if index == 0:
+                        stdin.write(netDevice['secret'] + "\n")
+                        buffer, _ = await readUntil(stdout, [prompt], timeout)
+                if prompt.search(buffer).group(1) != "#":
+                    raise PermissionError(f"Could not enter enable mode on {validDeviceIP}")
+
+            stdin.write("terminal length 0\n")
+            await readUntil(stdout, [prompt], timeout, stdin)
+
+            results = []
+            for shCommand in shCommands:
+                commandStart = time.perf_counter()
+                with scriptMetrics.stage(scriptName, "command"):
+                    stdin.write(shCommand + "\n")
+                    buffer, _ = await readUntil(stdout, [prompt], timeout, stdin)
+                results.append((shCommand, cleanOutput(buffer, shCommand), time.perf_counter() - commandStart))
+            return f"{hostname}#", results, entries
+        finally:
+            try:
+                stdin.write("exit\n")
+                stdin.write_eof()
+            except Exception:
+                pass
+    finally:
+        with scriptMetrics.stage(scriptName, "disconnect"):
+            conn.close()
+            await conn.wait_closed()
+
+async def showCommandsDevice(validDeviceIP, username, netDevice, shCommand, semaphore, deviceTimeout):
+    # Same text and result records as commandsCLI.showCommandsDevice
+    startTime = time.perf_counter()
+    validDeviceIP = validDeviceIP.strip()
+    shCommands = commandList(shCommand)
+    shHostnameOut = deviceHostname(validDeviceIP) + '#'
+    entries = {}
+    if not showResultCache.verifyLogin:
+        # Cached by the same user: no session (nor a free slot of the semaphore) needed
+        entries = await asyncio.to_thread(showResultCache.cachedEntries, validDeviceIP, username, shCommands)
+        if all(command in entries for command in shCommands):
+            record = resultProtocol.deviceRecord(
+                scriptName, validDeviceIP, "ok", time.perf_counter() - startTime, hostname=shHostnameOut[:-1],
+                **resultProtocol.commandFields([entries[command] for command in shCommands]),
+            )
+            resultProtocol.emit(record)
+            return resultProtocol.formatRecord(record)
+    pendingCommands = [command for command in shCommands if command not in entries]
+
+    async with semaphore:
+        # Time of the device itself, not of the wait for a free session
+        startTime = time.perf_counter()
+        try:
+            authLog.info(f"Connecting to device {validDeviceIP} (asyncssh)")
+            prompt, results, cached = await asyncio.wait_for(
+                runCommand(validDeviceIP, username, netDevice, pendingCommands),
+                timeout=deviceTimeout,
+            )
+            entries.update(cached)
+            shHostnameOut = prompt or shHostnameOut
+
+            for command, shCommandOut, commandSeconds in results:
+                authLog.info(f"Automation successfully run the command: {command} on device: {validDeviceIP}")
+            entries.update(await asyncio.to_thread(saveOutputs, validDeviceIP, username, shHostnameOut, results))
+
+            record = resultProtocol.deviceRecord(
+                scriptName, validDeviceIP, "ok", time.perf_counter() - startTime, hostname=shHostnameOut[:-1],
+                **resultProtocol.commandFields([entries[command] for command in shCommands]),
+            )
+            resultProtocol.emit(record)
+            return resultProtocol.formatRecord(record)
+
+        except Exception as error:
+            status = "failed"
+            if isinstance(error, asyncio.TimeoutError):
+                # Only the wait_for of the whole device, the reads raise PromptTimeout
+                status = "timeout"
+                error = TimeoutError(f"timed out after {deviceTimeout} seconds")
+            elif isinstance(error, PromptTimeout):
+                status = "timeout"
+            authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}")
+            authLog.error(traceback.format_exc())
+            await asyncio.to_thread(saveFailure, username, validDeviceIP, error)
+            resultProtocol.emitDevice(
+                scriptName, validDeviceIP, status, time.perf_counter() - startTime, command="; ".join(shCommands), error=error,
+            )
+            return f"Error on {validDeviceIP}, error: {error}"
+
+async def showCommandsAll(validIPs, username, netDevice, shCommand, maxSessions, deviceTimeout, onResult):
+    semaphore = asyncio.Semaphore(maxSessions)
+    tasks = [
+        asyncio.ensure_future(showCommandsDevice(validDeviceIP, username, netDevice, shCommand, semaphore, deviceTimeout))
+        for validDeviceIP in validIPs
+    ]
+    if onResult:
+        for task in asyncio.as_completed(tasks):
+            onResult(await task)
+    return [await task for task in tasks]
+
+def showCommands(validIPs, username, netDevice, shCommand, onResult=None, maxSessions=1000, deviceTimeout=300):
+    # Same signature and result as commandsCLI.showCommands (one command or a list of them),
+    # results in the order of validIPs.
+    # maxSessions: SSH sessions open at the same time
+    authLog.info(f"Running command:{shCommand} on {len(validIPs)} devices with asyncssh, max sessions: {maxSessions}")
+    inventory.preload(validIPs)
+    results = asyncio.run(
+        showCommandsAll(validIPs, username, netDevice, shCommand, maxSessions, deviceTimeout, onResult)
+    )
+    inventory.flush()
+    return "\n\n".join(results)
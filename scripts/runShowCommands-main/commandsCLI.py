@@ -1,78 +1,234 @@
 from netmiko import ConnectHandler
 from log import authLog
-from functions import failedDevices, logInCSV, filterFilename
+from netops_core import outputForLog, outputLock, commandList, deviceParams, deviceSession, deviceHostname, inventory, ContextExecutor
+from functions import failedDevices, logInCSV, filterFilename, scriptName, outputPath
+import showResultCache
+import scriptMetrics
+import resultProtocol
 
+import concurrent.futures
+import threading
 import traceback
-import re
+import time
 import os
 
 shCommand = ""
 shHostname = "show run | i hostname"
 
-def showCommands(validIPs, username, netDevice, shCommand):
+def showCommandsDevice(validDeviceIP, username, netDevice, shCommand, sessionLog=outputPath('Outputs', 'netmikoLog.txt'),
+                       onSession=None, abandoned=None, connectHandler=ConnectHandler, **sessionOptions):
+    # This function runs the show commands (one or a list, in order) on a single device over
+    # one SSH session and returns the text for the results
+    # connectHandler opens the session, netmiko by default (the backend passes its session pool).
+    # onSession (optional) is called with the open session, so the caller can close it.
+    # abandoned (optional Event) is set by the caller once it gave up on the device: nothing
+    # else is written or reported for it. sessionOptions are extra netmiko parameters.
+    startTime = time.perf_counter()
+    shCommands = commandList(shCommand)
+    entries = {}
+    try:
+        validDeviceIP = validDeviceIP.strip()
+        currentNetDevice = deviceParams(validDeviceIP, username, netDevice['password'], netDevice['secret'], sessionLog, **sessionOptions)
+        shHostnameOut = deviceHostname(validDeviceIP) + '#'
+
+        # Read-only commands run a few minutes ago by the same user come from the cache,
+        # no SSH session needed (after the login with NETOPS_SHOW_CACHE_VERIFY_LOGIN=1)
+        if not showResultCache.verifyLogin:
+            entries.update(showResultCache.cachedEntries(validDeviceIP, username, shCommands))
+            if all(command in entries for command in shCommands):
+                record = resultProtocol.deviceRecord(
+                    scriptName, validDeviceIP, "ok", time.perf_counter() - startTime, hostname=shHostnameOut[:-1],
+                    **resultProtocol.commandFields([entries[command] for command in shCommands]),
+                )
+                resultProtocol.emit(record)
+                return resultProtocol.formatRecord(record)
+
+        # print(f"INFO: Connecting to device {validDeviceIP}...")
+        authLog.info(f"Connecting to device {validDeviceIP}")
+        with deviceSession(connectHandler, currentNetDevice, scriptName) as sshAccess:
+            try:
+                authLog.info(f"Connected to device: {validDeviceIP}")
+                if onSession:
+                    onSession(sshAccess)
+                if showResultCache.verifyLogin:
+                    entries.update(showResultCache.cachedEntries(validDeviceIP, username, shCommands))
+
+                pendingCommands = [command for command in shCommands if command not in entries]
+                if pendingCommands:
+                    with scriptMetrics.stage(scriptName, "enable"):
+                        sshAccess.enable()
+                authLog.info(f"Hostname for {validDeviceIP}: {shHostnameOut}")
+
+                for command in pendingCommands:
+                    authLog.info(f"Command input by the user:{username}, command:{command}")
+                    # print(f"INFO: Running command:{command}, on device {validDeviceIP}")
+                    commandStart = time.perf_counter()
+                    with scriptMetrics.stage(scriptName, "command"):
+                        shCommandOut = sshAccess.send_command(command)
+                    commandSeconds = time.perf_counter() - commandStart
+                    authLog.info(f"Automation successfully run the command: {command} on device: {validDeviceIP}")
+                    authLog.info(f"{shHostnameOut}{command}\n{outputForLog(shCommandOut)}")
+                    # print(f"INFO: Command successfully executed")
+                    if abandoned is not None and abandoned.is_set():
+                        raise TimeoutError("device abandoned after the device timeout")
+                    showResultCache.store(validDeviceIP, username, command, shCommandOut)
+
+                    filename = filterFilename(command)
+                    authLog.info(f"This is the filename:{filename}")
+
+                    outputRef = outputPath("Outputs", f"{filename} for device {validDeviceIP}.txt")
+                    with outputLock:
+                        with open(outputRef, "a") as file:
+                            file.write(f"User {username} connected to device IP {validDeviceIP}\n\n")
+                            file.write(f"{shHostnameOut}{command}\n{shCommandOut}")
+                            authLog.info(f"File:{file} successfully created")
+
+                        if shCommandOut:
+                            with open(outputPath("Outputs", "General Outputs.txt"), "a") as file:
+                                file.write(f"{shHostnameOut}{command}\n{shCommandOut}\n")
+                                authLog.info(f"File:General Outputs.txt successfully created andinfo added")
+
+                    entries[command] = {
+                        "command": command, "output": shCommandOut, "seconds": round(commandSeconds, 3), "outputRef": outputRef,
+                    }
+
+                record = resultProtocol.deviceRecord(
+                    scriptName, validDeviceIP, "ok", time.perf_counter() - startTime, hostname=shHostnameOut[:-1],
+                    **resultProtocol.commandFields([entries[command] for command in shCommands]),
+                )
+                resultProtocol.emit(record)
+                return resultProtocol.formatRecord(record)
+
+            except Exception as error:
+                if abandoned is not None and abandoned.is_set():
+                    authLog.info(f"Device {validDeviceIP} stopped after its timeout: {error}")
+                    return None
+                # print(f"ERROR: An error occurred: {error}\n", traceback.format_exc())
+                authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}")
+                authLog.error(traceback.format_exc())
+                with outputLock:
+                    failedDevices(username,validDeviceIP,error)
+                resultProtocol.emitDevice(
+                    scriptName, validDeviceIP, "failed", time.perf_counter() - startTime, command="; ".join(shCommands),
+                    error=error, commands=[entries[command] for command in shCommands if command in entries],
+                )
+                return f"Error on {validDeviceIP}, error: {error}"
+
+    except Exception as error:
+        if abandoned is not None and abandoned.is_set():
+            authLog.info(f"Device {validDeviceIP} stopped after its timeout: {error}")
+            return None
+        # print(f"ERROR: An error occurred: {error}\n", traceback.format_exc())
+        authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}")
+        authLog.error(traceback.format_exc())
+        with outputLock:
+            failedDevices(username,validDeviceIP,error)
+        resultProtocol.emitDevice(scriptName, validDeviceIP, "failed", time.perf_counter() - startTime, command="; ".join(shCommands), error=error)
+        return None
+
+def showCommands(validIPs, username, netDevice, shCommand, onResult=None, connectHandler=ConnectHandler, cancelEvent=None):
     # This function is to take a show run
+    # shCommand: one show command or an ordered list of them, run over one session per device
+    # onResult (optional) is called with the text of each device as soon as it finishes
+    # cancelEvent (optional) stops the run before the next device once it is set
     results = []
-    
+    inventory.preload(validIPs)
+
     for validDeviceIP in validIPs:
+        if cancelEvent is not None and cancelEvent.is_set():
+            authLog.info(f"Run cancelled, {len(validIPs) - len(results)} devices not started")
+            break
+        outText = showCommandsDevice(validDeviceIP, username, netDevice, shCommand, connectHandler=connectHandler)
+        if outText is not None:
+            results.append(outText)
+            if onResult:
+                onResult(outText)
+
+    inventory.flush()
+    return "\n\n".join(results)
+
+def showCommandsThread(validIPs, username, netDevice, shCommand, maxThreads=10, deviceTimeout=300, onResult=None,
+                       connectHandler=ConnectHandler, cancelEvent=None):
+    # Same as showCommands but runs up to maxThreads devices at the same time.
+    # Results are returned in the same order as validIPs. A device that is still
+    # running after deviceTimeout seconds is reported as an error and its SSH session is
+    # closed, so its thread stops instead of writing outputs later. The netmiko timeouts
+    # are capped at deviceTimeout too, for a device that hangs before the session opens.
+    # Once cancelEvent (optional) is set the devices not started yet are skipped.
+    maxThreads = max(1, int(maxThreads))
+    results = [None] * len(validIPs)
+    startTimes = {}
+    sessions = {}
+    abandoned = {index: threading.Event() for index in range(len(validIPs))}
+    sessionOptions = {"timeout": min(120, deviceTimeout), "conn_timeout": min(10, deviceTimeout)}
+    inventory.preload(validIPs)
+
+    def runDevice(index, validDeviceIP):
+        if cancelEvent is not None and cancelEvent.is_set():
+            authLog.info(f"Run cancelled, device {validDeviceIP.strip()} not started")
+            return None
+        startTimes[index] = time.monotonic()
+        sessionLog = outputPath("Outputs", f"netmikoLog {validDeviceIP.strip()}.txt")
         try:
-            validDeviceIP = validDeviceIP.strip()
-            currentNetDevice = {
-                'device_type': 'cisco_xe',
-                'ip': validDeviceIP,
-                'username': username,
-                'password': netDevice['password'],
-                'secret': netDevice['secret'],
-                'global_delay_factor': 2.0,
-                'timeout': 120,
-                'session_log': 'Outputs/netmikoLog.txt',
-                'verbose': False,
-                'session_log_file_mode': 'append'
-            }
-
-            # print(f"INFO: Connecting to device {validDeviceIP}...")
-            authLog.info(f"Connecting to device {validDeviceIP}")
-            with ConnectHandler(**currentNetDevice) as sshAccess:
-                try:
-                    authLog.info(f"Connected to device: {validDeviceIP}")
-                    sshAccess.enable()
-                    authLog.info(f"Generating hostname for {validDeviceIP}")
-                    shHostnameOut = re.sub(".mgmt.internal.das|.cm.mgmt.internal.das|.mgmt.wellpoint.com|.caremore.com|.healthcore.local","", validDeviceIP)
-                    shHostnameOut = shHostnameOut + '#'
-                    authLog.info(f"Hostname for {validDeviceIP}: {shHostnameOut}")
-
-                    authLog.info(f"Command input by the user:{username}, command:{shCommand}")
-                    # print(f"INFO: Running command:{shCommand}, on device {validDeviceIP}")
-                    shCommandOut = sshAccess.send_command(shCommand)
-                    authLog.info(f"Automation successfully run the command: {shCommand} on device: {validDeviceIP}")
-                    authLog.info(f"{shHostnameOut}{shCommand}\n{shCommandOut}")
-                    # print(f"INFO: Command successfully executed")
+            return showCommandsDevice(
+                validDeviceIP, username, netDevice, shCommand, sessionLog,
+                onSession=lambda sshAccess: sessions.__setitem__(index, sshAccess),
+                abandoned=abandoned[index], connectHandler=connectHandler, **sessionOptions,
+            )
+        finally:
+            sessions.pop(index, None)
 
-                    filename = filterFilename(shCommand)
-                    authLog.info(f"This is the filename:{filename}")
+    def abandonDevice(index):
+        # Closing the session from here makes the blocked read of the device thread fail
+        abandoned[index].set()
+        sshAccess = sessions.pop(index, None)
+        if sshAccess is not None:
+            try:
+                sshAccess.disconnect()
+            except Exception as error:
+                authLog.error(f"Could not close the session of {validIPs[index].strip()}: {error}")
 
-                    with open(f"Outputs/{filename} for device {validDeviceIP}.txt", "a") as file:
-                        file.write(f"User {username} connected to device IP {validDeviceIP}\n\n")
-                        file.write(f"{shHostnameOut}{shCommand}\n{shCommandOut}")
-                        authLog.info(f"File:{file} successfully created")
+    authLog.info(f"Running command:{shCommand} on {len(validIPs)} devices with {maxThreads} threads, device timeout: {deviceTimeout}s")
+    executor = ContextExecutor(max_workers=maxThreads)
+    try:
+        futureToIndex = {
+            executor.submit(runDevice, index, validDeviceIP): index
+            for index, validDeviceIP in enumerate(validIPs)
+        }
+        pending = set(futureToIndex)
 
-                    if shCommandOut: 
-                        with open(f"Outputs/General Outputs.txt", "a") as file:
-                            file.write(f"{shHostnameOut}{shCommand}\n{shCommandOut}\n")
-                            authLog.info(f"File:General Outputs.txt successfully created andinfo added")
-                    
-                    outText = f"{shHostnameOut}{shCommand}\n{shCommandOut}"
-                    results.append(outText)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, timeout=1, return_when=concurrent.futures.FIRST_COMPLETED)
 
+            for future in done:
+                index = futureToIndex[future]
+                try:
+                    results[index] = future.result()
                 except Exception as error:
-                    # print(f"ERROR: An error occurred: {error}\n", traceback.format_exc())
-                    authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}")
-                    authLog.error(traceback.format_exc(),"\n")
-                    failedDevices(username,validDeviceIP,error)
-                    results.append(f"Error on {validDeviceIP}, error: {error}")
-         
-        except Exception as error:
-            # print(f"ERROR: An error occurred: {error}\n", traceback.format_exc())
-            authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}")
-            authLog.error(traceback.format_exc(),"\n")
-            failedDevices(username,validDeviceIP,error)   
-    return "\n\n".join(results)  
\ No newline at end of file
+                    authLog.error(f"IP Address: {validIPs[index]} with thread failed with exception/error: {error}\n{traceback.format_exc()}")
+                    results[index] = f"Error on {validIPs[index]}, error: {error}"
+                if onResult and results[index] is not None:
+                    onResult(results[index])
+
+            now = time.monotonic()
+            for future in list(pending):
+                index = futureToIndex[future]
+                if index in startTimes and now - startTimes[index] > deviceTimeout:
+                    validDeviceIP = validIPs[index].strip()
+                    authLog.error(f"Device {validDeviceIP} did not finish after {deviceTimeout} seconds, skipping it")
+                    abandonDevice(index)
+                    with outputLock:
+                        failedDevices(username, validDeviceIP, f"Timed out after {deviceTimeout} seconds")
+                    results[index] = f"Error on {validDeviceIP}, error: timed out after {deviceTimeout} seconds"
+                    resultProtocol.emitDevice(
+                        scriptName, validDeviceIP, "timeout", now - startTimes[index], command="; ".join(commandList(shCommand)),
+                        error=TimeoutError(f"timed out after {deviceTimeout} seconds"),
+                    )
+                    if onResult:
+                        onResult(results[index])
+                    pending.discard(future)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        inventory.flush()
+
+    return "\n\n".join(outText for outText in results if outText is not None)
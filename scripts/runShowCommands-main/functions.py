@@ -3,9 +3,22 @@ from netmiko.exceptions import NetMikoAuthenticationException, NetMikoTimeoutExc
 
 import socket
 import getpass
-import csv
-import re
 import traceback
+import sys
+import os
+
+# netops_core lives in the scripts folder and is shared by all the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netops_core import DeviceResolver, ScriptOutputs, filterFilename
+
+# Label of the metrics sent by this script (its folder name)
+scriptName = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
+# Output files in the folder of the script, whatever the current folder is (netops_core/output.py)
+outputs = ScriptOutputs(os.path.dirname(os.path.abspath(__file__)))
+outputPath = outputs.path
+failedDevices = outputs.failedDevices
+logInCSV = outputs.logInCSV
 
 def checkIsDigit(input_str):
     try:
@@ -16,68 +29,11 @@ def checkIsDigit(input_str):
         authLog.error(f"Invalid option chosen: {input_str}, error: {error}")
         authLog.error(traceback.format_exc())
                 
-def validateIP(deviceIP):
-    hostnamesResolution = [
-        f'{deviceIP}.mgmt.internal.das',
-        f'{deviceIP}.cm.mgmt.internal.das',
-        f'{deviceIP}.mgmt.wellpoint.com',
-        f'{deviceIP}.caremore.com',
-        f'{deviceIP}.healthcore.local'
-    ]
-        
-    def checkConnect22(ipAddress, port=22, timeout=3):
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as connectTest:
-                connectTest.settimeout(timeout)
-                connectTestOut = connectTest.connect_ex((ipAddress, port))
-                return connectTestOut == 0
-        except socket.error as error:
-            authLog.error(f"Device {ipAddress} is not reachable on port TCP 22.")
-            authLog.error(f"Error:{error}\n", traceback.format_exc())
-            return False
-
-    def validIP(ip):
-        try:
-            socket.inet_aton(ip)
-            authLog.info(f"IP successfully validated: {deviceIP}")
-            return True
-        except socket.error:
-            authLog.error(f"IP: {ip} is not an IP Address, will attempt to resolve hostname.")
-            return False
-
-    def resolveHostname(hostname):
-        try:
-            hostnameOut = socket.gethostbyname(hostname)
-            authLog.info(f"Hostname successfully validated: {hostname}")
-            return hostnameOut
-        except socket.gaierror:
-            authLog.error(f"Was not posible to resolve hostname: {hostname}")
-            return None
-
-    if validIP(deviceIP):
-        if checkConnect22(deviceIP):
-            authLog.info(f"Device IP {deviceIP} is reachable on Port TCP 22.")
-            # print(f"INFO: Device IP {deviceIP} is reachable on Port TCP 22.")
-            return deviceIP
-
-    for hostname in hostnamesResolution:
-        resolvedIP = resolveHostname(hostname)
-        if resolvedIP and checkConnect22(resolvedIP):
-            authLog.info(f"Device IP {hostname} is reachable on Port TCP 22.")
-            # print(f"INFO: Device IP {hostname} is reachable on Port TCP 22.")
-            return hostname    
-
-    hostnameStr = ', '.join(hostnamesResolution)  
-    
-    authLog.error(f"Not a valid IP address or hostname: {hostnameStr}")
-    authLog.error(traceback.format_exc())
-    # print(f"ERROR: Invalid IP address or hostname: {hostnameStr}")
-
-    with open('Devices unreachable.csv', mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([hostnameStr])
-    
-    return None
+# validateIP / validateIPsBatch are the same for all the scripts (scripts/netops_core/resolution.py)
+resolver = DeviceResolver(scriptName, unreachableFile=outputPath('Devices unreachable.csv'))
+checkConnect22 = resolver.checkConnect22
+validateIP = resolver.validateIP
+validateIPsBatch = resolver.validateIPsBatch
 
 def requestLogin(validIPs):
     while True:
@@ -122,23 +78,4 @@ def requestLogin(validIPs):
             authLog.debug(traceback.format_exc())
 
 def checkYNInput(stringInput):
-    return stringInput.lower() == 'y' or stringInput.lower() == 'n'
-
-def failedDevices(username,validDeviceIP="",error=""):
-    authLog.error(f"Device: {validDeviceIP} had an error")
-    authLog.error(traceback.format_exc())
-    with open(f"Outputs/Devices with errors.txt","a") as failedDevices:
-        failedDevices.write(f"User {username} connected to {validDeviceIP} got an error:\n{error}.\n")
-
-def logInCSV(validDeviceIP, filename=""):
-    # print(f"INFO: File created: {filename}")
-    authLog.info(f"File created: {filename}")
-    with open(f'Outputs/{filename}.csv', mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([validDeviceIP])
-        authLog.info(f"Appended device: {validDeviceIP} to file {filename}")
-
-def filterFilename(filename):
-    # Replace any character that is not alphanumeric, underscore, hyphen, space, forward slash, or vertical bar
-    filename = re.sub(r'[|]', '_', filename)
-    return re.sub(r'[^a-zA-Z0-9_\- ]', '_', filename)
\ No newline at end of file
+    return stringInput.lower() == 'y' or stringInput.lower() == 'n'
\ No newline at end of file
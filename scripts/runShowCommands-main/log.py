@@ -1,54 +1,10 @@
-import logging
+import sys
+import os
 
-import logging
-import logging.config
+# netops_core is in the scripts folder, shared by all the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netops_core.logs import setupLogging
 
-logConfiguration = {
-    'version': 1,
-    'loggers': {
-        'debugLog': {
-            'level': 'DEBUG',
-            'handlers': ['debugHandler']
-        },
-        'errorLog': {
-            'level': 'ERROR',
-            'handlers': ['errorHandler']
-        },
-        'infoLog': {
-            'level': 'INFO',
-            'handlers': ['infoHandler']
-        },
-    },
-    'handlers': {
-        'debugHandler' : {
-            'class': 'logging.FileHandler',
-            'filename': 'logs/systemLogs.txt',
-            'level': 'DEBUG',
-            'formatter': 'completeFormat'
-        },
-        'errorHandler' : {
-            'class': 'logging.FileHandler',
-            'filename': 'logs/systemLogs.txt',
-            'level': 'ERROR',
-            'formatter' : 'logFormat'
-        },
-        'infoHandler' : {
-            'class': 'logging.FileHandler',
-            'filename': 'logs/systemLogs.txt',
-            'level': 'INFO',
-            'formatter' : 'logFormat'
-        },
-    },
-    'formatters': {
-        'logFormat': {
-            'format' : "%(asctime)s - %(levelname)s - %(message)s"
-        },
-        'completeFormat': {
-            'format' : "%(asctime)s - %(levelname)s - %(message)s - %(pathname)s - %(module)s - %(lineno)d - %(process)d - %(thread)d"
-        },
-    }
-}
-
-logging.config.dictConfig(logConfiguration)
-authLog = logging.getLogger('infoLog')
-invalidIPLog = logging.getLogger('errorLog')
\ No newline at end of file
+# infoLog / errorLog / debugLog written to logs/systemLogs.txt by a background thread,
+# with rotation (NETOPS_LOG_* settings in netops_core/logs.py)
+authLog, invalidIPLog = setupLogging(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'systemLogs.txt'))
@@ -6,9 +6,10 @@ def main():
     # Crear carpetas logs/Outputs si no existen
     mkdir()
 
-    from functions import validateIP
-    from commandsCLI import showCommands
+    from functions import validateIPsBatch, scriptName
+    from commandsCLI import showCommands, showCommandsThread
     from log import authLog
+    import resultProtocol
 
     """
     Modo NO interactivo, pensado para ser llamado desde FastAPI / backend.
@@ -18,7 +19,10 @@ def main():
         --devices "10.1.1.1,10.1.1.2" \
         --username luis \
         --password cisco \
-        --command "show ip interface brief"
+        --command "show ip interface brief" \
+        --command "show version" \
+        --threads 20 \
+        --format ndjson
     """
 
     parser = argparse.ArgumentParser(
@@ -42,27 +46,68 @@ def main():
     parser.add_argument(
         "--command",
         required=True,
-        help="Complete show command to run on each device.",
+        action="append",
+        help="Complete show command to run on each device. Repeat it to run several commands, in order, over one session per device.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Number of devices to run at the same time. 1 runs the devices one by one.",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["netmiko", "asyncssh"],
+        default="netmiko",
+        help="SSH library. asyncssh runs all the devices concurrently in one thread (pip install asyncssh).",
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        default=1000,
+        help="SSH sessions open at the same time with --transport asyncssh.",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse recent outputs of read-only show commands (same as NETOPS_SHOW_CACHE=1).",
+    )
+    parser.add_argument(
+        "--device-timeout",
+        type=int,
+        default=300,
+        help="Seconds to wait for each device when running with more than one thread or with asyncssh.",
+    )
+
+    parser.add_argument(
+        "--format",
+        choices=["text", "ndjson"],
+        default="text",
+        help="ndjson: one JSON record per device on stdout (see scripts/resultProtocol.py).",
     )
 
     args = parser.parse_args()
 
+    # Registros por device para el backend en lugar del texto
+    resultProtocol.enabled = args.format == "ndjson"
+
+    if args.cache:
+        import showResultCache
+        showResultCache.enabled = True
+
     def validateIPs(devices: str):
         """
         Recibe un string tipo '10.1.1.1,10.1.1.2'
-        Valida cada IP/hostname con validateIP y devuelve la lista de válidas.
+        Valida todas las IPs/hostnames a la vez con validateIPsBatch y devuelve la lista de válidas.
         """
         validIPs = []
-        raw_list = devices.split(",")
-        for ip in raw_list:
-            ip = ip.strip()
-            if not ip:
-                continue
-            ipOut = validateIP(ip)
+        raw_list = [ip.strip() for ip in devices.split(",") if ip.strip()]
+        for ip, ipOut in zip(raw_list, validateIPsBatch(raw_list)):
             if ipOut is not None:
                 validIPs.append(ipOut)
             else:
                 authLog.info(f"IP address {ip} is invalid or unreachable.")
+                resultProtocol.emitDevice(scriptName, ip, "unreachable", 0, error="invalid or unreachable on TCP 22", errorClass="Unreachable")
 
         if not validIPs:
             raise ValueError("No valid IP addresses found after validation.")
@@ -81,17 +126,37 @@ def main():
 
     authLog.info(
         f"[runShowCommands-main] Non-interactive run. "
-        f"Devices={validIPs}, username={args.username}, command={args.command}"
+        f"Devices={validIPs}, username={args.username}, commands={args.command}"
     )
 
-    # Reusar tu función existente
-    showCommandOut = showCommands(validIPs, args.username, netDevice, args.command)
-
-    print("INFO: Non-interactive run completed successfully.")
-    print(f"INFO: Devices: {validIPs}")
-    print(f"INFO: Command: {args.command}")
-
-    print(showCommandOut)
+    # Cada device se imprime apenas termina, así el backend lo puede ir mostrando.
+    # Con --format ndjson el resultado ya va en el registro del device.
+    def printResult(outText):
+        print(outText + "\n", flush=True)
+
+    if resultProtocol.enabled:
+        printResult = None
+
+    if args.transport == "asyncssh":
+        from asyncSSH import showCommands as showCommandsAsync
+        showCommandsAsync(
+            validIPs, args.username, netDevice, args.command,
+            onResult=printResult, maxSessions=args.max_sessions, deviceTimeout=args.device_timeout,
+        )
+    elif args.threads > 1:
+        showCommandsThread(
+            validIPs, args.username, netDevice, args.command,
+            maxThreads=args.threads, deviceTimeout=args.device_timeout,
+            onResult=printResult,
+        )
+    else:
+        # Reusar tu función existente
+        showCommands(validIPs, args.username, netDevice, args.command, onResult=printResult)
+
+    if not resultProtocol.enabled:
+        print("INFO: Non-interactive run completed successfully.")
+        print(f"INFO: Devices: {validIPs}")
+        print(f"INFO: Commands: {', '.join(args.command)}")
 
     # return showCommandOut
 
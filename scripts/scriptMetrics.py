@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from threading import Lock
+import json
+import time
+import sys
+import os
+
+# Timings measured inside the scripts (SSH stages per device, reachability probes),
+# shared by every script folder under scripts/.
+# - In-process runs: the backend sets sink = metrics.observeScriptMetric.
+# - Runs as a subprocess of the backend (NETOPS_METRICS_STDERR=1): one line per value
+#   on stderr, "NETOPS_METRIC {json}", that runScript reads and removes from stderr.
+# - Standalone runs: nothing is recorded.
+
+sink = None
+
+# Device threads send metrics at the same time, one write per line keeps the lines whole
+writeLock = Lock()
+
+def observe(name, value, **labels):
+    if sink is not None:
+        sink(name, value, labels)
+    elif os.getenv("NETOPS_METRICS_STDERR") == "1":
+        line = "NETOPS_METRIC " + json.dumps({"name": name, "value": value, "labels": labels})
+        with writeLock:
+            sys.stderr.write(line + "\n")
+            sys.stderr.flush()
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def stage(script, stageName):
+    # Time of one SSH stage of a device: connect, enable, command, config, disconnect
+    return timer("device_stage_seconds", script=script, stage=stageName)
+
+@contextmanager
+def deviceSession(connectHandler, device, script):
+    # Same as "with ConnectHandler(**device) as sshAccess", timing the connect and the disconnect
+    with stage(script, "connect"):
+        sshAccess = connectHandler(**device)
+    try:
+        yield sshAccess
+    finally:
+        with stage(script, "disconnect"):
+            sshAccess.disconnect()
@@ -1,77 +1,109 @@
 from netmiko import ConnectHandler
 from log import authLog
-from functions import logInCSV
+from netops_core import outputForLog, deviceParams, deviceSession, deviceHostname, inventory
+from functions import logInCSV, scriptName, outputPath
+import scriptMetrics
+import resultProtocol
 
 import traceback
-import re
+import time
 
 shInventory = "show inventory"
 shIntStatusHalf = "show interface | tab | inc half|inc Half"
 shIntStatusHalfcEdge = "show interface | inc Giga|TenGig|Duplex"
 halfPatt = r"Half"
+unknownCommandPatt = ("syntax error", "Invalid input")
+
+# Duplex command and netmiko device_type of each platform. The platform is learned once
+# with "show inventory" (vEdges answer it with a syntax error) and kept in the device
+# inventory, the next runs send the duplex command directly. cEdges run IOS-XE, once
+# learned they get the IOS-XE driver (enable, paging) instead of the Viptela one.
+platformCommands = {"vedge": shIntStatusHalf, "cedge": shIntStatusHalfcEdge}
+platformDeviceTypes = {"vedge": "cisco_viptela", "cedge": "cisco_xe"}
+# device_type of the devices not learned yet, it has to work for both platforms
+probeDeviceType = "cisco_viptela"
+
+def detectPlatform(sshAccess, validDeviceIP):
+    print(f"INFO: Taking a \"{shInventory}\" for device: {validDeviceIP}")
+    with scriptMetrics.stage(scriptName, "command"):
+        shInventoryOut = sshAccess.send_command_timing(shInventory)
+    authLog.info(f"Automation successfully ran the command: {shInventory}")
+
+    platform = "vedge" if "syntax error" in shInventoryOut else "cedge"
+    authLog.info(f"Platform of device {validDeviceIP}: {platform}")
+    inventory.storePlatform(validDeviceIP, platform, platformDeviceTypes[platform])
+    return platform
+
+def runHalfCommand(sshAccess, validDeviceIP, shCommand):
+    print(f"INFO: Taking a \"{shCommand}\" for device: {validDeviceIP}")
+    with scriptMetrics.stage(scriptName, "command"):
+        shCommandOut = sshAccess.send_command_timing(shCommand)
+    authLog.info(f"Automation successfully ran the command: {shCommand}")
+    return shCommandOut
 
 def showHalfInts(validIPs, username, netDevice):
     # This function is to take a show run
-    
+    inventory.preload(validIPs)
+
     for validDeviceIP in validIPs:
+        startTime = time.perf_counter()
+        cachedPlatform = None
         try:
             validDeviceIP = str(validDeviceIP).strip()
-            currentNetDevice = {
-                'device_type': 'cisco_viptela', #'cisco_viptela', #cisco_xe
-                'ip': validDeviceIP,
-                'username': username,
-                'password': netDevice['password'],
-                'secret': netDevice['secret'],
-                'global_delay_factor': 2.0,
-                'timeout': 120,
-                'session_log': 'logs/netmikoLog.txt',
-                'verbose': True,
-                'session_log_file_mode': 'append'
-            }
+            cachedPlatform, deviceType = inventory.platformOf(validDeviceIP)
+            currentNetDevice = deviceParams(
+                validDeviceIP, username, netDevice['password'], netDevice['secret'],
+                sessionLog=outputPath('logs', 'netmikoLog.txt'), deviceType=deviceType or probeDeviceType, verbose=True,
+            )
 
             print(f"Connecting to device {validDeviceIP}...")
-            with ConnectHandler(**currentNetDevice) as sshAccess:
-                sshAccess.enable()
+            with deviceSession(ConnectHandler, currentNetDevice, scriptName) as sshAccess:
+                with scriptMetrics.stage(scriptName, "enable"):
+                    sshAccess.enable()
                 authLog.info(f"Generating hostname for {validDeviceIP}")
-                shHostnameOut = re.sub(".mgmt.internal.das|.cm.mgmt.internal.das|.mgmt.wellpoint.com","#", validDeviceIP)
+                shHostnameOut = deviceHostname(validDeviceIP) + '#'
                 authLog.info(f"Hostname for {validDeviceIP}: {shHostnameOut}")
                 print(f"INFO: This is the hostname: {shHostnameOut}")
 
-                print(f"INFO: Taking a \"{shInventory}\" for device: {validDeviceIP}")
-                shInventoryOut = sshAccess.send_command_timing(shInventory)
-                authLog.info(f"Automation successfully ran the command: {shInventory}")
-
-                if "syntax error" in shInventoryOut:
-                    print(f"INFO: Taking a \"{shIntStatusHalf}\" for device: {validDeviceIP}")
-                    shIntStatusHalfOut = sshAccess.send_command_timing(shIntStatusHalf)
-                    authLog.info(f"Automation successfully ran the command: {shIntStatusHalf}")
-
-                    if halfPatt in shIntStatusHalfOut:
-                        print(f"INFO: The word \"half\" was found on the output for device: {validDeviceIP}")
-                        authLog.info(f"The word \"half\" was found on the output for device: {validDeviceIP}")
-                        authLog.info(f"{shHostnameOut}{shIntStatusHalf}\n{shIntStatusHalfOut}")
-                        logInCSV(shHostnameOut, "Devices Half Duplex", shIntStatusHalf,shIntStatusHalfOut)
-                    else:
-                        authLog.info(f"Device {validDeviceIP} is running at full duplex/full speed")
-                        logInCSV(shHostnameOut, "Devices Full Duplex", shIntStatusHalf,shIntStatusHalfOut)
+                platform = cachedPlatform or detectPlatform(sshAccess, validDeviceIP)
+                shCommandRun = platformCommands[platform]
+                shCommandOut = runHalfCommand(sshAccess, validDeviceIP, shCommandRun)
+
+                if cachedPlatform and any(patt in shCommandOut for patt in unknownCommandPatt):
+                    # The device does not know the command of its cached platform (replaced
+                    # or upgraded), learn the platform again in the same session
+                    authLog.info(f"Cached platform {cachedPlatform} of device {validDeviceIP} rejected {shCommandRun}, probing it again")
+                    platform = detectPlatform(sshAccess, validDeviceIP)
+                    shCommandRun = platformCommands[platform]
+                    shCommandOut = runHalfCommand(sshAccess, validDeviceIP, shCommandRun)
+
+                if halfPatt in shCommandOut:
+                    print(f"INFO: The word \"half\" was found on the output for device: {validDeviceIP}")
+                    authLog.info(f"The word \"half\" was found on the output for device: {validDeviceIP}")
+                    authLog.info(f"{shHostnameOut}{shCommandRun}\n{outputForLog(shCommandOut)}")
+                    logInCSV(shHostnameOut, "Devices Half Duplex", shCommandRun, shCommandOut)
                 else:
-                    print(f"INFO: Taking a \"{shIntStatusHalfcEdge}\" for device: {validDeviceIP}")
-                    shIntStatusHalfcEdgeOut = sshAccess.send_command_timing(shIntStatusHalfcEdge)
-                    authLog.info(f"Automation successfully ran the command: {shIntStatusHalfcEdge}")
-
-                    if halfPatt in shIntStatusHalfcEdgeOut:
-                        print(f"INFO: The word \"half\" was found on the output for device: {validDeviceIP}")
-                        authLog.info(f"The word \"half\" was found on the output for device: {validDeviceIP}")
-                        authLog.info(f"{shHostnameOut}{shIntStatusHalfcEdge}\n{shIntStatusHalfcEdgeOut}")
-                        logInCSV(shHostnameOut, "Devices Half Duplex", shIntStatusHalfcEdge,shIntStatusHalfcEdgeOut)
-                    else:
-                        authLog.info(f"Device {validDeviceIP} is running at full duplex/full speed")
-                        logInCSV(shHostnameOut, "Devices Full Duplex", shIntStatusHalfcEdge,shIntStatusHalfcEdgeOut)
+                    authLog.info(f"Device {validDeviceIP} is running at full duplex/full speed")
+                    logInCSV(shHostnameOut, "Devices Full Duplex", shCommandRun, shCommandOut)
+
+                halfDuplex = halfPatt in shCommandOut
+                resultProtocol.emitDevice(
+                    scriptName, validDeviceIP, "ok", time.perf_counter() - startTime, hostname=shHostnameOut.rstrip("#"),
+                    command=shCommandRun, output=shCommandOut, halfDuplex=halfDuplex,
+                    platform=platform, platformCached=platform == cachedPlatform,
+                    outputRef=outputPath("Outputs", f"Devices {'Half' if halfDuplex else 'Full'} Duplex.csv"),
+                )
 
         except Exception as error:
             print(f"An error occurred: {error}\n {traceback.format_exc()}")
             authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}\n {traceback.format_exc()}")
+            resultProtocol.emitDevice(scriptName, validDeviceIP, "failed", time.perf_counter() - startTime, error=error)
+            if cachedPlatform:
+                # The cached device_type may be the reason, the next run probes the device again
+                inventory.forgetPlatform(validDeviceIP)
 
-            with open(f"Outputs/Failed Devices.txt","a") as failedDevices:
+            with open(outputPath("Outputs", "Failed Devices.txt"),"a") as failedDevices:
 
                 failedDevices.write(f"User {username} connected to {validDeviceIP} got an error.\n{error}")
+
+    inventory.flush()
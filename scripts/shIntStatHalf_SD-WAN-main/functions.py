@@ -3,9 +3,22 @@ from netmiko.exceptions import NetMikoAuthenticationException, NetMikoTimeoutExc
 
 import socket
 import getpass
-import csv
 import re
 import traceback
+import sys
+import os
+
+# netops_core lives in the scripts folder and is shared by all the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import netops_core
+from netops_core import DeviceResolver, ScriptOutputs
+
+# Label of the metrics sent by this script (its folder name)
+scriptName = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
+# Output files in the folder of the script, whatever the current folder is (netops_core/output.py)
+outputs = ScriptOutputs(os.path.dirname(os.path.abspath(__file__)))
+outputPath = outputs.path
 
 def checkIsDigit(input_str):
     try:
@@ -16,82 +29,26 @@ def checkIsDigit(input_str):
         authLog.error(f"Invalid option chosen: {input_str}, error: {error}")
         authLog.error(traceback.format_exc())
                 
-def validateIP(deviceIP):
-    hostnamesResolution = [
-        f'{deviceIP}.mgmt.internal.das',
-        f'{deviceIP}.cm.mgmt.internal.das',
-        f'{deviceIP}.mgmt.wellpoint.com'
-    ]
-        
-    def checkConnect22(ipAddress, port=22, timeout=3):
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as connectTest:
-                connectTest.settimeout(timeout)
-                connectTestOut = connectTest.connect_ex((ipAddress, port))
-                return connectTestOut == 0
-        except socket.error as error:
-            authLog.error(f"Device {ipAddress} is not reachable on port TCP 22.")
-            authLog.error(f"Error:{error}\n", traceback.format_exc())
-            return False
-
-    def validIP(ip):
-        try:
-            socket.inet_aton(ip)
-            authLog.info(f"IP successfully validated: {deviceIP}")
-            return True
-        except socket.error:
-            authLog.error(f"IP: {ip} is not an IP Address, will attempt to resolve hostname.")
-            return False
-
-    def resolveHostname(hostname):
-        try:
-            hostnameOut = socket.gethostbyname(hostname)
-            authLog.info(f"Hostname successfully validated: {hostname}")
-            return hostnameOut
-        except socket.gaierror:
-            authLog.error(f"Was not posible to resolve hostname: {hostname}")
-            return None
-
-    # Here is the first func call, validates if it's an IP Address x.x.x.x
-    if validIP(deviceIP):
-        if checkConnect22(deviceIP):
-            authLog.info(f"Device IP {deviceIP} is reachable on Port TCP 22.")
-            print(f"INFO: Device IP {deviceIP} is reachable on Port TCP 22.")
-            return True
-
-    # if not IP address, tries to resolve the hostname
-    for hostname in hostnamesResolution:
-        resolvedIP = resolveHostname(hostname)
-        if resolvedIP and checkConnect22(resolvedIP):
-            authLog.info(f"Device IP {hostname} is reachable on Port TCP 22.")
-            print(f"INFO: Device IP {hostname} is reachable on Port TCP 22.")
-            return hostname
-        elif "02" in hostname:
-            hostname = re.sub("02", "04", hostname)
-            resolvedIP = resolveHostname(hostname)
-            if resolvedIP and checkConnect22(resolvedIP):
-                authLog.info(f"Device IP {hostname} is reachable on Port TCP 22.")
-                print(f"INFO: Device IP {hostname} is reachable on Port TCP 22.")
-                return hostname
+def hostnameCandidates(deviceIP):
+    # Every DNS name validateIP tries for a device: the DNS suffixes and, for the 01/02
+    # devices, their 03/04 pair
+    candidates = []
+    for hostname in netops_core.hostnameCandidates(deviceIP):
+        candidates.append(hostname)
+        if "02" in hostname:
+            candidates.append(re.sub("02", "04", hostname))
         elif "01" in hostname:
-            hostname = re.sub("01", "03", hostname)
-            resolvedIP = resolveHostname(hostname)
-            if resolvedIP and checkConnect22(resolvedIP):
-                authLog.info(f"Device IP {hostname} is reachable on Port TCP 22.")
-                print(f"INFO: Device IP {hostname} is reachable on Port TCP 22.")
-                return hostname
-
-    hostnameStr = ', '.join(hostnamesResolution)  
-    
-    authLog.error(f"Not a valid IP address or hostname: {hostnameStr}")
-    authLog.error(traceback.format_exc())
-    print(f"ERROR: Invalid IP address or hostname: {hostnameStr}")
-
-    with open('Outputs/invalid Destinations.csv', mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([hostnameStr])
-    
-    return False
+            candidates.append(re.sub("01", "03", hostname))
+    return candidates
+
+# validateIP / validateIPsBatch are the same for all the scripts (scripts/netops_core/resolution.py)
+resolver = DeviceResolver(
+    scriptName, unreachableFile=outputPath('Outputs', 'invalid Destinations.csv'), printReachable=True, printUnreachable=True,
+    candidates=hostnameCandidates,
+)
+checkConnect22 = resolver.checkConnect22
+validateIP = resolver.validateIP
+validateIPsBatch = resolver.validateIPsBatch
 
 def requestLogin(validIPs):
     while True:
@@ -148,7 +105,4 @@ def checkYNInput(stringInput):
 
 def logInCSV(validDeviceIP, filename="", *args):
     print(f"INFO: File created: {filename}")
-    with open(f'Outputs/{filename}.csv', mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow([validDeviceIP, *args])
-        authLog.info(f"Appended device: {validDeviceIP} to file {filename}")
\ No newline at end of file
+    outputs.logInCSV(validDeviceIP, filename, *args)
\ No newline at end of file
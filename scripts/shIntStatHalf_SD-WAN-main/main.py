@@ -1,9 +1,93 @@
 from utils import mkdir
 
 
+import argparse
+import sys
 import os
 
+def nonInteractive():
+    mkdir()
+
+    from functions import validateIPsBatch, scriptName
+    from commandsCLI import showHalfInts
+    from log import authLog
+    import resultProtocol
+
+    """
+    Modo NO interactivo, pensado para ser llamado desde FastAPI / backend.
+
+    Ejemplo de uso:
+      python main.py \
+        --devices "10.1.1.1,10.1.1.2" \
+        --username luis \
+        --password cisco \
+        --format ndjson
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Automated half duplex interfaces check"
+    )
+    parser.add_argument(
+        "--devices",
+        required=True,
+        help="Comma-separated list of device IPs/hostnames. Example: '10.1.1.1,10.1.1.2'",
+    )
+    parser.add_argument(
+        "--username",
+        required=True,
+        help="Username to use for device login.",
+    )
+    parser.add_argument(
+        "--password",
+        required=True,
+        help="Password to use for device login (also used as enable password).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "ndjson"],
+        default="text",
+        help="ndjson: one JSON record per device on stdout (see scripts/resultProtocol.py).",
+    )
+
+    args = parser.parse_args()
+
+    # Registros por device para el backend
+    resultProtocol.enabled = args.format == "ndjson"
+
+    validIPs = []
+    rawList = [ip.strip() for ip in args.devices.split(",") if ip.strip()]
+    for ip, ipOut in zip(rawList, validateIPsBatch(rawList)):
+        if ipOut is not None:
+            validIPs.append(ipOut)
+        else:
+            authLog.info(f"IP address {ip} is invalid or unreachable.")
+            resultProtocol.emitDevice(scriptName, ip, "unreachable", 0, error="invalid or unreachable on TCP 22", errorClass="Unreachable")
+
+    if not validIPs:
+        raise ValueError("No valid IP addresses found after validation.")
+
+    netDevice = {
+        "password": args.password,
+        "secret": args.password,
+    }
+
+    authLog.info(
+        f"[shIntStatHalf_SD-WAN-main] Non-interactive run. "
+        f"Devices={validIPs}, username={args.username}"
+    )
+
+    showHalfInts(validIPs, args.username, netDevice)
+
+    if not resultProtocol.enabled:
+        print("INFO: Non-interactive run completed successfully.")
+        print(f"INFO: Devices: {validIPs}")
+
 def main():
+    # Con parámetros (--devices ...) corre sin menú, como lo llama el backend
+    if len(sys.argv) > 1:
+        nonInteractive()
+        return
+
     mkdir()
     from strings import greetingString, menuString, inputErrorString
     greetingString()
@@ -31,4 +115,4 @@ def main():
             os.system("PAUSE")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -1,18 +1,9 @@
-import traceback
+import sys
 import os
 
-def mkdir():
-    path = "logs"
-    path1 = "Outputs"
-    if not os.path.exists(path):
-        try:
-            os.mkdir(path)
-        except Exception as Error:
-            print(f"ERROR: Wasn't possible to create new folder \"{path}\"")
-            print(traceback.format_exc())
-    if not os.path.exists(path1):
-        try:
-            os.mkdir(path1)
-        except Exception as Error:
-            print(f"ERROR: Wasn't possible to create new folder \"{path1}\"")
-            print(traceback.format_exc())
\ No newline at end of file
+# netops_core is in the scripts folder, shared by all the scripts
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from netops_core import ScriptOutputs
+
+# logs/ and Outputs/ in the folder of the script, whatever the current folder is
+mkdir = ScriptOutputs(os.path.dirname(os.path.abspath(__file__))).mkdir
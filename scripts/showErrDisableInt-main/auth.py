@@ -1,5 +1,5 @@
 
-from functions import checkYNInput,validateIP,requestLogin
+from functions import checkYNInput,validateIPsBatch,requestLogin
 from strings import greetingString
 from log import authLog
 import traceback
@@ -28,15 +28,20 @@ def Auth():
             try:
                 with open(csvFile, "r") as deviceFile:
                     csvReader = csv.reader(deviceFile)
+                    deviceIPsList = []
                     for row in csvReader:
                         for ip in row:
                             ip = ip.strip()
+                            if not ip:
+                                continue
                             authLog.info(f"IP address found: {ip} in file: {csvFile}")
-                            ipOut = validateIP(ip)
-                            if ipOut is not None:
-                                validIPs.append(ipOut)
-                            else:
-                                authLog.info(f"IP address {ip} is invalid or unreachable.")
+                            deviceIPsList.append(ip)
+
+                    for ip, ipOut in zip(deviceIPsList, validateIPsBatch(deviceIPsList)):
+                        if ipOut is not None:
+                            validIPs.append(ipOut)
+                        else:
+                            authLog.info(f"IP address {ip} is invalid or unreachable.")
                     if not validIPs:
                         print(f"No valid IP addresses found in the file path: {csvFile}\n")
                         authLog.error(f"No valid IP addresses found in the file path: {csvFile}")
@@ -60,11 +65,9 @@ def Auth():
         greetingString()
         while True:
             deviceIPs = input("\nPlease enter the devices IPs separated by commas: ")
-            deviceIPsList = deviceIPs.split(',')
+            deviceIPsList = [ip.strip() for ip in deviceIPs.split(',') if ip.strip()]
 
-            for ip in deviceIPsList:
-                ip = ip.strip()
-                ipOut = validateIP(ip)
+            for ip, ipOut in zip(deviceIPsList, validateIPsBatch(deviceIPsList)):
                 if ipOut is not None:
                     validIPs.append(ipOut)
                 else:
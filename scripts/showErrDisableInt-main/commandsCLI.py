@@ -1,101 +1,210 @@
 from netmiko import ConnectHandler
-from functions import createPDF, checkYNInput
+from functions import createReport, checkYNInput, scriptName, outputPath
 from log import authLog
+from netops_core import outputForLog, outputLock, deviceParams, deviceSession, deviceHostname, inventory, ContextExecutor
+import scriptMetrics
+import resultProtocol
 
+import concurrent.futures
 import traceback
+import time
 import re
 
 shErroDisable = "show interfaces status err-disabled"
 shHostname = "show run | i hostname"
-interface = ''
 writeMem = 'do write'
 
 errDisableIntPatt = r'[a-zA-Z]+\d+\/(?:\d+\/)*\d+'
 
-recovInt = [
-    f'int {interface}',
-    'shut',
-    'no shut'
-]
-
-intErrDisableList = []
-devicesErrList = []
-
-def errDisable(validIPs, username, netDevice):
-    # This function is to find and fix errDisable Intrfaces
-    
-    for validDeviceIP in validIPs:
-        try:
-            validDeviceIP = validDeviceIP.strip()
-            currentNetDevice = {
-                'device_type': 'cisco_xe',
-                'ip': validDeviceIP,
-                'username': username,
-                'password': netDevice['password'],
-                'secret': netDevice['secret'],
-                'global_delay_factor': 2.0,
-                'timeout': 120,
-                'session_log': 'netmikoLog.txt',
-                'verbose': True,
-                'session_log_file_mode': 'append'
-            }
+def recoveryCommands(interfaces):
+    # One config batch for all the err-disabled interfaces of a device
+    commands = []
+    for interface in interfaces:
+        commands.extend([f'int {interface.strip()}', 'shut', 'no shut'])
+    return commands
+
+def printDevice(text):
+    # Device lines of the text output. With result records (ndjson or in-process) the
+    # record carries the same output and the stdout lines would break the NDJSON stream
+    if resultProtocol.collecting():
+        return
+    with resultProtocol.writeLock:
+        print(text)
+
+def connectDevice(validDeviceIP, username, netDevice):
+    currentNetDevice = deviceParams(
+        validDeviceIP, username, netDevice['password'], netDevice['secret'],
+        sessionLog=outputPath('netmikoLog.txt'), verbose=True,
+    )
+    printDevice(f"INFO: Connecting to device {validDeviceIP}...")
+    return deviceSession(ConnectHandler, currentNetDevice, scriptName)
 
-            print(f"INFO: Connecting to device {validDeviceIP}...")
-            with ConnectHandler(**currentNetDevice) as sshAccess:
-                authLog.info(f"User {username} is now running commands at: {validDeviceIP}")
+def discoverDevice(validDeviceIP, username, netDevice):
+    # Phase 1: err-disabled interfaces of one device, nothing is changed
+    startTime = time.perf_counter()
+    validDeviceIP = validDeviceIP.strip()
+    device = {"device": validDeviceIP, "hostname": deviceHostname(validDeviceIP), "interfaces": [], "output": "", "error": None}
+    try:
+        with connectDevice(validDeviceIP, username, netDevice) as sshAccess:
+            authLog.info(f"User {username} is now running commands at: {validDeviceIP}")
+            with scriptMetrics.stage(scriptName, "enable"):
                 sshAccess.enable()
-                authLog.info(f"Generating hostname for {validDeviceIP}")
-                shHostnameOut = re.sub(".mgmt.internal.das|.cm.mgmt.internal.das|.mgmt.wellpoint.com","#", validDeviceIP)
-                hostname = re.sub(".mgmt.internal.das|.cm.mgmt.internal.das|.mgmt.wellpoint.com","", validDeviceIP)
-                authLog.info(f"Hostname for {validDeviceIP}: {shHostnameOut}")
-                print(f"INFO: This is the hostname: {shHostnameOut}")
-
-                print(f"INFO: Searching and fixing errDisabled interfaces for device: {validDeviceIP}")
-                authLog.info(f"Searching and fixing errDisabled interfaces for device: {validDeviceIP}")
+            shHostnameOut = device["hostname"] + '#'
+            authLog.info(f"Hostname for {validDeviceIP}: {shHostnameOut}")
+            printDevice(f"INFO: This is the hostname: {shHostnameOut}")
+
+            printDevice(f"INFO: Searching errDisabled interfaces for device: {validDeviceIP}")
+            authLog.info(f"Searching errDisabled interfaces for device: {validDeviceIP}")
+            with scriptMetrics.stage(scriptName, "command"):
                 shErroDisableOut = sshAccess.send_command_timing(shErroDisable)
-                print(f"{shHostnameOut}{shErroDisable}\n{shErroDisableOut}")
-                authLog.info(f"{shHostnameOut}{shErroDisable}\n{shErroDisableOut}")
-                shErroDisableOut = re.findall(errDisableIntPatt, shErroDisableOut)
-                authLog.info(f"Found the following interfaces in error disable for device {validDeviceIP}: {shErroDisableOut}")
-
-                if shErroDisableOut:
-                    devicesErrList.append((hostname, shErroDisableOut))
-                    
-
-                    recoverInt = input(f"Do you want to recover the interfaces?(y/n):")
-                    while not checkYNInput(recoverInt):
-                        print("ERROR: Invalid input. Please enter 'y' or 'n'.\n")
-                        authLog.error(f"User tried to choose the option to recover the err-disabled interfaces but failed. Wrong option chosen: {recoverInt}")
-                        recoverInt = input("\nDo you want to choose a CSV file?(y/n):")
-
-                    if recoverInt.lower() == "y":
-                        for interface in shErroDisableOut:
-                            interface = interface.strip()
-                            recovInt[0] = f'int {interface}'
-                            print(f"INFO: Recovering interface {interface} from errDisabled state on device {validDeviceIP}")
-                            authLog.info(f"Recovering interface {interface} on device {validDeviceIP}")
-                            recovIntOut = sshAccess.send_config_set(recovInt)
-                            print(recovIntOut)
-                            authLog.info(f"{recovIntOut}")
-                            print(f"INFO: Successfully recovered interface {interface} for device: {validDeviceIP}")
-                            authLog.info(f"Successfully recovered interface {interface} for device: {validDeviceIP}")
-                            with open(f"Outputs/generalOutputs.txt", "a") as file:
-                                file.write(f"INFO: Fixing errDisabled interfaces for device: {validDeviceIP}\n")
-                                file.write(f"{shHostnameOut}:\n{recovIntOut}\n")
-                        print(f"INFO: Saving configuration for device: {validDeviceIP}")
-                        sshAccess.send_config_set(writeMem)
-                        authLog.info(f"Saved configuration for device: {validDeviceIP}")
-                    else:
-                        print(f"INFO: No interfaces will be recovered from device: {validDeviceIP}")
-                        authLog.info(f"No interfaces will be recovered from device: {validDeviceIP}")
-                else:
-                    print(f"INFO: No interfaces were found in errDisable state. Skipping device: {validDeviceIP}")
-                    authLog.info(f"No interfaces were found in errDisable state. Skipping device: {validDeviceIP}")
-
-        except Exception as error:
-            print(f"ERROR: An error occurred: {error}\n{traceback.format_exc()}")
-            authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}\n{traceback.format_exc()}")
-            with open(f"failedDevices.csv","a") as failedDevices:
+            printDevice(f"{shHostnameOut}{shErroDisable}\n{shErroDisableOut}")
+            authLog.info(f"{shHostnameOut}{shErroDisable}\n{outputForLog(shErroDisableOut)}")
+            device["output"] = shErroDisableOut
+            device["interfaces"] = re.findall(errDisableIntPatt, shErroDisableOut)
+            authLog.info(f"Found the following interfaces in error disable for device {validDeviceIP}: {device['interfaces']}")
+
+    except Exception as error:
+        printDevice(f"ERROR: An error occurred: {error}\n{traceback.format_exc()}")
+        authLog.error(f"User {username} connected to {validDeviceIP} got an error: {error}\n{traceback.format_exc()}")
+        device["error"] = error
+    device["seconds"] = time.perf_counter() - startTime
+    return device
+
+def verifyRecovery(sshAccess, validDeviceIP, interfaces, verifyTimeout, verifyInterval):
+    # Polls the err-disabled list until the recovered interfaces leave it or verifyTimeout
+    # runs out. Returns the interfaces still err-disabled. The first check runs right
+    # away, the interfaces usually leave the list with the no shut.
+    deadline = time.monotonic() + verifyTimeout
+    while True:
+        with scriptMetrics.stage(scriptName, "verify"):
+            verifyOut = sshAccess.send_command_timing(shErroDisable)
+        errDisabledNow = set(re.findall(errDisableIntPatt, verifyOut))
+        stillDisabled = [interface for interface in interfaces if interface in errDisabledNow]
+        remaining = deadline - time.monotonic()
+        if not stillDisabled or remaining <= 0:
+            authLog.info(f"Verification of device {validDeviceIP}, interfaces still err-disabled: {stillDisabled}")
+            return stillDisabled
+        time.sleep(min(verifyInterval, remaining))
+
+def recoverDevice(device, username, netDevice, verifyTimeout=30, verifyInterval=2):
+    # Phase 3: shut/no shut of all the interfaces in one config batch, one save, then verification
+    validDeviceIP = device["device"]
+    shHostnameOut = device["hostname"] + '#'
+    with connectDevice(validDeviceIP, username, netDevice) as sshAccess:
+        with scriptMetrics.stage(scriptName, "enable"):
+            sshAccess.enable()
+        printDevice(f"INFO: Recovering interfaces {', '.join(device['interfaces'])} from errDisabled state on device {validDeviceIP}")
+        authLog.info(f"Recovering interfaces {device['interfaces']} on device {validDeviceIP}")
+        with scriptMetrics.stage(scriptName, "config"):
+            recovIntOut = sshAccess.send_config_set(recoveryCommands(device["interfaces"]))
+        printDevice(recovIntOut)
+        authLog.info(f"{outputForLog(recovIntOut)}")
+        with outputLock:
+            with open(outputPath("Outputs", "generalOutputs.txt"), "a") as file:
+                file.write(f"INFO: Fixing errDisabled interfaces for device: {validDeviceIP}\n")
+                file.write(f"{shHostnameOut}:\n{recovIntOut}\n")
+
+        printDevice(f"INFO: Saving configuration for device: {validDeviceIP}")
+        with scriptMetrics.stage(scriptName, "save"):
+            sshAccess.send_config_set(writeMem)
+        authLog.info(f"Saved configuration for device: {validDeviceIP}")
+
+        stillDisabled = verifyRecovery(sshAccess, validDeviceIP, device["interfaces"], verifyTimeout, verifyInterval)
+    if stillDisabled:
+        printDevice(f"ERROR: Interfaces still err-disabled on device {validDeviceIP}: {', '.join(stillDisabled)}")
+    else:
+        printDevice(f"INFO: Successfully recovered interfaces for device: {validDeviceIP}")
+    return stillDisabled
+
+def askRecovery(devicesToRecover):
+    # Phase 2: one question for the whole plan
+    total = sum(len(device["interfaces"]) for device in devicesToRecover)
+    print(f"INFO: {total} err-disabled interfaces found on {len(devicesToRecover)} devices:")
+    for device in devicesToRecover:
+        print(f"  {device['hostname']}: {', '.join(device['interfaces'])}")
+    recoverInt = input(f"Do you want to recover the interfaces?(y/n):")
+    while not checkYNInput(recoverInt):
+        print("ERROR: Invalid input. Please enter 'y' or 'n'.\n")
+        authLog.error(f"User tried to choose the option to recover the err-disabled interfaces but failed. Wrong option chosen: {recoverInt}")
+        recoverInt = input(f"Do you want to recover the interfaces?(y/n):")
+    return recoverInt
+
+def reportDevice(device, stillDisabled=None, recovered=False, error=None):
+    # Result record of one device, sent as soon as its outcome is known
+    validDeviceIP = device["device"]
+    error = error if error is not None else device["error"]
+    if error is not None:
+        with outputLock:
+            with open(outputPath("failedDevices.csv"),"a") as failedDevices:
                 failedDevices.write(f"{validDeviceIP}\n")
-    
-    createPDF(devicesErrList, username)
+        resultProtocol.emitDevice(
+            scriptName, validDeviceIP, "failed", device["seconds"],
+            command=shErroDisable, error=error, interfaces=device["interfaces"], recovered=False,
+        )
+        return
+    resultProtocol.emitDevice(
+        scriptName, validDeviceIP, "failed" if stillDisabled else "ok", device["seconds"], hostname=device["hostname"],
+        command=shErroDisable, output=device["output"], interfaces=device["interfaces"], recovered=recovered,
+        stillErrDisabled=stillDisabled or [],
+        error=f"Interfaces still err-disabled after the recovery: {', '.join(stillDisabled)}" if stillDisabled else None,
+        errorClass="VerificationFailed" if stillDisabled else None,
+        outputRef=outputPath("Outputs", "generalOutputs.txt") if recovered else None,
+    )
+
+def errDisable(validIPs, username, netDevice, recover=None, maxThreads=10, verifyTimeout=30, verifyInterval=2):
+    # This function is to find and fix errDisable Intrfaces, in two phases:
+    # discovery of every device at the same time, one confirmation for all of them, then
+    # the recovery of every device at the same time (maxThreads devices at most).
+    # recover: "y"/"n" answers the recovery question (non-interactive), None asks once
+    # Records are sent as each device finishes: failed and clean devices after their
+    # discovery, devices not recovered after the answer, recovered ones after their recovery.
+    # The report gets the err-disabled interfaces of each device after its discovery
+    maxThreads = max(1, int(maxThreads))
+    inventory.preload(validIPs)
+    declined = recover is not None and recover.lower() != "y"
+    report = createReport(username)
+
+    with ContextExecutor(max_workers=maxThreads) as executor:
+        futures = [executor.submit(discoverDevice, ip, username, netDevice) for ip in validIPs]
+        for future in concurrent.futures.as_completed(futures):
+            device = future.result()
+            if device["interfaces"]:
+                report.row((device["hostname"], ', '.join(device["interfaces"])))
+            if device["error"] is None and not device["interfaces"]:
+                printDevice(f"INFO: No interfaces were found in errDisable state. Skipping device: {device['device']}")
+                authLog.info(f"No interfaces were found in errDisable state. Skipping device: {device['device']}")
+            if device["error"] is not None or not device["interfaces"] or declined:
+                reportDevice(device)
+    devices = [future.result() for future in futures]
+
+    devicesToRecover = [device for device in devices if device["interfaces"] and device["error"] is None]
+
+    recoverInt = "n"
+    if devicesToRecover:
+        recoverInt = recover if recover is not None else askRecovery(devicesToRecover)
+        if recoverInt.lower() != "y":
+            printDevice(f"INFO: No interfaces will be recovered")
+            authLog.info(f"No interfaces will be recovered from devices: {[d['device'] for d in devicesToRecover]}")
+            if not declined:
+                for device in devicesToRecover:
+                    reportDevice(device)
+
+    if recoverInt.lower() == "y":
+        with ContextExecutor(max_workers=maxThreads) as executor:
+            futureToDevice = {
+                executor.submit(recoverDevice, device, username, netDevice, verifyTimeout, verifyInterval): device
+                for device in devicesToRecover
+            }
+            for future in concurrent.futures.as_completed(futureToDevice):
+                device = futureToDevice[future]
+                try:
+                    stillDisabled = future.result()
+                except Exception as error:
+                    authLog.error(f"User {username} connected to {device['device']} got an error: {error}\n{traceback.format_exc()}")
+                    reportDevice(device, error=error)
+                    continue
+                reportDevice(device, stillDisabled=stillDisabled, recovered=True)
+
+    # Written in the background, the run does not wait for the report
+    report.close()
+    inventory.flush()
@@ -1,7 +1,120 @@
 from utils import mkdir
+import argparse
+import sys
 import os
 
-def main():    
+def nonInteractive():
+    mkdir()
+
+    from functions import validateIPsBatch, scriptName
+    from commandsCLI import errDisable
+    from log import authLog
+    import resultProtocol
+
+    """
+    Modo NO interactivo, pensado para ser llamado desde FastAPI / backend.
+
+    Ejemplo de uso:
+      python main.py \
+        --devices "10.1.1.1,10.1.1.2" \
+        --username luis \
+        --password cisco \
+        --recover y \
+        --threads 20 \
+        --format ndjson
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Automated err-disabled interfaces check and recovery"
+    )
+    parser.add_argument(
+        "--devices",
+        required=True,
+        help="Comma-separated list of device IPs/hostnames. Example: '10.1.1.1,10.1.1.2'",
+    )
+    parser.add_argument(
+        "--username",
+        required=True,
+        help="Username to use for device login.",
+    )
+    parser.add_argument(
+        "--password",
+        required=True,
+        help="Password to use for device login (also used as enable password).",
+    )
+    parser.add_argument(
+        "--recover",
+        choices=["y", "n"],
+        default="n",
+        help="Recover (shut/no shut) the err-disabled interfaces found. Default: only report them.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=10,
+        help="Devices checked and recovered at the same time. Default: 10.",
+    )
+    parser.add_argument(
+        "--verify-timeout",
+        type=float,
+        default=30,
+        help="Seconds to wait for the recovered interfaces to leave the err-disabled state. Default: 30.",
+    )
+    parser.add_argument(
+        "--verify-interval",
+        type=float,
+        default=2,
+        help="Seconds between two checks of the recovered interfaces. Default: 2.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "ndjson"],
+        default="text",
+        help="ndjson: one JSON record per device on stdout (see scripts/resultProtocol.py).",
+    )
+
+    args = parser.parse_args()
+
+    # Registros por device para el backend
+    resultProtocol.enabled = args.format == "ndjson"
+
+    validIPs = []
+    rawList = [ip.strip() for ip in args.devices.split(",") if ip.strip()]
+    for ip, ipOut in zip(rawList, validateIPsBatch(rawList)):
+        if ipOut is not None:
+            validIPs.append(ipOut)
+        else:
+            authLog.info(f"IP address {ip} is invalid or unreachable.")
+            resultProtocol.emitDevice(scriptName, ip, "unreachable", 0, error="invalid or unreachable on TCP 22", errorClass="Unreachable")
+
+    if not validIPs:
+        raise ValueError("No valid IP addresses found after validation.")
+
+    netDevice = {
+        "password": args.password,
+        "secret": args.password,
+    }
+
+    authLog.info(
+        f"[showErrDisableInt-main] Non-interactive run. "
+        f"Devices={validIPs}, username={args.username}, recover={args.recover}, threads={args.threads}"
+    )
+
+    errDisable(
+        validIPs, args.username, netDevice, recover=args.recover, maxThreads=args.threads,
+        verifyTimeout=args.verify_timeout, verifyInterval=args.verify_interval,
+    )
+
+    if not resultProtocol.enabled:
+        print("INFO: Non-interactive run completed successfully.")
+        print(f"INFO: Devices: {validIPs}")
+
+def main():
+    # Con parámetros (--devices ...) corre sin menú, como lo llama el backend
+    if len(sys.argv) > 1:
+        nonInteractive()
+        return
+
     mkdir()
     os.system("CLS")
     
@@ -31,4 +144,4 @@ def main():
             os.system("PAUSE")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
\ No newline at end of file
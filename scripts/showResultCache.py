@@ -0,0 +1,187 @@
+from collections import OrderedDict
+from contextlib import closing
+import threading
+import traceback
+import logging
+import sqlite3
+import time
+import re
+import os
+
+# Opt-in cache of read-only show command outputs, keyed by device + username + command,
+# used by runShowCommands (netmiko and asyncssh). The scripts read it before connecting:
+# a device whose commands are all cached gets no SSH session at all. Only outputs read
+# by the same username are returned, the password is not checked again.
+# With NETOPS_SHOW_CACHE_VERIFY_LOGIN=1 the scripts read it once the login to the device
+# worked instead (credentials verified on every run, the login is not saved).
+# Only the commands of safeCommands are cached, each pattern with its own TTL (seconds).
+# Enabled with NETOPS_SHOW_CACHE=1 (or main.py --cache).
+# The running config is kept in memory only, the SQLite file is not encrypted: it is
+# written there too with NETOPS_SHOW_CACHE_PERSIST_CONFIG=1.
+
+enabled = os.getenv("NETOPS_SHOW_CACHE", "0") == "1"
+persistConfig = os.getenv("NETOPS_SHOW_CACHE_PERSIST_CONFIG", "0") == "1"
+verifyLogin = os.getenv("NETOPS_SHOW_CACHE_VERIFY_LOGIN", "0") == "1"
+
+cachePath = os.getenv(
+    "NETOPS_SHOW_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "showResultCache.db"),
+)
+maxEntries = int(os.getenv("NETOPS_SHOW_CACHE_SIZE", "256"))
+
+# (pattern, TTL, configuration output)
+safeCommands = [
+    (re.compile(r"^show version$"), 3600, False),
+    (re.compile(r"^show inventory$"), 3600, False),
+    (re.compile(r"^show ip int(erface)? br(ief)?$"), 120, False),
+    (re.compile(r"^show int(erfaces?)? (status|description)$"), 120, False),
+    (re.compile(r"^show (cdp|lldp) neighbors( detail)?$"), 300, False),
+    (re.compile(r"^show run(ning-config)?( \| (i|include|s|section) [\w .:/-]+)?$"), 600, True),
+    (re.compile(r"^show ip route( summary)?$"), 60, False),
+    (re.compile(r"^show vlan( brief)?$"), 300, False),
+]
+
+authLog = logging.getLogger('infoLog')
+
+memory = OrderedDict()
+memoryLock = threading.Lock()
+counters = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+
+def normalizeCommand(command):
+    # Folds the whitespace and the case of the show verb only, the arguments and the
+    # filter after "|" keep their case (include/section patterns are case sensitive)
+    words = command.split()
+    if words and words[0].lower() == "show":
+        words[0] = "show"
+    return " ".join(words)
+
+def commandRule(command):
+    # (TTL, configuration output), or None when the command is not in the read-only allowlist
+    command = normalizeCommand(command)
+    for pattern, ttl, isConfig in safeCommands:
+        if pattern.match(command):
+            return ttl, isConfig
+    return None
+
+def ttlFor(command):
+    rule = commandRule(command)
+    return rule[0] if rule else None
+
+def persisted(command):
+    # Whether the output of the command is also kept in the SQLite file
+    rule = commandRule(command)
+    return rule is not None and (persistConfig or not rule[1])
+
+def cacheKey(device, username, command):
+    return (device.strip().lower(), username, normalizeCommand(command))
+
+def describeAge(age):
+    age = int(age)
+    if age < 60:
+        return f"{age}s old"
+    return f"{age // 60} min {age % 60}s old"
+
+def connectCache():
+    conn = sqlite3.connect(cachePath, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS userResults ("
+        " device TEXT NOT NULL,"
+        " username TEXT NOT NULL,"
+        " command TEXT NOT NULL,"
+        " output TEXT NOT NULL,"
+        " stored REAL NOT NULL,"
+        " used REAL NOT NULL,"
+        " PRIMARY KEY (device, username, command))"
+    )
+    return conn
+
+def remember(key, output, stored):
+    # Keep the entry in memory as the most recently used one
+    with memoryLock:
+        memory[key] = (output, stored)
+        memory.move_to_end(key)
+        while len(memory) > maxEntries:
+            memory.popitem(last=False)
+            counters["evicted"] += 1
+
+def lookup(device, username, command):
+    # Returns (output, age in seconds) or None
+    ttl = ttlFor(command)
+    if not enabled or ttl is None:
+        return None
+
+    key = cacheKey(device, username, command)
+    now = time.time()
+    with memoryLock:
+        entry = memory.get(key)
+        if entry is not None:
+            memory.move_to_end(key)
+
+    if entry is None and persisted(command):
+        try:
+            with closing(connectCache()) as conn, conn:
+                row = conn.execute(
+                    "SELECT output, stored FROM userResults WHERE device = ? AND username = ? AND command = ?", key
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE userResults SET used = ? WHERE device = ? AND username = ? AND command = ?", (now, *key))
+        except sqlite3.Error as error:
+            authLog.error(f"Show result cache not available, error: {error}\n{traceback.format_exc()}")
+            row = None
+        if row is not None:
+            entry = (row[0], row[1])
+            remember(key, *entry)
+
+    if entry is None or now - entry[1] > ttl:
+        with memoryLock:
+            counters["misses"] += 1
+        return None
+
+    with memoryLock:
+        counters["hits"] += 1
+    authLog.info(f"Show result cache hit for {device}, command: {command}, {describeAge(now - entry[1])}")
+    return entry[0], now - entry[1]
+
+def cachedEntries(device, username, commands):
+    # {command: command entry of the result record} of the commands found in the cache
+    entries = {}
+    for command in commands:
+        cached = lookup(device, username, command)
+        if cached is not None:
+            output, age = cached
+            entries[command] = {"command": command, "output": output, "seconds": 0.0, "cacheAge": round(age, 1)}
+    return entries
+
+def store(device, username, command, output):
+    if not enabled or ttlFor(command) is None:
+        return
+
+    key = cacheKey(device, username, command)
+    now = time.time()
+    remember(key, output, now)
+    with memoryLock:
+        counters["stores"] += 1
+    if not persisted(command):
+        return
+    try:
+        with closing(connectCache()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO userResults (device, username, command, output, stored, used) VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, output, now, now),
+            )
+            # Same size limit on disk, the least recently used rows go first
+            conn.execute(
+                "DELETE FROM userResults WHERE rowid NOT IN"
+                " (SELECT rowid FROM userResults ORDER BY used DESC LIMIT ?)",
+                (maxEntries,),
+            )
+    except sqlite3.Error as error:
+        authLog.error(f"Could not save {device} in the show result cache, error: {error}")
+
+def stats():
+    with memoryLock:
+        return {
+            "enabled": enabled, "persistConfig": persistConfig, "verifyLogin": verifyLogin, "memoryEntries": len(memory),
+            "maxEntries": maxEntries, **counters,
+        }
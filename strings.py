@@ -2,25 +2,48 @@ scriptsAvailable = {
     "runShowCommands-main": {
         "displayName": "Run Show Commands",
         "description": (
-            "Execute any show command on one or multiple network devices using SSH. "
-            "Validates reachability, runs the command and stores outputs in text files under Outputs."
+            "Execute one or several show commands on one or multiple network devices using SSH. "
+            "Validates reachability, runs the commands in one session per device and stores outputs in text files under Outputs."
         ),
         # Metadatos para el backend:
         "folder": "runShowCommands-main",
         "entrypoint": "main.py",
+        # main.py --format ndjson: un registro JSON por device (scripts/resultProtocol.py)
+        "resultFormat": "ndjson",
+        # En ejecución in-process las sesiones SSH salen del pool de sesiones del backend
+        # (NETOPS_SESSION_POOL=0 abre una sesión nueva por device, como main.py)
+        "pooled": True,
+        # Función que el backend importa una vez y llama directamente (sin subprocess)
+        "inProcess": {
+            "module": "commandsCLI",
+            "function": "showCommandsThread",
+            "args": ["validIPs", "username", "netDevice", "command"],
+            "optionalArgs": {"threads": "maxThreads"},
+            # Argumento que recibe cada resultado por device apenas termina (streaming)
+            "resultCallback": "onResult",
+            # Argumento que recibe el ConnectHandler del pool de sesiones
+            "connectHandler": "connectHandler",
+            # Argumento que recibe el evento de cancelación del job (se revisa entre devices)
+            "cancelEvent": "cancelEvent",
+        },
         "cli_params": [
             {"name": "devices",  "flag": "--devices",  "required": True},
             {"name": "username", "flag": "--username", "required": True},
             {"name": "password", "flag": "--password", "required": True},
             # <- SOLO este script usa "command"
-            {"name": "command",  "flag": "--command",  "required": True},
+            # "multiple": acepta una lista, el backend repite el flag por cada comando
+            {"name": "command",  "flag": "--command",  "required": True, "multiple": True},
+            {"name": "threads",  "flag": "--threads",  "required": False},
+            {"name": "transport", "flag": "--transport", "required": False},
         ],
         # Info para el modelo (sigue igual, la IA ve esto al armar prompts):
         "parameters": [
             {"name": "devices", "description": "Comma-separated list of device IPs/hostnames"},
             {"name": "username", "description": "Username for device login"},
             {"name": "password", "description": "Password (also used as enable/secret)"},
-            {"name": "command", "description": "Complete show command to run"},
+            {"name": "command", "description": "Complete show command to run, or a JSON list of show commands to run in order on the same session"},
+            {"name": "threads", "description": "Optional, number of devices to run at the same time (for long device lists)"},
+            {"name": "transport", "description": "Optional, 'asyncssh' for very large device lists (hundreds or thousands), default 'netmiko'"},
         ],
     },
 
@@ -29,15 +52,31 @@ scriptsAvailable = {
         "description": "Remove or modify SNMP Group ACL on multiple devices.",
         "folder": "aclRemoval-main",
         "entrypoint": "main.py",
+        "resultFormat": "ndjson",
+        "inProcess": {
+            "module": "commandsCLI",
+            "function": "aclRemovalThread",
+            "args": ["validIPs", "username", "password"],
+            # Parámetros opcionales del chat -> argumento de la función, solo si vienen.
+            # Sin "threads" los devices se configuran de a uno (cambios de configuración)
+            "optionalArgs": {"threads": "maxThreads"},
+            "cancelEvent": "cancelEvent",
+        },
+        # Cambios de configuración: una ejecución a la vez
+        "maxConcurrentJobs": 1,
+        # El router de intenciones solo lo confirma con una frase explícita ("yes, run it")
+        "changesConfig": True,
         "cli_params": [
             {"name": "devices", "flag": "--devices", "required": True},
             {"name": "username", "flag": "--username", "required": True},
             {"name": "password", "flag": "--password", "required": True},
+            {"name": "threads", "flag": "--threads", "required": False},
         ],
         "parameters": [
             {"name": "devices", "description": "Devices where the SNMP Group ACL will be modified"},
             {"name": "username", "description": "Username for device login"},
             {"name": "password", "description": "Password (also used as enable/secret)"},
+            {"name": "threads", "description": "Optional, number of devices to configure at the same time, default 1 (one by one). Only set it when the user asks for a parallel run (logins per site are rate limited)"},
         ],
     },
 
@@ -46,11 +85,16 @@ scriptsAvailable = {
         "description": "Check interfaces in half-duplex mode on SD-WAN routers.",
         "folder": "shIntStatHalf_SD-WAN-main",
         "entrypoint": "main.py",
+        "resultFormat": "ndjson",
         "cli_params": [
             {"name": "devices", "flag": "--devices", "required": True},
+            {"name": "username", "flag": "--username", "required": True},
+            {"name": "password", "flag": "--password", "required": True},
         ],
         "parameters": [
             {"name": "devices", "description": "Routers to check"},
+            {"name": "username", "description": "Username for device login"},
+            {"name": "password", "description": "Password (also used as enable/secret)"},
         ],
     },
 
@@ -59,11 +103,22 @@ scriptsAvailable = {
         "description": "Find interfaces in err-disabled state and optionally recover them.",
         "folder": "showErrDisableInt-main",
         "entrypoint": "main.py",
+        "resultFormat": "ndjson",
+        # Cambia la configuración solo con recover=y (shut/no shut)
+        "changesConfig": {"recover": "y"},
         "cli_params": [
             {"name": "devices", "flag": "--devices", "required": True},
+            {"name": "username", "flag": "--username", "required": True},
+            {"name": "password", "flag": "--password", "required": True},
+            {"name": "recover", "flag": "--recover", "required": False},
+            {"name": "threads", "flag": "--threads", "required": False},
         ],
         "parameters": [
             {"name": "devices", "description": "Devices to analyze"},
+            {"name": "username", "description": "Username for device login"},
+            {"name": "password", "description": "Password (also used as enable/secret)"},
+            {"name": "recover", "description": "Optional, 'y' to recover (shut/no shut) the err-disabled interfaces found, default 'n' (only report)"},
+            {"name": "threads", "description": "Optional, number of devices to check and recover at the same time"},
         ],
     },
 }
@@ -119,7 +174,7 @@ General rules:
 - On the first message also mention your name, Automation Hero
 - For any message, if you are going to present a list of things, please use bullet points or something to make it nicer and more readable.
 - If you will reply with a list of things or missing parameters, use a clear multi-line format, not everything on the same line.
-- If they ask you to run more than one show command, just execute one at a time, and always prompt something like "do u want to run the next command?" and also show the next command
+- If they ask you to run more than one show command, put all of them in one run as a list in "command" (for example ["show version", "show ip interface brief"]), in the order the user gave them. They run on the same session per device and each command gets its own output.
 
 Very important:
 - If you are NOT ready to execute (need more info or no explicit confirmation), set "run_script": false.